@@ -16,6 +16,8 @@ from socket_bitbank_pybotters import Socket_PyBotters_BitBank
 from socket_bybit_pybotters import Socket_PyBotters_Bybit
 from socket_gmocoin_pybotters import Socket_PyBotters_GMOCoin
 from get_logger import get_custom_logger
+from book_trigger import BookUpdateTrigger
+from tick_recorder import TickRecorder
 import warnings
 warnings.simplefilter('ignore')
 
@@ -23,6 +25,7 @@ warnings.simplefilter('ignore')
 class ArbitrageBot(bybitbot_base.BybitBotBase):
     # User can ues MAX_DATA_CAPACITY to control memory usage.
     open_time_old = 0
+    HOUSEKEEPING_INTERVAL = 1  # 注文・ポジション確認の間隔（秒）
 
     # ---------------------------------------- #
     # init
@@ -84,6 +87,10 @@ class ArbitrageBot(bybitbot_base.BybitBotBase):
 
 
         self.logger = get_custom_logger(log_level)
+        self.housekeeping_lock = asyncio.Lock()
+        self.order_sent = False  # main() 内で発注したか
+        self.last_record_ts = 0  # 最後に記録したタイムスタンプ
+        self.recorder = TickRecorder("./data", logger=self.logger)
         self.emergency_time = datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc)
         self.emergency_qty_time = datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc)
 
@@ -97,7 +104,15 @@ class ArbitrageBot(bybitbot_base.BybitBotBase):
             self.run()
         ]
 
-        loop.run_until_complete(asyncio.wait(tasks))
+        try:
+            loop.run_until_complete(asyncio.wait(tasks))
+        finally:
+            # REST用セッションを閉じる
+            loop.run_until_complete(self.close_sessions())
+
+    async def close_sessions(self):
+        await self.bybit.close_session()
+        await self.gmocoin.close_session()
 
     async def get_usdjpy(self):
         try:
@@ -112,17 +127,14 @@ class ArbitrageBot(bybitbot_base.BybitBotBase):
         await self.order_list_gmocoin()
 
     async def order_cancel_all(self):
-        for order in self.orders["bybit"]:
-            self.bybit.order_cancel(order_id=order["orderId"])
+        res = await self.bybit.send(*[self.bybit.order_cancel(order_id=order["orderId"])
+                                      for order in self.orders["bybit"]])
         for order in self.orders["gmocoin"]:
             await self.gmocoin.order_cancel(order_id=order["orderId"])
-        res = await self.bybit.send()
-        res = await self.gmocoin.send()
 
     async def order_list_bybit(self):
         try:
-            self.bybit.order_list()
-            res = await self.bybit.send()
+            res = await self.bybit.order_list().send()
             if res[0]["result"]["list"] is not None:
                 self.orders["bybit"] = res[0]["result"]["list"]
             else:
@@ -133,8 +145,7 @@ class ArbitrageBot(bybitbot_base.BybitBotBase):
 
     async def order_list_gmocoin(self):
         try:
-            self.gmocoin.order_list(self.gmocoin.SYMBOL)
-            res = await self.gmocoin.send()
+            res = await self.gmocoin.order_list(self.gmocoin.SYMBOL).send()
             if len(res[0]["data"]) != 0:
                 self.orders["gmocoin"] = res[0]["data"]["list"]
             else:
@@ -194,20 +205,44 @@ class ArbitrageBot(bybitbot_base.BybitBotBase):
 
     async def run(self):
         checkout = False
-        while True:
-
+        # 板更新で戦略ループを起こし、注文・ポジションの確認は別タスクで定期実行する
+        trigger = BookUpdateTrigger(self.bybit.store.orderbook, self.gmocoin.store.orderbooks)
+        trigger.start()
+        self.recorder.start()
+        await self.housekeeping()
+        housekeeping_task = asyncio.create_task(self.housekeeping_loop())
+        try:
+            while True:
+                await trigger.wait()
+                self.order_sent = False
+                await self.main()
+                if self.order_sent:
+                    # 発注後は従来通り1周期待って（未約定分のキャンセルを含め）同期してから次の判定を行う
+                    await asyncio.sleep(self.HOUSEKEEPING_INTERVAL)
+                    await self.housekeeping()
+        finally:
+            housekeeping_task.cancel()
+            trigger.stop()
+            await self.recorder.stop()
+
+    async def housekeeping(self):
+        """注文の確認・キャンセルとポジション・為替レートの同期"""
+        async with self.housekeeping_lock:
             await self.order_check()
             await self.order_cancel_all()
 
             self.position_check_gmocoin()
-            print("test")
             self.position_check_bybit()
 
-
             await self.get_usdjpy()
-            await self.main()
-            print("test2")
-            await asyncio.sleep(1)
+
+    async def housekeeping_loop(self):
+        while True:
+            await asyncio.sleep(self.HOUSEKEEPING_INTERVAL)
+            try:
+                await self.housekeeping()
+            except Exception as e:
+                self.logger.exception(e)
 
 
     async def main(self):
@@ -220,23 +255,21 @@ class ArbitrageBot(bybitbot_base.BybitBotBase):
             ts_now = self.get_timestamp()
             order_list = {"buy": {}, "sell": {}}
 
-            buy_order_gmocoin = self.gmocoin.store.orderbooks.find({'symbol': self.gmocoin.SYMBOL, 'side': 'bids'})
-            sell_order_gmocoin = self.gmocoin.store.orderbooks.find({'symbol': self.gmocoin.SYMBOL, 'side': 'asks'})
-            if len(buy_order_gmocoin) < 1 or len(sell_order_gmocoin) < 1:
-                self.logger.debug(f"**restart**. not enough order data {len(buy_order_gmocoin)} {len(sell_order_gmocoin)}")
+            # 最良気配は板更新イベントで差分更新されたキャッシュから取得する
+            gmocoin_book = self.gmocoin.book_cache(self.gmocoin.SYMBOL)
+            if not gmocoin_book.ready():
+                self.logger.debug(f"**restart**. not enough order data {len(gmocoin_book.bids)} {len(gmocoin_book.asks)}")
                 return True
-            order_list["buy"]["gmocoin"] = {"price": float(buy_order_gmocoin[0]["price"]), "volume": float(buy_order_gmocoin[0]["size"])}
-            order_list["sell"]["gmocoin"] = {"price": float(sell_order_gmocoin[0]["price"]), "volume": float(sell_order_gmocoin[0]["size"])}
+            order_list["buy"]["gmocoin"] = {"price": gmocoin_book.best_bid, "volume": gmocoin_book.best_bid_size}
+            order_list["sell"]["gmocoin"] = {"price": gmocoin_book.best_ask, "volume": gmocoin_book.best_ask_size}
 
-            buy_order_bybit = self.bybit.store.orderbook.find({'s': self.bybit.SYMBOL, 'S': 'b'})
-            sell_order_bybit = self.bybit.store.orderbook.find({'s': self.bybit.SYMBOL, 'S': 'a'})
-            if len(buy_order_bybit) < 1 or len(sell_order_bybit) < 1:
-                self.logger.debug(f"**restart**. not enough order data {len(buy_order_bybit)} {len(sell_order_bybit)}")
+            bybit_book = self.bybit.book_cache(self.bybit.SYMBOL)
+            if not bybit_book.ready():
+                self.logger.debug(f"**restart**. not enough order data {len(bybit_book.bids)} {len(bybit_book.asks)}")
                 return True
-            print(buy_order_bybit[0])
 
-            order_list["buy"]["bybit"] = {"price": float(buy_order_bybit[0]["p"]) * self.usdjpy["Close"], "volume": float(buy_order_bybit[0]["v"])}
-            order_list["sell"]["bybit"] = {"price": float(sell_order_bybit[0]["p"]) * self.usdjpy["Close"], "volume": float(sell_order_bybit[0]["v"])}
+            order_list["buy"]["bybit"] = {"price": bybit_book.best_bid * self.usdjpy["Close"], "volume": bybit_book.best_bid_size}
+            order_list["sell"]["bybit"] = {"price": bybit_book.best_ask * self.usdjpy["Close"], "volume": bybit_book.best_ask_size}
             print(order_list)
             buy_max = max(order_list["buy"], key=lambda k: order_list["buy"][k]['price'])
 
@@ -255,11 +288,7 @@ class ArbitrageBot(bybitbot_base.BybitBotBase):
             # print(self.bitbank.store.transactions.find())
             # 注文記録
 
-            for order in self.orders["bybit"]:
-                self.bybit.order_cancel(order_id=order["orderId"])
-            for order in self.orders["gmocoin"]:
-                await self.gmocoin.order_cancel(order_id=order["orderId"])
-            res = await self.bybit.send()
+            # 未約定注文のキャンセルは housekeeping（order_cancel_all）で行う
 
             #print(bitbank_buy_order) # 0が一番上
             #print(bitbank_sell_order) # 0が一番下
@@ -324,6 +353,7 @@ class ArbitrageBot(bybitbot_base.BybitBotBase):
                     qty = float(bitbank_sell_order[0]["size"])
                     if qty > self.base_qty - float(self.positions["gmocoin"]["size"]):
                         qty = self.base_qty - float(self.positions["gmocoin"]["size"])
+                    self.order_sent = True
                     await self.gmocoin.buy_in(float(bitbank_sell_order[0]["price"]), qty)
                     get_pos_flg = False
                     ts_now = self.get_timestamp()
@@ -352,6 +382,7 @@ class ArbitrageBot(bybitbot_base.BybitBotBase):
 
                     #"""
                     pos_size = buy_pos_size
+                    self.order_sent = True
                     await self.bybit.sell_in(float(buy["price"]), pos_size)
                     ts_now = self.get_timestamp()
                     while True:
@@ -372,6 +403,7 @@ class ArbitrageBot(bybitbot_base.BybitBotBase):
             # 条件2 bitbankはいっぱいだがposが不安定
             if self.offensive_mode and self.positions_bitbank["size"] == self.base_qty and (self.positions_bybit["size"] < self.positions_bitbank["size"]):
                 pos_size = self.positions_bitbank["size"] - self.positions_bybit["size"]
+                self.order_sent = True
                 await self.bybit.sell_in(float(buy["price"]), pos_size)
                 ts_now = self.get_timestamp()
                 while True:
@@ -392,6 +424,7 @@ class ArbitrageBot(bybitbot_base.BybitBotBase):
             if not self.offensive_mode and (self.positions_bybit["size"] > 0 or self.positions_bitbank["size"] > 0):
                 # 売る
                 if float(bitbank_buy_order[0]["price"]) / self.usdjpy["Close"] - float(sell["price"]) > 0:
+                    self.order_sent = True
                     await self.bitbank.buy_out(float(bitbank_sell_order[0]["price"]), self.positions_bitbank["size"])
                     base_pos_size = self.positions_bitbank["size"]
                     sell_pos_flg = False
@@ -415,6 +448,7 @@ class ArbitrageBot(bybitbot_base.BybitBotBase):
                           bitbank_buy_order[0]["size"], float(bitbank_buy_order[0]["price"]) / self.usdjpy["Close"],
                           sell["size"], sell["price"], )
 
+                    self.order_sent = True
                     await self.bybit.buy_out(float(sell["price"]), self.positions_bybit["size"] - pos_size)
 
             now_data = {"timestamp": ts_now,
@@ -430,15 +464,10 @@ class ArbitrageBot(bybitbot_base.BybitBotBase):
                         "bitbank_sell_size": float(bitbank_sell_order[0]["size"]),
                         "usdypy": self.usdjpy["Close"],
                         }
-            old_data = {}
-
-            today = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d")
-            if os.path.exists(f"./data/{today}.json"):
-                with open(f"./data/{today}.json", "r") as f:
-                    old_data = json.load(f)
-                old_data[now_data["timestamp"]] = now_data
-            with open(f"./data/{today}.json", "w") as f:
-                json.dump(old_data, f, indent=2)
+            # 記録は1秒に1回（バッファして別スレッドで追記）
+            if ts_now != self.last_record_ts:
+                self.last_record_ts = ts_now
+                self.recorder.record(now_data)
 
 
 
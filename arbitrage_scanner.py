@@ -0,0 +1,108 @@
+import time
+
+import numpy as np
+
+
+# quotes の列
+GMO_BID, GMO_ASK, BITBANK_BID, BITBANK_ASK = range(4)
+
+
+class ArbitrageScanner():
+    """
+    GMO x Bitbank の複数銘柄の価格差
+    銘柄ごとの最良気配を (銘柄, 4) の配列に持ち、板が更新された銘柄の行だけを書き換えて、
+    全銘柄の arbitrage_1 / arbitrage_2 をまとめて計算する
+
+    - arbitrage_1 = Bitbankの買値 - GMOの売値（GMO買い→Bitbank売り）
+    - arbitrage_2 = GMOの買値 - Bitbankの売値（GMO売り→Bitbank買い）
+    - ratio は価格差を仲値で割ったもの（価格帯の違う銘柄どうしを比べる用）
+    """
+
+    def __init__(self, symbols, max_age=10.0):
+        self.gmo_symbols = list(symbols)                 # GMO銘柄
+        self.bitbank_symbols = list(symbols.values())    # 同じ行の Bitbank銘柄
+        self.max_age = max_age  # この秒数より古い気配の銘柄は scan で除外する
+        n = len(self.gmo_symbols)
+        self.quotes = np.full((n, 4), np.nan)
+        self.timestamps = np.zeros((n, 2))       # 気配を取り込んだ板の更新時刻（GMO, Bitbank）
+        self.updates = np.full((n, 2), -1)      # 気配を取り込んだ板の更新回数（BestBidAsk.updates）
+        self.arbitrage = np.full((n, 2), np.nan)  # arbitrage_1, arbitrage_2
+        self.ratio = np.full((n, 2), np.nan)
+        self.hits = set()  # 前回の new_hits で閾値を超えていた GMO銘柄
+
+    def index(self, gmo_symbol):
+        return self.gmo_symbols.index(gmo_symbol)
+
+    # ---------------------------------------- #
+    # 更新
+    # ---------------------------------------- #
+    def update(self, gmo_books, bitbank_books):
+        """
+        銘柄 -> BestBidAsk の dict（Socket の book_caches）から、前回から更新された板の気配だけを取り込み、
+        価格差を計算し直す。取り込んだ板の数を返す
+        """
+        updated = 0
+        for i, (gmo_symbol, bitbank_symbol) in enumerate(zip(self.gmo_symbols, self.bitbank_symbols)):
+            updated += self._load(i, 0, gmo_books.get(gmo_symbol))
+            updated += self._load(i, 1, bitbank_books.get(bitbank_symbol))
+        if updated:
+            self.compute()
+        return updated
+
+    def _load(self, i, exchange, book):
+        if book is None or book.updates == self.updates[i, exchange]:
+            return 0
+        self.updates[i, exchange] = book.updates
+        self.timestamps[i, exchange] = book.timestamp
+        bid, ask = book.best_bid, book.best_ask
+        self.quotes[i, 2 * exchange] = bid if bid is not None else np.nan
+        self.quotes[i, 2 * exchange + 1] = ask if ask is not None else np.nan
+        return 1
+
+    def set_quote(self, gmo_symbol, gmo_bid, gmo_ask, bitbank_bid, bitbank_ask, timestamp=None):
+        """1銘柄の気配を直接書き込む（REST のティッカーなど）"""
+        i = self.index(gmo_symbol)
+        self.quotes[i] = (gmo_bid, gmo_ask, bitbank_bid, bitbank_ask)
+        self.timestamps[i] = time.time() if timestamp is None else timestamp
+        self.compute()
+
+    def compute(self):
+        quotes = self.quotes
+        np.subtract(quotes[:, BITBANK_BID], quotes[:, GMO_ASK], out=self.arbitrage[:, 0])
+        np.subtract(quotes[:, GMO_BID], quotes[:, BITBANK_ASK], out=self.arbitrage[:, 1])
+        mid = quotes.mean(axis=1)
+        np.divide(self.arbitrage, mid[:, None], out=self.ratio)
+
+    # ---------------------------------------- #
+    # 参照
+    # ---------------------------------------- #
+    def fresh(self, now=None):
+        """両取引所の気配が max_age 秒以内に更新されている銘柄（bool の配列）"""
+        now = time.time() if now is None else now
+        return (now - self.timestamps.min(axis=1)) <= self.max_age
+
+    def scan(self, ratio_threshold, now=None):
+        """
+        ratio がどちらかの方向で ratio_threshold を超えた銘柄を、大きい順に
+        (GMO銘柄, Bitbank銘柄, arbitrage_1, arbitrage_2, ratio_1, ratio_2) で返す
+        """
+        best = np.fmax(self.ratio[:, 0], self.ratio[:, 1])
+        hits = np.flatnonzero((best > ratio_threshold) & self.fresh(now))
+        hits = hits[np.argsort(-best[hits])]
+        return [(self.gmo_symbols[i], self.bitbank_symbols[i], *self.arbitrage[i].tolist(), *self.ratio[i].tolist())
+                for i in hits]
+
+    def new_hits(self, ratio_threshold, now=None):
+        """scan のうち、前回の呼び出しでは閾値を超えていなかった銘柄だけを返す（ログを閾値超えの時だけにする用）"""
+        hits = self.scan(ratio_threshold, now)
+        previous, self.hits = self.hits, {hit[0] for hit in hits}
+        return [hit for hit in hits if hit[0] not in previous]
+
+    def row(self, gmo_symbol):
+        """1銘柄の気配と価格差を dict で返す"""
+        i = self.index(gmo_symbol)
+        gmo_bid, gmo_ask, bitbank_bid, bitbank_ask = self.quotes[i].tolist()
+        return {"symbol": gmo_symbol, "bitbank_symbol": self.bitbank_symbols[i],
+                "gmo_bid": gmo_bid, "gmo_ask": gmo_ask, "bitbank_bid": bitbank_bid, "bitbank_ask": bitbank_ask,
+                "arbitrage_1": float(self.arbitrage[i, 0]), "arbitrage_2": float(self.arbitrage[i, 1]),
+                "ratio_1": float(self.ratio[i, 0]), "ratio_2": float(self.ratio[i, 1])}
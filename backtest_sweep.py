@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+バックテストのパラメータスイープ
+価格差データを共有メモリに1回だけ載せ、シナリオをプロセスプールで並列に評価して
+総P&L順のランキング表を返す
+
+    python backtest_sweep.py
+"""
+
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from first_passage import FirstPassageIndex
+from realistic_arbitrage_analysis import ArbitrageSimulator, simulate_arrays
+
+# ワーカープロセス側で共有メモリに割り当てた配列
+_shared = {}
+
+
+def _attach(name, n):
+    """ワーカー初期化: 共有メモリ上の datetime / arbitrage_1 / arbitrage_2 を参照する"""
+    shm = shared_memory.SharedMemory(name=name)
+    _shared["shm"] = shm
+    _shared["dt_ns"] = np.ndarray((n,), dtype=np.int64, buffer=shm.buf, offset=0)
+    _shared["arb1"] = np.ndarray((n,), dtype=np.float64, buffer=shm.buf, offset=8 * n)
+    _shared["arb2"] = np.ndarray((n,), dtype=np.float64, buffer=shm.buf, offset=16 * n)
+    # 初到達インデックスはワーカーごとに1回だけ作り、全シナリオで共有する
+    _shared["indexes"] = (FirstPassageIndex(_shared["arb1"]), FirstPassageIndex(_shared["arb2"]))
+
+
+def _evaluate(scenario, trading_fee=0.001):
+    result = simulate_arrays(_shared["dt_ns"], _shared["arb1"], _shared["arb2"],
+                             scenario['entry'], scenario['exit'], scenario['stop_loss'],
+                             scenario['max_hold'], trading_fee, indexes=_shared["indexes"])
+    return summarize(scenario, result['pnl'], result['duration_minutes'])
+
+
+def summarize(scenario, pnl, duration_minutes):
+    """シナリオ1件の集計（analyze_results と同じ指標）"""
+    total_trades = len(pnl)
+    return {
+        'name': scenario.get('name', ''),
+        'entry': scenario['entry'],
+        'exit': scenario['exit'],
+        'stop_loss': scenario['stop_loss'],
+        'max_hold': scenario['max_hold'],
+        'total_trades': total_trades,
+        'total_pnl': float(pnl.sum()) if total_trades else 0.0,
+        'mean_pnl': float(pnl.mean()) if total_trades else np.nan,
+        'win_rate': float((pnl > 0).sum() / total_trades * 100) if total_trades else np.nan,
+        'max_loss': float(pnl.min()) if total_trades else np.nan,
+        'mean_duration_minutes': float(duration_minutes.mean()) if total_trades else np.nan,
+    }
+
+
+def make_grid(entries, exits, stop_losses, max_holds):
+    """各パラメータの候補の直積でシナリオを作る"""
+    return [{'name': f"E{e}/X{x}/SL{sl}/H{h}", 'entry': e, 'exit': x, 'stop_loss': sl, 'max_hold': h}
+            for e, x, sl, h in itertools.product(entries, exits, stop_losses, max_holds)]
+
+
+def run_sweep(df, scenarios, max_workers=None, trading_fee=0.001):
+    """
+    シナリオを並列に評価し、総P&Lの降順に並べた結果表を返す
+    df は datetime / arbitrage_1 / arbitrage_2 列を持つ（load_data() の戻り値）
+    """
+    n = len(df)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, 24 * n))
+    try:
+        np.ndarray((n,), dtype=np.int64, buffer=shm.buf, offset=0)[:] = \
+            df['datetime'].values.astype('datetime64[ns]').astype(np.int64)
+        np.ndarray((n,), dtype=np.float64, buffer=shm.buf, offset=8 * n)[:] = df['arbitrage_1'].values
+        np.ndarray((n,), dtype=np.float64, buffer=shm.buf, offset=16 * n)[:] = df['arbitrage_2'].values
+
+        # 1プロセスあたり数十件ずつ渡してプロセス間通信を減らす
+        workers = max_workers or os.cpu_count() or 1
+        chunksize = max(1, len(scenarios) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=(shm.name, n)) as executor:
+            rows = list(executor.map(_evaluate, scenarios, [trading_fee] * len(scenarios), chunksize=chunksize))
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return (pd.DataFrame(rows)
+            .sort_values('total_pnl', ascending=False, kind='stable')
+            .reset_index(drop=True))
+
+
+def main():
+    df = ArbitrageSimulator().load_data()
+    scenarios = make_grid(entries=[20000, 25000, 30000, 35000, 40000, 45000, 50000, 55000, 60000, 70000],
+                          exits=[3000, 5000, 7000, 10000, 15000],
+                          stop_losses=[-3000, -5000, -8000, -10000, -15000],
+                          max_holds=[60, 120, 240, 480])
+    start = time.perf_counter()
+    results = run_sweep(df, scenarios)
+    print(f"{len(scenarios)}シナリオ / {len(df):,}行: {time.perf_counter() - start:.1f}秒")
+    print(results.head(20).to_string())
+    return results
+
+
+if __name__ == "__main__":
+    main()
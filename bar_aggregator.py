@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+上位足の逐次集計（1分足 → 15分足 → 1時間足 → 2時間足 のカスケード）
+下位の足が更新・確定するたびに上位の足を O(1) で更新し、utils.resample と同じルール（RESAMPLE_TEMPLATE）で集計する
+
+- 各段は「確定した子の足の集計」と「進行中の子の足」を持ち、進行中の足はその2つを合わせたもの
+- 進行中の基準足（同じ開始時刻）の更新は、上位の進行中の足だけを作り直す
+- 足の無い期間は resample と同じく OHLC が NaN、合計が 0、timestamp が NaN の足で埋める
+- 合計は子の足の合計を足し合わせるため、resample（基準足を直接足す）と最下位桁が異なることがある
+"""
+
+from collections import deque
+
+import pandas as pd
+
+from utils import RESAMPLE_TEMPLATE
+
+NAN = float("nan")
+
+
+def _first(a, b):
+    return a if a == a else b
+
+
+def _last(a, b):
+    return b if b == b else a
+
+
+def _max(a, b):
+    if b != b or a >= b:
+        return a
+    return b
+
+
+def _min(a, b):
+    if b != b or a <= b:
+        return a
+    return b
+
+
+def _sum(a, b):
+    return a + b
+
+
+RULES = {"first": _first, "last": _last, "max": _max, "min": _min, "sum": _sum}
+
+
+class _Level():
+    """1つの時間足の段"""
+
+    def __init__(self, sec, columns, maxlen):
+        self.sec = sec
+        self.columns = columns
+        self.rules = [(column, RULES[RESAMPLE_TEMPLATE[column]]) for column in columns]
+        self.bars = deque(maxlen=maxlen)  # 確定した足 (開始時刻, 足)
+        self.period = None  # 進行中の足の開始時刻
+        self.closed = None  # 進行中の足のうち確定した子の足の集計
+        self.child_start = None  # 進行中の子の足の開始時刻
+        self.child = None
+        self.current = None  # 進行中の足
+
+    def update(self, child_start, child):
+        if self.child_start is not None:
+            if child_start < self.child_start:
+                return False
+            if child_start == self.child_start:
+                self.child = child
+                self.current = self._combine(self.closed, child)
+                return True
+            # 新しい子の足が始まったので、前の子の足は確定
+            self.closed = self._combine(self.closed, self.child)
+
+        period = child_start - child_start % self.sec
+        if self.period is not None and period != self.period:
+            self._close(period)
+        self.period = period
+        self.child_start = child_start
+        self.child = child
+        self.current = self._combine(self.closed, child)
+        return True
+
+    def _close(self, period):
+        """進行中の足を確定し、period までの足の無い期間を埋める"""
+        self.bars.append((self.period, self.closed))
+        gap = range(self.period + self.sec, period, self.sec)
+        for start in gap[-self.bars.maxlen:] if self.bars.maxlen else gap:
+            self.bars.append((start, self._empty()))
+        self.closed = None
+
+    def _combine(self, a, b):
+        if a is None:
+            return {column: b[column] for column in self.columns}
+        return {column: rule(a[column], b[column]) for column, rule in self.rules}
+
+    def _empty(self):
+        return {column: 0 if RESAMPLE_TEMPLATE[column] == "sum" else NAN for column in self.columns}
+
+
+class MultiTimeframeBars():
+    """
+    基準足（既定は1分足）から複数の上位足を逐次集計する
+    timeframes は昇順で、それぞれが1つ前の足（先頭は基準足）の秒数の倍数であること
+    """
+
+    def __init__(self, base_sec=60, timeframes=(60 * 15, 60 * 60, 60 * 60 * 2), maxlen=500):
+        previous = base_sec
+        for sec in timeframes:
+            if sec <= previous or sec % previous != 0:
+                raise ValueError(f"timeframe {sec} is not a multiple of {previous}")
+            previous = sec
+        self.base_sec = base_sec
+        self.timeframes = list(timeframes)
+        self.maxlen = maxlen
+        self.columns = None
+        self.levels = None
+        self.first = None  # 最初に受け取った基準足の開始時刻
+        self.last = None  # 最後に受け取った基準足の開始時刻
+
+    # ------------------------------------------------ #
+    # 更新
+    # ------------------------------------------------ #
+    def update(self, timestamp, bar):
+        """
+        基準足を1本反映する（timestamp は足の開始時刻の epoch秒、bar は列名 -> 値）
+        最後の足と同じ開始時刻なら進行中の足の更新として扱い、それより古い足は無視して False を返す
+        """
+        timestamp = int(timestamp)
+        if self.last is not None and timestamp < self.last:
+            return False
+        if self.levels is None:
+            self.columns = [column for column in bar if column in RESAMPLE_TEMPLATE]
+            self.levels = [_Level(sec, self.columns, self.maxlen) for sec in self.timeframes]
+            self.first = timestamp
+        self.last = timestamp
+
+        child_start, child = timestamp, bar
+        for level in self.levels:
+            level.update(child_start, child)
+            child_start, child = level.period, level.current
+        return True
+
+    def update_frame(self, df):
+        """exec_date インデックスの基準足 DataFrame を古い順に反映する"""
+        starts = df.index.view("int64") // 10**9
+        for start, bar in zip(starts, df.to_dict("records")):
+            self.update(start, bar)
+
+    # ------------------------------------------------ #
+    # 参照
+    # ------------------------------------------------ #
+    def current(self, sec):
+        """sec 秒足の進行中の足 (開始時刻, 足)"""
+        level = self._level(sec)
+        return level.period, level.current
+
+    def to_frame(self, sec, n=None, tz=None):
+        """sec 秒足の直近 n 本（進行中の足を含む）を utils.resample と同じ形の DataFrame にする"""
+        level = self._level(sec)
+        rows = list(level.bars)
+        if level.current is not None:
+            rows.append((level.period, level.current))
+        if n is not None:
+            rows = rows[-n:]
+        index = pd.to_datetime([start for start, _ in rows], unit="s")
+        if tz is not None:
+            index = index.tz_localize("UTC").tz_convert(tz)
+        return pd.DataFrame([bar for _, bar in rows], columns=self.columns or [],
+                            index=pd.DatetimeIndex(index, name="exec_date"))
+
+    def _level(self, sec):
+        if sec not in self.timeframes:
+            raise ValueError(f"timeframe {sec} is not aggregated")
+        if self.levels is None:
+            return _Level(sec, [], 1)
+        return self.levels[self.timeframes.index(sec)]
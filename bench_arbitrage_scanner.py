@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+ArbitrageScanner の確認（銘柄ごとの計算との一致と、板更新1回あたりの処理時間）
+全銘柄の BestBidAsk に合成した板の変更を流し、1件ごとに update して、
+GMOBitbankArbitrageBot.main と同じ式で1銘柄ずつ計算した価格差と比べる
+1銘柄だけを監視した場合と全銘柄を監視した場合の処理時間も比べる
+
+    python bench_arbitrage_scanner.py [板の変更数]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from arbitrage_scanner import ArbitrageScanner
+from best_bid_ask import BestBidAsk
+from rest_price_check import SUPPORTED_SYMBOLS
+
+
+def make_books(symbols):
+    """銘柄ごとに GMO・Bitbank の板を作る（価格帯は銘柄ごとに変える）"""
+    gmo_books, bitbank_books, prices = {}, {}, {}
+    for k, (gmo_symbol, bitbank_symbol) in enumerate(symbols.items()):
+        price = 10.0 ** (1 + k % 7)
+        prices[gmo_symbol] = price
+        for books, symbol in ((gmo_books, gmo_symbol), (bitbank_books, bitbank_symbol)):
+            book = BestBidAsk(symbol)
+            for j in range(1, 21):
+                book.apply("insert", "bids", price * (1 - j * 1e-4), 1.0)
+                book.apply("insert", "asks", price * (1 + j * 1e-4), 1.0)
+            books[symbol] = book
+    return gmo_books, bitbank_books, prices
+
+
+def make_changes(symbols, prices, n, rng):
+    """(取引所, 銘柄, operation, side, price, size) の板の変更"""
+    gmo_symbols = list(symbols)
+    picks = rng.integers(len(gmo_symbols), size=n)
+    exchanges = rng.integers(2, size=n)
+    sides = rng.integers(2, size=n)
+    offsets = rng.integers(1, 21, size=n)
+    deletes = rng.random(n) < 0.3
+    changes = []
+    for i, exchange, side, offset, delete in zip(picks, exchanges, sides, offsets, deletes):
+        gmo_symbol = gmo_symbols[i]
+        symbol = gmo_symbol if exchange == 0 else symbols[gmo_symbol]
+        sign = -1 if side == 0 else 1
+        price = prices[gmo_symbol] * (1 + sign * offset * 1e-4)
+        changes.append((exchange, symbol, "delete" if delete else "update", "bids" if side == 0 else "asks",
+                        price, 1.0))
+    return changes
+
+
+def run(symbols, n, check):
+    rng = np.random.default_rng(0)
+    gmo_books, bitbank_books, prices = make_books(symbols)
+    changes = make_changes(symbols, prices, n, rng)
+    scanner = ArbitrageScanner(symbols)
+    elapsed = 0.0
+    for exchange, symbol, operation, side, price, size in changes:
+        book = (gmo_books if exchange == 0 else bitbank_books)[symbol]
+        book.apply(operation, side, price, size)
+        start = time.perf_counter()
+        scanner.update(gmo_books, bitbank_books)
+        elapsed += time.perf_counter() - start
+        if check:
+            for gmo_symbol, bitbank_symbol in symbols.items():
+                gmo_book, bitbank_book = gmo_books[gmo_symbol], bitbank_books[bitbank_symbol]
+                if not (gmo_book.ready() and bitbank_book.ready()):
+                    continue
+                row = scanner.row(gmo_symbol)
+                assert row["arbitrage_1"] == bitbank_book.best_bid - gmo_book.best_ask, gmo_symbol
+                assert row["arbitrage_2"] == gmo_book.best_bid - bitbank_book.best_ask, gmo_symbol
+    return elapsed
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+    run(SUPPORTED_SYMBOLS, min(n, 20_000), check=True)
+    print(f"一致確認: {len(SUPPORTED_SYMBOLS)}銘柄, {min(n, 20_000):,}変更 OK")
+
+    one = run({'BTC_JPY': SUPPORTED_SYMBOLS['BTC_JPY']}, n, check=False)
+    all_symbols = run(SUPPORTED_SYMBOLS, n, check=False)
+    print(f"処理時間: 1銘柄 {one / n * 1e6:.1f}µs, {len(SUPPORTED_SYMBOLS)}銘柄 {all_symbols / n * 1e6:.1f}µs"
+          f" (板の変更1件ごとの update)")
+
+
+if __name__ == "__main__":
+    main()
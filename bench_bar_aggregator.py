@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+MultiTimeframeBars の確認（utils.resample との一致と1回の更新あたりの処理時間）
+取引の途切れる時間帯を含む合成1分足を、進行中の足の更新も交えて1本ずつ流し、途中の時点ごとに各時間足を比較する
+
+    python bench_bar_aggregator.py [1分足の本数]
+"""
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import utils
+from bar_aggregator import MultiTimeframeBars
+
+TIMEFRAMES = (60 * 15, 60 * 60, 60 * 60 * 2)
+
+
+def make_bars(n, seed=0):
+    """1分足（約1割の分は足が無い）と、各足の途中経過（最終値に至る数回の更新）"""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp('2024-03-01').value // 10**9
+    minutes = np.flatnonzero(rng.random(int(n * 1.1)) > 0.1)[:n]
+    close = 60000 + np.cumsum(rng.normal(0, 20, len(minutes)))
+    open_ = close + rng.normal(0, 10, len(minutes))
+    high = np.maximum(open_, close) + rng.exponential(5, len(minutes))
+    low = np.minimum(open_, close) - rng.exponential(5, len(minutes))
+    volume = rng.exponential(3, len(minutes))
+    buy_num = rng.integers(0, 50, len(minutes))
+    df = pd.DataFrame({
+        'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': volume,
+        'buy_vol': volume * rng.random(len(minutes)), 'buy_num': buy_num,
+        'timestamp': start + minutes * 60 + 59,
+    }, index=pd.DatetimeIndex(pd.to_datetime(start + minutes * 60, unit='s'), name='exec_date'))
+    updates = rng.integers(1, 4, len(df))
+    return df, updates
+
+
+def stream(df, updates):
+    """進行中の足の途中経過を挟みながら (開始時刻, 足, 確定した基準足の本数) を流す（途中経過では本数は None）"""
+    starts = df.index.view('int64') // 10**9
+    for i, (start, bar, count) in enumerate(zip(starts, df.to_dict('records'), updates)):
+        for k in range(count - 1, 0, -1):
+            partial = dict(bar)
+            partial['Close'] = bar['Open'] + (bar['Close'] - bar['Open']) / (k + 1)
+            partial['High'] = max(bar['Open'], partial['Close'])
+            partial['Low'] = min(bar['Open'], partial['Close'])
+            partial['Volume'] = bar['Volume'] / (k + 1)
+            yield start, partial, None
+        yield start, bar, i + 1
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    df, updates = make_bars(n)
+    checkpoints = set(np.linspace(100, len(df), 7).astype(int))
+
+    bars = MultiTimeframeBars(60, TIMEFRAMES, maxlen=len(df))
+    messages = list(stream(df, updates))
+    elapsed = 0.0
+    checked = 0
+    for start, bar, count in messages:
+        t = time.perf_counter()
+        bars.update(start, bar)
+        elapsed += time.perf_counter() - t
+        if count in checkpoints:
+            # 進行中の足を含めて、その時点までの1分足を resample した結果と比べる
+            for sec in TIMEFRAMES:
+                expected = utils.resample(df.iloc[:count], sec)
+                pd.testing.assert_frame_equal(expected, bars.to_frame(sec), check_dtype=False, check_freq=False,
+                                              check_exact=False, rtol=1e-12)
+            checked += 1
+    assert checked == len(checkpoints)
+
+    print(f"一致確認: 1分足 {len(df):,}本（更新 {len(messages):,}回）, {', '.join(f'{sec // 60}分足' for sec in TIMEFRAMES)} OK")
+    print(f"処理時間: 1回の更新あたり {elapsed / len(messages) * 1e6:.1f}µs")
+
+    t = time.perf_counter()
+    for _ in range(20):
+        utils.resample(df, TIMEFRAMES[-1], 12)
+    print(f"参考    : utils.resample（2時間足, 全履歴）1回 {(time.perf_counter() - t) / 20 * 1e3:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
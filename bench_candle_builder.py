@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+CandleBuilder の確認（utils.makeCandles との一致と1約定あたりの処理時間）
+合成した1日分の Bybit 約定を1件ずつ流し、最初の約定から最後の約定までの1秒足を比較する
+（約定サイズを丸めているため出来高0の約定も含まれ、その穴埋めルールも確認できる）
+
+    python bench_candle_builder.py [約定数]
+"""
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import utils
+from bench_make_candles import make_trades
+from candle_builder import COLUMNS, CandleBuilder, normalize_trade
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 300_000
+
+    trades = make_trades(n)
+    # 取引所の約定時刻に合わせてミリ秒に丸める
+    trades['timestamp'] = np.round(trades['timestamp'].values * 1000).astype(np.int64) / 1000
+    messages = [{'T': int(round(ts * 1000)), 's': 'BTCUSDT', 'S': side, 'p': str(price), 'v': str(size)}
+                for ts, side, price, size in zip(trades['timestamp'], trades['side'], trades['price'], trades['size'])]
+
+    builder = CandleBuilder('BTCUSDT')
+    start = time.perf_counter()
+    for message in messages:
+        builder.apply(*normalize_trade(message)[1:])
+    builder.flush(messages[-1]['T'] + 1000)
+    elapsed = time.perf_counter() - start
+    streamed = builder.to_frame()
+
+    offline = utils.makeCandles(trades.copy(), 1)
+    offline = offline.loc[streamed.index[0]:streamed.index[-1], COLUMNS]
+    # 先頭の足はオフライン版では直前の足が無く Open が NaN になるため除く
+    pd.testing.assert_frame_equal(offline.iloc[1:], streamed.iloc[1:], check_exact=True, check_dtype=False,
+                                  check_freq=False)
+    print(f"一致確認: {n:,}約定 → {len(streamed):,}本 OK")
+    print(f"処理時間: {elapsed:.2f}秒 (1約定あたり {elapsed / n * 1e6:.1f}µs, 正規化を含む)")
+
+
+if __name__ == "__main__":
+    main()
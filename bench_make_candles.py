@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+utils.makeCandles のベンチマーク（1行ずつ欠損秒を挿入する旧版 と reindex版 の比較）
+合成した1日分の Bybit 約定データ（公開約定CSVと同じ列）で、出力の一致と実行時間を確認する
+
+    python bench_make_candles.py [約定数] [秒足の秒数]
+"""
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import utils
+
+
+def make_trades(n, day='2024-03-01', seed=0):
+    """1日分の約定（取引が途切れる時間帯を含む）"""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp(day, tz='UTC').value / 1e9
+    # 取引の多い時間帯と少ない時間帯が交互に来るように、時間帯ごとの強度を変える
+    intensity = np.repeat(rng.choice([0.02, 0.2, 1.0], size=96, p=[0.3, 0.3, 0.4]), 900)
+    seconds = rng.choice(86400, size=n, p=intensity / intensity.sum())
+    timestamp = np.sort(start + seconds + rng.random(n))
+    price = 60000 + np.cumsum(rng.normal(0, 2, n)).round(1)
+    return pd.DataFrame({
+        'timestamp': timestamp,
+        'symbol': 'BTCUSDT',
+        'side': np.where(rng.random(n) < 0.5, 'Buy', 'Sell'),
+        'size': rng.exponential(0.01, n).round(4),
+        'price': price,
+        'tickDirection': 'PlusTick',
+        'trdMatchID': 'id',
+        'grossValue': 0.0,
+        'homeNotional': 0.0,
+        'foreignNotional': 0.0,
+    })
+
+
+def legacy_make_candles(df, sec):
+    """変更前の実装（欠損秒を1行ずつ追加し、NaN が減らなくなるまで ffill）"""
+    df.drop(['tickDirection', 'trdMatchID', 'grossValue', 'homeNotional', 'foreignNotional'], axis=1, inplace=True)
+    df = df.sort_index()
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit="s", utc=True)
+    df = df.rename(columns={'timestamp': 'exec_date'})
+    df = df.set_index('exec_date')
+
+    df['buy_size'] = df['size'].where(df['side'] == 'Buy', 0)
+    df['buy_flag'] = df['side'] == 'Buy'
+    df['sell_size'] = df['size'].where(df['side'] == 'Sell', 0)
+    df['sell_flag'] = df['side'] == 'Sell'
+
+    df_ohlcv = df.resample('{}S'.format(sec)).agg({"price": "ohlc", "size": "sum", "buy_size": "sum", "buy_flag": "sum",
+                                                   "sell_size": "sum", "sell_flag": "sum", })
+    df_ohlcv.columns = ['Open', 'High', 'Low', 'Close', 'Volume', 'buy_vol', 'buy_num', 'sell_vol', 'sell_num']
+
+    condition = (df_ohlcv['Volume'] == 0)
+    df_ohlcv.loc[condition, 'Open'] = df_ohlcv['Close'].shift(1)[condition]
+    df_ohlcv.loc[condition, 'Low'] = df_ohlcv['Close'].shift(1)[condition]
+    df_ohlcv.loc[condition, 'High'] = df_ohlcv['Close'].shift(1)[condition]
+    df_ohlcv.loc[condition, 'Close'] = df_ohlcv['Close'].shift(1)[condition]
+
+    condition = (df_ohlcv['Open'] < df_ohlcv['Low'])
+    df_ohlcv.loc[condition, 'Low'] = df_ohlcv.loc[condition, 'Open']
+    condition = (df_ohlcv['Open'] > df_ohlcv['High'])
+    df_ohlcv.loc[condition, 'High'] = df_ohlcv.loc[condition, 'Open']
+
+    df_ohlcv['buy_num'] = df_ohlcv['buy_num'].astype(int)
+    df_ohlcv['sell_num'] = df_ohlcv['sell_num'].astype(int)
+
+    date_part = df_ohlcv.index[0].date()
+    missing_periods = pd.date_range(start=f'{date_part} 00:00:00+00:00', end=f'{date_part} 23:59:59+00:00', freq='S').difference(df_ohlcv.index)
+    default_data = {'buy_vol': 0.0, 'buy_num': 0.0, 'sell_vol': 0.0, 'sell_num': 0.0}
+    for timestamp in missing_periods:
+        df_ohlcv.loc[timestamp] = default_data
+
+    df_ohlcv.sort_index(inplace=True)
+    df_ohlcv["timestamp"] = df_ohlcv.index.view('int64') // 10**9
+
+    while True:
+        nan_count = df_ohlcv.isna().sum().sum()
+        df_ohlcv.ffill(inplace=True)
+        if nan_count == df_ohlcv.isna().sum().sum():
+            break
+
+    condition = (df_ohlcv.index.second == 0)
+    df_ohlcv.loc[condition, 'Open'] = df_ohlcv['Close'].shift(1)[condition]
+
+    condition = (df_ohlcv['Open'] < df_ohlcv['Low'])
+    df_ohlcv.loc[condition, 'Low'] = df_ohlcv.loc[condition, 'Open']
+    condition = (df_ohlcv['Open'] > df_ohlcv['High'])
+    df_ohlcv.loc[condition, 'High'] = df_ohlcv.loc[condition, 'Open']
+
+    return df_ohlcv
+
+
+def run(func, trades, sec):
+    start = time.perf_counter()
+    candles = func(trades.copy(), sec)
+    return candles, time.perf_counter() - start
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 300_000
+    # 秒足以外では、足の間の秒がすべて欠損として1秒刻みで追加される（旧版で最も遅いケース）
+    sec = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+
+    trades = make_trades(n)
+    ref, ref_time = run(legacy_make_candles, trades, sec)
+    new, new_time = run(utils.makeCandles, trades, sec)
+
+    pd.testing.assert_frame_equal(ref, new, check_exact=True, check_freq=True)
+    assert ref.index.name == new.index.name
+    print(f"一致確認: {n:,}約定, {sec}秒足 → {len(new):,}行 OK")
+    print(f"旧版   : {ref_time:.2f}秒")
+    print(f"reindex版: {new_time:.2f}秒")
+    print(f"高速化 : 約{ref_time / new_time:.0f}倍")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+mean_reversion_analysis の時間窓スキャンのベンチマーク（行ごとのマスク版 と 初到達インデックス版 の比較）
+合成した1秒間隔の価格差データで、結果表の一致と実行時間を確認する
+
+    python bench_mean_reversion.py [行数]
+"""
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from bench_backtest import make_spread_data
+from mean_reversion_analysis import recovery_minutes, reversion_table, sorted_arrays
+
+WINDOWS = [1, 2, 5, 10, 20, 30, 60, 120, 240, 480, 720]
+
+
+def legacy_reversion_table(combined_df, extreme_indices, windows_minutes, exit_threshold):
+    """変更前の実装（イベント×時間窓ごとに全行のマスクを作る）"""
+    results = []
+    for window_minutes in windows_minutes:
+        profitable_cases = 0
+        total_cases = 0
+        profit_amounts = []
+        for idx in extreme_indices:
+            entry_time = combined_df.loc[idx, 'datetime']
+            entry_arb1 = combined_df.loc[idx, 'arbitrage_1']
+            future_time_limit = entry_time + pd.Timedelta(minutes=window_minutes)
+            future_mask = (combined_df['datetime'] > entry_time) & (combined_df['datetime'] <= future_time_limit)
+            future_arb2_values = combined_df[future_mask]['arbitrage_2']
+            if len(future_arb2_values) > 0:
+                viable_exits = future_arb2_values[future_arb2_values >= exit_threshold]
+                exit_arb2 = viable_exits.iloc[0] if len(viable_exits) > 0 else future_arb2_values.iloc[-1]
+                net_profit = entry_arb1 + exit_arb2 - (abs(entry_arb1) + abs(exit_arb2)) * 0.001
+                total_cases += 1
+                profit_amounts.append(net_profit)
+                if net_profit > 0:
+                    profitable_cases += 1
+        if total_cases > 0:
+            results.append({
+                'window_minutes': window_minutes,
+                'total_cases': total_cases,
+                'profitable_cases': profitable_cases,
+                'success_rate': profitable_cases / total_cases * 100,
+                'avg_profit': np.mean(profit_amounts),
+                'median_profit': np.median(profit_amounts)
+            })
+    return results
+
+
+def legacy_recovery_minutes(combined_df, extreme_indices, window_minutes, profit_level):
+    recovery_times = []
+    for idx in extreme_indices:
+        entry_time = combined_df.loc[idx, 'datetime']
+        future_time_limit = entry_time + pd.Timedelta(minutes=window_minutes)
+        future_mask = (combined_df['datetime'] > entry_time) & (combined_df['datetime'] <= future_time_limit)
+        future_data = combined_df[future_mask]
+        profitable_data = future_data[future_data['arbitrage_2'] > profit_level]
+        if len(profitable_data) > 0:
+            recovery_times.append((profitable_data['datetime'].iloc[0] - entry_time).total_seconds() / 60)
+    return recovery_times
+
+
+def run(df):
+    extreme_indices = df[df['arbitrage_1'] > 40000].index.tolist()
+    dt_ns, arb2, entry_pos = sorted_arrays(df, extreme_indices)
+    entry_arb1 = df.loc[extreme_indices, 'arbitrage_1'].values
+    table = reversion_table(dt_ns, arb2, entry_pos, entry_arb1, WINDOWS, 5000)
+    recovery = recovery_minutes(dt_ns, arb2, entry_pos[:100], 20, 5000)
+    return extreme_indices, table, recovery
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2_600_000
+    reference_rows = min(n, 50_000)
+
+    # 一致確認（マスク版は遅いので先頭のみ）
+    head = make_spread_data(reference_rows)
+    ref_indices = head[head['arbitrage_1'] > 40000].index.tolist()
+    start = time.perf_counter()
+    ref_table = legacy_reversion_table(head, ref_indices, WINDOWS, 5000)
+    ref_recovery = legacy_recovery_minutes(head, ref_indices[:100], 20, 5000)
+    ref_time = time.perf_counter() - start
+    _, table, recovery = run(head)
+    assert ref_table == table, "reversion table mismatch"
+    assert ref_recovery == recovery, "recovery time mismatch"
+    print(f"一致確認: {reference_rows:,}行, {len(ref_indices)}イベント OK")
+
+    df = make_spread_data(n)
+    start = time.perf_counter()
+    extreme_indices, _, _ = run(df)
+    new_time = time.perf_counter() - start
+    # マスク版はイベント数×行数に比例する
+    legacy_estimate = ref_time * len(extreme_indices) / max(1, len(ref_indices)) * n / reference_rows
+    print(f"マスク版      : {ref_time:.2f}秒 ({reference_rows:,}行) → {n:,}行の推定 {legacy_estimate:.0f}秒")
+    print(f"インデックス版: {new_time:.2f}秒 ({n:,}行, {len(extreme_indices)}イベント)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+PriceCsvWriter の確認（CSV と価格差履歴ストアの行数の一致と1行あたりの処理時間）
+一時ディレクトリで、既に行のある日別CSV（以前の実行や save_to_csv の行）に続けて書き込み、
+終了後に CSV の行数とストアの行数が一致し、sync_csv で取り込み直すCSVが無いことを確認する
+書き込み中に別のプロセスが同じCSVに追記した場合は、sync_csv の後に一致することを確認する
+
+    python bench_price_csv_writer.py [行数]
+"""
+
+import csv
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from price_csv_writer import PriceCsvWriter
+from rest_price_check import CSV_FIELDNAMES, SUPPORTED_SYMBOLS
+from spread_store import SpreadStore
+
+START = datetime(2026, 1, 5, 9, 0, 0).timestamp()
+
+
+def make_row(i, symbol):
+    timestamp = START + i
+    return {"timestamp": timestamp, "datetime": datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S"),
+            "symbol": symbol, "gmo_bid": 100.0 + i, "gmo_ask": 101.0 + i, "gmo_spread": 1.0,
+            "bitbank_bid": 102.0 + i, "bitbank_ask": 103.0 + i, "bitbank_spread": 1.0,
+            "arbitrage_1": 1.0, "arbitrage_2": -3.0, "max_arbitrage": 1.0}
+
+
+def append_csv(path, rows):
+    """save_to_csv と同じ追記（ヘッダーは新規ファイルのときだけ）"""
+    new_file = not os.path.isfile(path)
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDNAMES)
+        if new_file:
+            writer.writeheader()
+        writer.writerows(rows)
+
+
+def count_rows(path, store):
+    csv_rows = len(pd.read_csv(path))
+    store_rows = len(store.query_all())
+    return csv_rows, store_rows
+
+
+def run(directory, n, foreign):
+    symbols = list(SUPPORTED_SYMBOLS)
+    store = SpreadStore(os.path.join(directory, "spread_store"))
+    writer = PriceCsvWriter(CSV_FIELDNAMES, directory=directory, prefix="price_data_all_symbols",
+                            store=store, store_interval=0.0)
+    path = writer.path_for(datetime.fromtimestamp(START).strftime("%Y%m%d"))
+
+    # 既に行のある日別CSV
+    append_csv(path, [make_row(i, symbol) for i in range(10) for symbol in symbols])
+
+    start = time.perf_counter()
+    with writer:
+        for i in range(10, 10 + n):
+            for symbol in symbols:
+                writer.write(make_row(i, symbol))
+            if foreign and i == 10 + n // 2:
+                writer.flush()
+                append_csv(path, [make_row(i, "BTC_JPY_FOREIGN")])
+    elapsed = time.perf_counter() - start
+    return path, store, elapsed
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rows = n * len(SUPPORTED_SYMBOLS)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path, store, elapsed = run(directory, n, foreign=False)
+        csv_rows, store_rows = count_rows(path, store)
+        assert csv_rows == store_rows, f"行数が一致しない: CSV {csv_rows:,}, ストア {store_rows:,}"
+        assert store.stale_csv([path]) == [], "取り込み済みになっていない"
+        print(f"一致確認: 既存の行から続けて書き込み CSV {csv_rows:,}行 = ストア {store_rows:,}行 OK")
+        print(f"処理時間: {elapsed:.2f}秒 (1行あたり {elapsed / rows * 1e6:.1f}µs, ストアへの追記を含む)")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path, store, _ = run(directory, n, foreign=True)
+        assert store.stale_csv([path]) == [path], "他のプロセスの行があるのに取り込み済みになっている"
+        store.sync_csv([path])
+        csv_rows, store_rows = count_rows(path, store)
+        assert csv_rows == store_rows, f"行数が一致しない: CSV {csv_rows:,}, ストア {store_rows:,}"
+        print(f"一致確認: 他のプロセスの追記あり sync_csv 後 CSV {csv_rows:,}行 = ストア {store_rows:,}行 OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+StreamingFeatures の確認（utils.calc_features との一致と足1本あたりの処理時間）
+合成した足を1本ずつ流し、各時点の出力行を、全体を calc_features に通した結果の同じ行と比べる
+（calc_features の各行はその行までの足だけで決まるため、全体を1回計算すれば各時点の比較になる）
+
+- 出力は5桁に丸めているため、丸めの境目で最下位桁が1つずれることがある（atol で吸収）
+- 分散・線形回帰・WMA は TA-Lib と丸め誤差の出方が異なり、相対 1e-11 程度までの差が出る
+- 相対誤差が大きく出るのは、0 付近の値での割り算（変化率）だけなので、それ以外の不一致があれば失敗にする
+  （変化率の列で、期待値の絶対値が CHANGE_LIMIT を超える＝分母が分子の差より小さい値だけを許す）
+
+    python bench_streaming_features.py [足の本数]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+import utils
+from bench_bar_aggregator import make_bars
+from streaming_indicators import StreamingFeatures
+
+CHANGE_LIMIT = 1.0  # 変化率がこれを超える値は分母が 0 付近とみなす
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    df, _ = make_bars(n)
+    df = df[['Open', 'High', 'Low', 'Close', 'Volume']]
+
+    features = StreamingFeatures()
+    rows = []
+    start = time.perf_counter()
+    for bar in df.to_dict('records'):
+        rows.append(features._update(bar))
+    elapsed = time.perf_counter() - start
+    streamed = np.vstack(rows)
+
+    start = time.perf_counter()
+    expected = utils.calc_features(df.copy())
+    offline = time.perf_counter() - start
+
+    assert list(expected.columns) == list(features.index), "列が一致しない"
+    values = expected.values.astype(float)
+    assert np.array_equal(np.isnan(values), np.isnan(streamed)), "NaN の位置が一致しない"
+    close = np.isclose(streamed, values, rtol=1e-6, atol=1.5e-5, equal_nan=True)
+    mismatched = sorted({features.index[j] for j in np.flatnonzero(~close.all(axis=0))})
+    rows, cols = np.nonzero(~close)
+    unexpected = [(features.index[j], values[i, j], streamed[i, j]) for i, j in zip(rows, cols)
+                  if "_change_" not in features.index[j] or not abs(values[i, j]) > CHANGE_LIMIT]
+
+    print(f"一致確認: {n:,}本 x {len(features.index):,}列, 不一致 {(~close).sum():,} / {close.size:,}")
+    if mismatched:
+        print(f"  不一致の列: {', '.join(mismatched[:8])}{' ...' if len(mismatched) > 8 else ''}")
+    assert not unexpected, f"分母が 0 付近の変化率以外の不一致 {len(unexpected):,}件: {unexpected[:5]}"
+    print(f"処理時間: 足1本あたり {elapsed / n * 1e6:.0f}µs")
+    print(f"参考    : utils.calc_features（{n:,}本）1回 {offline * 1e3:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import time
+
+
+# 取引所ごとの板データのキー名の違いを吸収する
+# GMO: symbol/side/price/size, bitbank: pair/side/price/amount, bybit(v5): s/S/p/v
+SYMBOL_KEYS = ("symbol", "pair", "s")
+SIDE_KEYS = ("side", "S")
+PRICE_KEYS = ("price", "p")
+SIZE_KEYS = ("size", "amount", "v")
+BID_SIDES = ("bids", "b", "Buy", "buy")
+ASK_SIDES = ("asks", "a", "Sell", "sell")
+
+
+def pick(item, keys):
+    for key in keys:
+        if key in item:
+            return item[key]
+    return None
+
+
+def normalize_level(item):
+    """
+    板の1レベルを (symbol, side, price, size) に変換する
+    side は "bids" / "asks" のいずれか。板のデータでなければ None を返す
+    """
+    side = pick(item, SIDE_KEYS)
+    if side in BID_SIDES:
+        side = "bids"
+    elif side in ASK_SIDES:
+        side = "asks"
+    else:
+        return None
+    price = pick(item, PRICE_KEYS)
+    if price is None:
+        return None
+    size = pick(item, SIZE_KEYS)
+    return pick(item, SYMBOL_KEYS), side, float(price), float(size) if size is not None else 0.0
+
+
+class BestBidAsk():
+    """
+    最良気配キャッシュ
+    DataStore の変更イベントから板を差分更新し、最良買い・売り気配をO(1)で返す
+    最良気配が削除された場合のみ次の気配を再計算する（参照時まで遅延）
+    """
+
+    def __init__(self, symbol=None):
+        self.symbol = symbol
+        self.bids = {}  # price -> size
+        self.asks = {}
+        self._best_bid = None
+        self._best_ask = None
+        self._bid_dirty = False
+        self._ask_dirty = False
+        self.timestamp = 0.0  # 最終更新時刻
+        self.updates = 0      # 更新回数（変更の有無の判定用）
+
+    def apply(self, operation, side, price, size):
+        """板の変更を1件反映する（operation: insert / update / delete）"""
+        if side == "bids":
+            if operation == "delete" or size <= 0:
+                if self.bids.pop(price, None) is not None and price == self._best_bid:
+                    self._bid_dirty = True
+            else:
+                self.bids[price] = size
+                if not self._bid_dirty and (self._best_bid is None or price > self._best_bid):
+                    self._best_bid = price
+        else:
+            if operation == "delete" or size <= 0:
+                if self.asks.pop(price, None) is not None and price == self._best_ask:
+                    self._ask_dirty = True
+            else:
+                self.asks[price] = size
+                if not self._ask_dirty and (self._best_ask is None or price < self._best_ask):
+                    self._best_ask = price
+        self.timestamp = time.time()
+        self.updates += 1
+
+    def clear(self):
+        self.bids.clear()
+        self.asks.clear()
+        self._best_bid = None
+        self._best_ask = None
+        self._bid_dirty = False
+        self._ask_dirty = False
+        self.timestamp = time.time()
+        self.updates += 1
+
+    @property
+    def best_bid(self):
+        if self._bid_dirty:
+            self._best_bid = max(self.bids) if self.bids else None
+            self._bid_dirty = False
+        return self._best_bid
+
+    @property
+    def best_ask(self):
+        if self._ask_dirty:
+            self._best_ask = min(self.asks) if self.asks else None
+            self._ask_dirty = False
+        return self._best_ask
+
+    @property
+    def best_bid_size(self):
+        best_bid = self.best_bid
+        return self.bids[best_bid] if best_bid is not None else 0.0
+
+    @property
+    def best_ask_size(self):
+        best_ask = self.best_ask
+        return self.asks[best_ask] if best_ask is not None else 0.0
+
+    def bid_level(self):
+        """最良買い気配を {"price", "size"} の形で返す"""
+        return {"price": self.best_bid, "size": self.best_bid_size}
+
+    def ask_level(self):
+        """最良売り気配を {"price", "size"} の形で返す"""
+        return {"price": self.best_ask, "size": self.best_ask_size}
+
+    def ready(self):
+        """買い・売りの両側に気配があるか"""
+        return len(self.bids) > 0 and len(self.asks) > 0
@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+from best_bid_ask import SYMBOL_KEYS, pick
+
+
+class BookUpdateTrigger():
+    """
+    板更新トリガー
+    pybotters の DataStore の watch ストリームを監視し、板が更新されたら戦略ループを起こす
+    （1回のメッセージで発生する複数の変更はまとめて1回の起床にする）
+    symbols を渡すと、その銘柄の板の変更でだけ起床する（複数銘柄を購読しているストア用）
+    """
+
+    def __init__(self, *datastores, min_interval=0.05, timeout=1.0, symbols=None):
+        self.datastores = datastores
+        self.symbols = None if symbols is None else set(symbols)
+        self.min_interval = min_interval  # 起床の最小間隔（秒）。バーストをまとめる
+        self.timeout = timeout            # 更新が無い場合でもこの秒数で起床する
+        self.event = asyncio.Event()
+        self.tasks = []
+        self.last_update = 0.0  # 最後に板更新を受信した時刻
+        self.last_wake = 0.0    # 最後に起床した時刻
+
+    def start(self):
+        """各ストアの監視を開始する"""
+        for datastore in self.datastores:
+            self.tasks.append(asyncio.create_task(self.watch(datastore)))
+
+    def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        self.tasks.clear()
+
+    async def watch(self, datastore):
+        with datastore.watch() as stream:
+            async for change in stream:
+                if self.symbols is not None and pick(change.data, SYMBOL_KEYS) not in self.symbols:
+                    continue
+                self.last_update = time.time()
+                self.event.set()
+
+    async def wait(self):
+        """
+        板更新を待つ
+        更新があれば True、timeout 秒更新が無ければ False を返す
+        """
+        # 直前の起床から min_interval 未満なら残り時間だけ待ち、その間の更新をまとめる
+        elapsed = time.time() - self.last_wake
+        if elapsed < self.min_interval:
+            await asyncio.sleep(self.min_interval - elapsed)
+
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout=self.timeout)
+            updated = True
+        except asyncio.TimeoutError:
+            updated = False
+        self.event.clear()
+        self.last_wake = time.time()
+        return updated
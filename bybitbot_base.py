@@ -2,7 +2,7 @@ import asyncio
 import traceback
 import pandas as pd
 
-import utils
+from bar_aggregator import MultiTimeframeBars
 
 class BybitBotBase():
     #User can ues MAX_DATA_CAPACITY to control memory usage.
@@ -19,6 +19,7 @@ class BybitBotBase():
         self.df_ohlcv = pd.DataFrame(columns=["exec_date", "Open", "High", "Low", "Close", "Volume", "timestamp"]).set_index("exec_date")
         self.df_2h_ohlcv = pd.DataFrame(
             columns=["exec_date", "Open", "High", "Low", "Close", "Volume", "timestamp"]).set_index("exec_date")
+        self.bars = MultiTimeframeBars(60, (60 * 15, 60 * 60, 60 * 60 * 2))  # 1分足から集計した上位足
         self.sum_profit = 0
         self.sum_fee = 0
         self.Debug = False
@@ -32,8 +33,7 @@ class BybitBotBase():
             if 1 < len(self.df_ohlcv) < 60 * 36:
                 while len(self.df_ohlcv) < 60 * 36:
                     first_line = self.df_ohlcv.index.view('int64')[0] // 10**9
-                    self.bybit.kline(1, first_line - 200 * 60)
-                    response = await self.bybit.send()
+                    response = await self.bybit.kline(1, first_line - 200 * 60).send()
 
                     if response[0]["ret_code"] == 0:
                         data_d_list = []
@@ -53,12 +53,28 @@ class BybitBotBase():
                         self.df_ohlcv = pd.concat([data_d, self.df_ohlcv])
 
             if 1 < len(self.df_ohlcv):
-                self.df_2h_ohlcv = utils.resample(self.df_ohlcv, 60 * 60 * 2, 12)
+                self.update_bars()
+                self.df_2h_ohlcv = self.bars.to_frame(60 * 60 * 2, 12, tz=self.df_ohlcv.index.tz)
         except Exception as e:
             print(e)
             print(traceback.format_exc().strip())
 
 
+    def update_bars(self):
+        """
+        前回以降に増えた（または更新された）1分足だけを上位足に反映する
+        過去分が先頭に追加されたときは最初から集計し直す
+        """
+        starts = self.df_ohlcv.index.view('int64') // 10**9
+        if self.bars.first is None or starts[0] < self.bars.first:
+            self.bars = MultiTimeframeBars(self.bars.base_sec, self.bars.timeframes, self.bars.maxlen)
+            begin = 0
+        else:
+            # 最後に反映した足は進行中だった可能性があるので、その足から反映し直す
+            begin = starts.searchsorted(self.bars.last)
+        self.bars.update_frame(self.df_ohlcv.iloc[begin:])
+
+
     async def run(self):
         while(True):
             await self.resample()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+約定ストリームからの1秒足生成
+utils.makeCandles と同じ列（Open..Close, Volume, buy_vol, buy_num, sell_vol, sell_num, timestamp）と
+同じ穴埋めルールで、約定1件ごとに O(1) で足を更新し、確定した足を返す
+
+- 約定の無い（出来高0の）秒は直前の終値で Open=High=Low=Close
+- 毎分0秒の足は Open を直前の足の終値にし、High/Low を Open を含むように広げる
+- 出来高の合計は pandas の resample().sum() と同じ補償付き加算（Kahan）で、オフライン版とビット単位で一致させる
+"""
+
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+COLUMNS = ["Open", "High", "Low", "Close", "Volume", "buy_vol", "buy_num", "sell_vol", "sell_num", "timestamp"]
+
+
+def normalize_trade(item):
+    """
+    取引所ごとの約定データを (symbol, 約定時刻ms, side "Buy"/"Sell", price, size) に正規化する
+    - Bybit v5 publicTrade: s / T / S / p / v
+    - GMOコイン trades: symbol / timestamp(ISO8601) / side / price / size
+    - bitbank transactions: pair / executed_at / side / price / amount
+    """
+    if "T" in item and "S" in item:
+        symbol, ts_ms, side, price, size = item["s"], int(item["T"]), item["S"], item["p"], item["v"]
+    elif "executed_at" in item:
+        symbol, ts_ms, side, price, size = item["pair"], int(item["executed_at"]), item["side"], item["price"], item["amount"]
+    elif "timestamp" in item and "symbol" in item:
+        ts = datetime.fromisoformat(item["timestamp"].replace("Z", "+00:00"))
+        ts_ms = (ts - EPOCH) // timedelta(milliseconds=1)
+        symbol, side, price, size = item["symbol"], item["side"], item["price"], item["size"]
+    else:
+        return None
+    side = "Buy" if side.lower() == "buy" else "Sell"
+    return symbol, ts_ms, side, float(price), float(size)
+
+
+class KahanSum():
+    """pandas の groupby sum と同じ補償付き加算"""
+
+    __slots__ = ("total", "compensation")
+
+    def __init__(self):
+        self.total = 0.0
+        self.compensation = 0.0
+
+    def add(self, value):
+        y = value - self.compensation
+        t = self.total + y
+        self.compensation = t - self.total - y
+        if self.compensation != self.compensation:
+            self.compensation = 0.0
+        self.total = t
+
+
+class CandleBuilder():
+    """1銘柄分の1秒足ビルダー"""
+
+    def __init__(self, symbol, maxlen=60 * 60 * 24):
+        self.symbol = symbol
+        self.bars = deque(maxlen=maxlen)  # 確定した足（古い順）
+        self.second = None  # 組み立て中の足の秒（epoch秒）
+        self.last_close = None  # 直前の足の終値（埋めた後）
+        self.prev_trade_close = None  # 直前の足の最後の約定価格（約定が無ければ None）
+        self.late_trades = 0  # 確定済みの秒に届いた約定の件数（足には反映しない）
+        self._reset()
+
+    def _reset(self):
+        self.open = self.high = self.low = self.close = None
+        self.volume = KahanSum()
+        self.buy_vol = KahanSum()
+        self.sell_vol = KahanSum()
+        self.buy_num = 0
+        self.sell_num = 0
+
+    def ready(self):
+        return self.last_close is not None or self.open is not None
+
+    # ------------------------------------------------ #
+    # 更新
+    # ------------------------------------------------ #
+    def apply(self, ts_ms, side, price, size):
+        """
+        約定を1件反映し、この約定で確定した足のリストを返す（通常は空）
+        確定済みの秒の約定は遡って反映できないため件数だけ数えて捨てる
+        """
+        second = ts_ms // 1000
+        finished = []
+        if self.second is None:
+            self.second = second
+        elif second < self.second:
+            self.late_trades += 1
+            return finished
+        elif second > self.second:
+            finished = self._close_until(second)
+
+        if self.open is None:
+            self.open = self.high = self.low = price
+        else:
+            if price > self.high:
+                self.high = price
+            if price < self.low:
+                self.low = price
+        self.close = price
+        is_buy = side == "Buy"
+        self.volume.add(size)
+        self.buy_vol.add(size if is_buy else 0.0)
+        self.sell_vol.add(0.0 if is_buy else size)
+        self.buy_num += is_buy
+        self.sell_num += not is_buy
+        return finished
+
+    def flush(self, now_ms):
+        """now_ms の秒より前の足をすべて確定させて返す（約定の無い時間帯に足を進める）"""
+        second = now_ms // 1000
+        if self.second is None or second <= self.second:
+            return []
+        return self._close_until(second)
+
+    def _close_until(self, second):
+        """組み立て中の足と、second の直前までの約定の無い秒を確定させる"""
+        finished = []
+        while self.second < second:
+            bar = self._finish()
+            if bar is not None:
+                finished.append(bar)
+            self.second += 1
+        return finished
+
+    def _finish(self):
+        if self.open is None and self.last_close is None:
+            return None
+        bar = {"Open": self.open, "High": self.high, "Low": self.low, "Close": self.close,
+               "Volume": self.volume.total,
+               "buy_vol": self.buy_vol.total, "buy_num": self.buy_num,
+               "sell_vol": self.sell_vol.total, "sell_num": self.sell_num,
+               "timestamp": self.second}
+        if self.open is None or bar["Volume"] == 0:
+            # 出来高0の足は直前の足の終値で埋める
+            # （makeCandles と同じく、直前の足に約定があればその約定の終値、無ければ埋めた後の終値）
+            price = self.prev_trade_close if self.prev_trade_close is not None else self.last_close
+            price = price if price is not None else float("nan")
+            bar["Open"] = bar["High"] = bar["Low"] = bar["Close"] = price
+        if self.second % 60 == 0 and self.last_close is not None:
+            # 毎分0秒の足は直前の足の終値から始める
+            bar["Open"] = self.last_close
+            if bar["Open"] < bar["Low"]:
+                bar["Low"] = bar["Open"]
+            if bar["Open"] > bar["High"]:
+                bar["High"] = bar["Open"]
+        self.prev_trade_close = self.close
+        self.last_close = bar["Close"]
+        self._reset()
+        self.bars.append(bar)
+        return bar
+
+    # ------------------------------------------------ #
+    # 参照
+    # ------------------------------------------------ #
+    def to_frame(self):
+        """確定した足を makeCandles と同じ形（exec_date の UTC インデックス）の DataFrame にする"""
+        df = pd.DataFrame(list(self.bars), columns=COLUMNS)
+        df.index = pd.DatetimeIndex(pd.to_datetime(df["timestamp"], unit="s", utc=True), name="exec_date")
+        return df
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+初到達（first passage）インデックス
+系列を一度だけ前処理し、「位置 start 以降で最初に値が level 以上（以下）になる位置」を O(log n) で返す
+
+ブロック（既定64行）ごとの最大値・最小値に対して区間最大・最小のスパーステーブルを持ち、
+- 開始ブロックの残りを直接走査
+- スパーステーブルで幅を倍々に広げて読み飛ばし、条件を満たす範囲を半分ずつ絞って最初のブロックを特定
+- そのブロック内を走査
+の順で探す。NaN は条件を満たさない値として扱う
+"""
+
+import numpy as np
+
+
+class FirstPassageIndex():
+    """系列の初到達位置を答えるインデックス"""
+
+    def __init__(self, values, block=64):
+        self.values = np.ascontiguousarray(values, dtype=np.float64)
+        self.n = len(self.values)
+        self.block = block
+        n_blocks = max(1, -(-self.n // block))
+
+        # 末尾ブロックは NaN で埋めて (n_blocks, block) に整形
+        padded = np.full(n_blocks * block, np.nan)
+        padded[:self.n] = self.values
+        padded = padded.reshape(n_blocks, block)
+        with np.errstate(invalid="ignore"):
+            block_max = np.fmax.reduce(padded, axis=1)
+            block_min = np.fmin.reduce(padded, axis=1)
+
+        # max_table[k][b] = ブロック b から 2**k 個分の最大値
+        self.max_table = [block_max]
+        self.min_table = [block_min]
+        width = 1
+        while width * 2 <= n_blocks:
+            prev_max, prev_min = self.max_table[-1], self.min_table[-1]
+            self.max_table.append(np.fmax(prev_max[:-width], prev_max[width:]))
+            self.min_table.append(np.fmin(prev_min[:-width], prev_min[width:]))
+            width *= 2
+
+    # ------------------------------------------------ #
+    # 単発の問い合わせ
+    # ------------------------------------------------ #
+    def first_at_or_above(self, start, level, stop=None):
+        """[start, stop) で最初に values >= level となる位置（無ければ -1）"""
+        return self._first(start, level, stop, upper=True, strict=False)
+
+    def first_above(self, start, level, stop=None):
+        """[start, stop) で最初に values > level となる位置（無ければ -1）"""
+        return self._first(start, level, stop, upper=True, strict=True)
+
+    def first_at_or_below(self, start, level, stop=None):
+        """[start, stop) で最初に values <= level となる位置（無ければ -1）"""
+        return self._first(start, level, stop, upper=False, strict=False)
+
+    def first_below(self, start, level, stop=None):
+        """[start, stop) で最初に values < level となる位置（無ければ -1）"""
+        return self._first(start, level, stop, upper=False, strict=True)
+
+    def _hit(self, values, level, upper, strict):
+        if upper:
+            return values > level if strict else values >= level
+        return values < level if strict else values <= level
+
+    def _block_hit(self, k, b, level, upper, strict):
+        """ブロック b から 2**k 個の中に条件を満たす値があるか"""
+        table = self.max_table if upper else self.min_table
+        return self._hit(table[k][b], level, upper, strict)
+
+    def _first(self, start, level, stop, upper, strict):
+        stop = self.n if stop is None else min(int(stop), self.n)
+        start = max(0, int(start))
+        if start >= stop:
+            return -1
+
+        # 開始ブロックの残り
+        head_end = min(stop, (start // self.block + 1) * self.block)
+        hit = self._hit(self.values[start:head_end], level, upper, strict)
+        if hit.any():
+            return start + int(hit.argmax())
+        if head_end >= stop:
+            return -1
+
+        # 条件を満たすブロックが現れるまで、幅を倍にしながら読み飛ばし（近くで見つかる場合に速い）、
+        # 見つかった範囲を幅を半分にしながら絞り込む
+        b = head_end // self.block
+        last_block = (stop - 1) // self.block
+        k = 0
+        while True:
+            if b > last_block:
+                return -1
+            k = min(k, (last_block - b + 1).bit_length() - 1)
+            if self._block_hit(k, b, level, upper, strict):
+                break
+            b += 1 << k
+            if k + 1 < len(self.max_table):
+                k += 1
+        for k in range(k - 1, -1, -1):
+            if not self._block_hit(k, b, level, upper, strict):
+                b += 1 << k
+
+        begin = b * self.block
+        hit = self._hit(self.values[begin:min(stop, begin + self.block)], level, upper, strict)
+        if hit.any():
+            return begin + int(hit.argmax())
+        return -1
+
+    # ------------------------------------------------ #
+    # まとめての問い合わせ（starts / stops は配列）
+    # ------------------------------------------------ #
+    def first_at_or_above_many(self, starts, level, stops=None):
+        return self._first_many(starts, level, stops, upper=True, strict=False)
+
+    def first_above_many(self, starts, level, stops=None):
+        return self._first_many(starts, level, stops, upper=True, strict=True)
+
+    def first_at_or_below_many(self, starts, level, stops=None):
+        return self._first_many(starts, level, stops, upper=False, strict=False)
+
+    def first_below_many(self, starts, level, stops=None):
+        return self._first_many(starts, level, stops, upper=False, strict=True)
+
+    def _scan_blocks(self, begins, ends, level, upper, strict):
+        """各 [begin, end)（1ブロック以内）で最初に条件を満たす位置（無ければ -1）"""
+        offsets = np.arange(self.block)
+        positions = begins[:, None] + offsets[None, :]
+        inside = positions < ends[:, None]
+        values = self.values[np.minimum(positions, self.n - 1)]
+        hit = self._hit(values, level, upper, strict) & inside
+        found = hit.any(axis=1)
+        return np.where(found, begins + hit.argmax(axis=1), -1)
+
+    def _first_many(self, starts, level, stops, upper, strict):
+        starts = np.maximum(np.asarray(starts, dtype=np.int64), 0)
+        stops = (np.full(len(starts), self.n, dtype=np.int64) if stops is None
+                 else np.minimum(np.asarray(stops, dtype=np.int64), self.n))
+        result = np.full(len(starts), -1, dtype=np.int64)
+        valid = starts < stops
+        if self.n == 0 or not valid.any():
+            return result
+
+        # 開始ブロックの残り
+        head_end = np.minimum(stops, (starts // self.block + 1) * self.block)
+        head = self._scan_blocks(starts, np.where(valid, head_end, starts), level, upper, strict)
+        result[head >= 0] = head[head >= 0]
+
+        # 残りはブロック単位で読み飛ばす
+        rest = valid & (head < 0) & (head_end < stops)
+        if not rest.any():
+            return result
+        b = head_end[rest] // self.block
+        last_block = (stops[rest] - 1) // self.block
+        table = self.max_table if upper else self.min_table
+        for k in range(len(table) - 1, -1, -1):
+            width = 1 << k
+            can_skip = b + width - 1 <= last_block
+            idx = np.minimum(b, len(table[k]) - 1)
+            skip = can_skip & ~self._hit(table[k][idx], level, upper, strict)
+            b = np.where(skip, b + width, b)
+        inside = b <= last_block
+        begins = b * self.block
+        found = self._scan_blocks(begins, np.where(inside, np.minimum(stops[rest], begins + self.block), begins),
+                                  level, upper, strict)
+        result[rest] = found
+        return result
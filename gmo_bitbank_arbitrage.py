@@ -13,6 +13,11 @@ import bybitbot_base
 from socket_bitbank_pybotters import Socket_PyBotters_BitBank
 from socket_gmocoin_pybotters import Socket_PyBotters_GMOCoin
 from get_logger import get_custom_logger
+from pair_order import send_pair
+from book_trigger import BookUpdateTrigger
+from tick_recorder import TickRecorder
+from arbitrage_scanner import ArbitrageScanner
+from rest_price_check import SUPPORTED_SYMBOLS
 import warnings
 warnings.simplefilter('ignore')
 
@@ -20,6 +25,7 @@ warnings.simplefilter('ignore')
 class GMOBitbankArbitrageBot(bybitbot_base.BybitBotBase):
     # User can ues MAX_DATA_CAPACITY to control memory usage.
     open_time_old = 0
+    HOUSEKEEPING_INTERVAL = 1  # 注文・ポジション確認の間隔（秒）
 
     # ---------------------------------------- #
     # init
@@ -37,6 +43,12 @@ class GMOBitbankArbitrageBot(bybitbot_base.BybitBotBase):
         self.bitbank = Socket_PyBotters_BitBank(self.keys)
         self.bitbank.SYMBOL = 'btc_jpy'
 
+        # 取引は SYMBOL のみ、価格差は両取引所で共通の全銘柄を1本の接続で監視する
+        self.gmo.SYMBOLS = list(SUPPORTED_SYMBOLS)
+        self.bitbank.SYMBOLS = list(SUPPORTED_SYMBOLS.values())
+        self.scanner = ArbitrageScanner(SUPPORTED_SYMBOLS)
+        self.scan_ratio_threshold = 0.003  # 全銘柄の監視で記録する価格差（仲値比）
+
         self.orderbook_check = False
         self.execute_check = {}
         self.df = pd.DataFrame()
@@ -81,6 +93,10 @@ class GMOBitbankArbitrageBot(bybitbot_base.BybitBotBase):
 
 
         self.logger = get_custom_logger(log_level)
+        self.housekeeping_lock = asyncio.Lock()
+        self.order_sent = False  # main() 内で発注したか
+        self.last_record_ts = 0  # 最後に記録したタイムスタンプ
+        self.recorder = TickRecorder("./data", logger=self.logger)
         self.emergency_time = datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc)
         self.emergency_qty_time = datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc)
 
@@ -116,6 +132,10 @@ class GMOBitbankArbitrageBot(bybitbot_base.BybitBotBase):
                 if not task.done():
                     task.cancel()
             raise
+        finally:
+            # REST用セッションを閉じる
+            await self.gmo.close_session()
+            await self.bitbank.close_session()
 
     async def order_check(self):
         await self.order_list_bitbank()
@@ -127,13 +147,10 @@ class GMOBitbankArbitrageBot(bybitbot_base.BybitBotBase):
             await self.bitbank.margin_order_cancel(order_id=order["order_id"])
         for order in self.orders_gmo:
             await self.gmo.order_cancel(order_id=order["orderId"])
-        res = await self.bitbank.send()
-        res = await self.gmo.send()
 
     async def order_list_gmo(self):
         try:
-            self.gmo.order_list(self.gmo.SYMBOL)
-            res = await self.gmo.send()
+            res = await self.gmo.order_list(self.gmo.SYMBOL).send()
             if res[0]["data"] is not None:
                 self.orders_gmo = res[0]["data"]
             else:
@@ -144,8 +161,7 @@ class GMOBitbankArbitrageBot(bybitbot_base.BybitBotBase):
     async def order_list_bitbank(self):
         try:
             # 【修正】信用取引用の注文リスト取得
-            self.bitbank.margin_order_list(self.bitbank.SYMBOL)
-            res = await self.bitbank.send()
+            res = await self.bitbank.margin_order_list(self.bitbank.SYMBOL).send()
             # print(f"Bitbank order list response: {res}")
             # レスポンスが空リストの場合は正常（注文なし）
             if isinstance(res, list) and len(res) == 0:
@@ -164,11 +180,11 @@ class GMOBitbankArbitrageBot(bybitbot_base.BybitBotBase):
     async def position_check_bitbank(self):
         # 【修正】信用取引用のポジション確認に変更
         try:
-            self.bitbank.margin_position_list()
+            batch = self.bitbank.margin_position_list()
             dt = datetime.datetime.now(datetime.timezone.utc)
             utc_time = dt.replace(tzinfo=datetime.timezone.utc)
             ts_now = int(utc_time.timestamp())
-            res = await self.bitbank.send()
+            res = await batch.send()
             
             # print(f"Bitbank position response: {res}")
             
@@ -246,6 +262,13 @@ class GMOBitbankArbitrageBot(bybitbot_base.BybitBotBase):
         utc_time = dt.replace(tzinfo=datetime.timezone.utc)
         ts_now = int(utc_time.timestamp())
         return ts_now
+
+    def log_pair_result(self, result):
+        """同時発注の結果をログに出力（片張り時は警告）"""
+        if result.legged:
+            self.logger.warning(f"片張り発生: {result.summary()}")
+        else:
+            self.logger.info(result.summary())
     # ---------------------------------------- #
     # bot main
     # ---------------------------------------- #
@@ -256,96 +279,102 @@ class GMOBitbankArbitrageBot(bybitbot_base.BybitBotBase):
         self.bitbank_info = await self.bitbank.get_info_bitbank()
         print(f"Bitbank info: {self.bitbank_info}")
 
-        while True:
-            # Test mode: stop after 10 minutes for opportunity analysis
-            if self.test_mode and (time.time() - self.test_start_time) > 600:
-                print("Test mode: 10 minutes elapsed, stopping...")
-                break
-            
+        # 取引銘柄の板更新で戦略ループを起こし、注文・ポジションの確認と全銘柄の価格差の監視は別タスクで行う
+        trigger = BookUpdateTrigger(self.gmo.store.orderbooks, self.bitbank.store.depth,
+                                    symbols=(self.gmo.SYMBOL, self.bitbank.SYMBOL))
+        trigger.start()
+        self.recorder.start()
+        await self.housekeeping()
+        housekeeping_task = asyncio.create_task(self.housekeeping_loop())
+        scan_task = asyncio.create_task(self.scan_loop())
+        try:
+            while True:
+                # Test mode: stop after 10 minutes for opportunity analysis
+                if self.test_mode and (time.time() - self.test_start_time) > 600:
+                    print("Test mode: 10 minutes elapsed, stopping...")
+                    break
+
+                await trigger.wait()
+                self.order_sent = False
+                await self.main()
+                if self.order_sent:
+                    # 発注後は従来通り1周期待って（未約定分のキャンセルを含め）同期してから次の判定を行う
+                    await asyncio.sleep(self.HOUSEKEEPING_INTERVAL)
+                    await self.housekeeping()
+        finally:
+            housekeeping_task.cancel()
+            scan_task.cancel()
+            trigger.stop()
+            await self.recorder.stop()
+
+    async def housekeeping(self):
+        """注文の確認・キャンセルとポジションの同期"""
+        async with self.housekeeping_lock:
             await self.order_check()
             await self.order_cancel_all()
             await self.position_check_bitbank()
             self.position_check_gmo()
 
-            await self.main()
-            await asyncio.sleep(1)
+    async def housekeeping_loop(self):
+        while True:
+            await asyncio.sleep(self.HOUSEKEEPING_INTERVAL)
+            try:
+                await self.housekeeping()
+            except Exception as e:
+                self.logger.exception(e)
+
+    async def scan_loop(self):
+        """全銘柄の価格差の監視（板が更新された銘柄の気配だけ取り込み、新たに閾値を超えた銘柄をログに出す）"""
+        trigger = BookUpdateTrigger(self.gmo.store.orderbooks, self.bitbank.store.depth)
+        trigger.start()
+        try:
+            while True:
+                await trigger.wait()
+                try:
+                    if not self.scanner.update(self.gmo.book_caches, self.bitbank.book_caches):
+                        continue
+                    for symbol, _, scan_1, scan_2, ratio_1, ratio_2 in self.scanner.new_hits(self.scan_ratio_threshold):
+                        self.logger.info(f"価格差 {symbol}: arbitrage_1 {scan_1:.4f}円 ({ratio_1:.2%}), "
+                                         f"arbitrage_2 {scan_2:.4f}円 ({ratio_2:.2%})")
+                except Exception as e:
+                    self.logger.exception(e)
+        finally:
+            trigger.stop()
 
 
     async def main(self):
         try:
             ts_now = self.get_timestamp()
 
-            # GMOの板情報を取得
-            gmo_orderbooks = self.gmo.store.orderbooks.find({'symbol': self.gmo.SYMBOL})
-            # print(f"GMO orderbooks: {len(gmo_orderbooks)}")
-            
-            if len(gmo_orderbooks) < 1:
+            # GMOの最良気配（板更新イベントで差分更新されたキャッシュ）
+            gmo_book = self.gmo.book_cache(self.gmo.SYMBOL)
+            if not gmo_book.ready():
                 print("GMO orderbook data not available")
                 return True
-            
-            # GMOのorderbookからbids/asks抽出（データ構造に依存）
-            gmo_bids = [x for x in gmo_orderbooks if x.get('side') == 'bids']
-            gmo_asks = [x for x in gmo_orderbooks if x.get('side') == 'asks']
-            
-            # print(f"GMO bids: {len(gmo_bids)}, asks: {len(gmo_asks)}")
-            
-            if len(gmo_bids) < 1 or len(gmo_asks) < 1:
-                print(f"GMO insufficient bid/ask data")
-                return True
-                
-            gmo_best_bid = gmo_bids[0]  # 最高買い価格
-            gmo_best_ask = gmo_asks[0]  # 最低売り価格
             #print(buy, sell)
             #print(self.bitbank.store.ticker.find())
             # 取引記録
             # print(self.bitbank.store.transactions.find())
             # 注文記録
 
-            # 【修正】Bitbankは信用取引用の注文キャンセルを使用
-            for order in self.orders_bitbank:
-                await self.bitbank.margin_order_cancel(order_id=order["order_id"])
-            for order in self.orders_gmo:
-                await self.gmo.order_cancel(order_id=order["orderId"])
-            res = await self.bitbank.send()
-            res = await self.gmo.send()
+            # 未約定注文のキャンセルは housekeeping（order_cancel_all）で行う
 
-            bitbank_orderbooks = self.bitbank.store.depth.find()
-            # print(f"Bitbank orderbooks: {len(bitbank_orderbooks)}")
-            
-            # Bitbankは "bids"/"asks" を使用（単体テストで確認済み）
-            bitbank_buy_order = [x for x in bitbank_orderbooks if x["side"] == "bids"]
-            bitbank_sell_order = [x for x in bitbank_orderbooks if x["side"] == "asks"]
+            # Bitbankの最良気配
+            bitbank_book = self.bitbank.book_cache(self.bitbank.SYMBOL)
             
             # 板情報の存在確認
-            if not bitbank_buy_order or not bitbank_sell_order:
-                self.logger.warning(f"Bitbank板情報不足 - buy orders: {len(bitbank_buy_order)}, sell orders: {len(bitbank_sell_order)}")
+            if not bitbank_book.ready():
+                self.logger.warning(f"Bitbank板情報不足 - buy orders: {len(bitbank_book.bids)}, sell orders: {len(bitbank_book.asks)}")
                 return True
             # アービトラージ機会の計算（同一通貨JPYなので為替変換不要）
             # パターン1: GMOで買い、Bitbank信用でショート
             # 条件: GMOの売値 < Bitbankの買値
-            gmo_ask_price = float(gmo_best_ask['price']) if gmo_best_ask else 0
-            # Bitbank板情報の構造確認：[price, amount]配列かオブジェクトか
-            if bitbank_buy_order:
-                if isinstance(bitbank_buy_order[0], list):
-                    # API仕様通りの[price, amount]配列形式
-                    bitbank_bid_price = float(bitbank_buy_order[0][0])  # price
-                else:
-                    # pybottersが変換したオブジェクト形式
-                    bitbank_bid_price = float(bitbank_buy_order[0]["price"])
-            else:
-                bitbank_bid_price = 0
+            gmo_ask_price = gmo_book.best_ask
+            bitbank_bid_price = bitbank_book.best_bid
             
             # パターン2: GMOで売り、Bitbank信用でロング  
-            gmo_bid_price = float(gmo_best_bid['price']) if gmo_best_bid else 0
-            if bitbank_sell_order:
-                if isinstance(bitbank_sell_order[0], list):
-                    # API仕様通りの[price, amount]配列形式
-                    bitbank_ask_price = float(bitbank_sell_order[0][0])  # price
-                else:
-                    # pybottersが変換したオブジェクト形式
-                    bitbank_ask_price = float(bitbank_sell_order[0]["price"])
-            else:
-                bitbank_ask_price = 0
+            gmo_bid_price = gmo_book.best_bid
+            bitbank_ask_price = bitbank_book.best_ask
             
             # 【修正】アービトラージ機会計算（realistic_arbitrage_analysis.pyと統一）
             arbitrage_1 = bitbank_bid_price - gmo_ask_price  # GMO買い→Bitbank売り（パターン1）
@@ -387,60 +416,63 @@ class GMOBitbankArbitrageBot(bybitbot_base.BybitBotBase):
                 self.offensive_mode = False
             # 分析ベースの最適化された新規アービトラージ実行
             if self.offensive_mode and bitbank_position_size < self.base_qty and total_gmo_pos <= bitbank_position_size:
+                # 板の厚みを考慮した約定可能価格差（残り数量を全て約定させた場合の平均価格で評価、板不足なら nan）
+                qty = self.base_qty - bitbank_position_size
+                gmo_depth = self.gmo.order_book(self.gmo.SYMBOL)
+                bitbank_depth = self.bitbank.order_book(self.bitbank.SYMBOL)
+                executable_1 = bitbank_depth.vwap_for_qty("bids", qty) - gmo_depth.vwap_for_qty("asks", qty)
+                executable_2 = gmo_depth.vwap_for_qty("bids", qty) - bitbank_depth.vwap_for_qty("asks", qty)
+
                 # 優先機会: GMO買い→Bitbank信用売り（分析結果で高収益）
-                if True and gmo_to_bitbank_profit > self.entry_threshold:  # 実取引有効化
-                    # 板情報から数量を取得
-                    if isinstance(bitbank_buy_order[0], list):
-                        # API仕様通りの[price, amount]配列形式
-                        bitbank_available_size = float(bitbank_buy_order[0][1])  # amount
-                    else:
-                        # pybottersが変換したオブジェクト形式（amountキーを使用）
-                        bitbank_available_size = float(bitbank_buy_order[0]["amount"]) 
-                    qty = min(bitbank_available_size, self.base_qty - bitbank_position_size)
-                    
-                    # GMOで買いポジション
-                    await self.gmo.buy_in(gmo_ask_price, qty)
+                if True and executable_1 > self.entry_threshold:  # 実取引有効化
+                    # 全数量が約定する価格で指値
+                    gmo_order_price = gmo_depth.price_for_qty("asks", qty)
+                    bitbank_order_price = bitbank_depth.price_for_qty("bids", qty)
                     
-                    # Bitbank信用取引でショート
-                    await self.bitbank.margin_sell_in(bitbank_bid_price, qty)
+                    # GMOで買いポジション / Bitbank信用取引でショート（同時発注）
+                    self.order_sent = True
+                    result = await send_pair(("gmo", self.gmo.buy_in(gmo_order_price, qty)),
+                                             ("bitbank", self.bitbank.margin_sell_in(bitbank_order_price, qty)))
+                    self.log_pair_result(result)
+                    if result.rejected:
+                        return False
                     
                     # ポジション建玉時刻とエントリー価格差を記録
                     self.position_entry_time = ts_now
-                    self.entry_arbitrage_1 = arbitrage_1
+                    self.entry_arbitrage_1 = executable_1
                     
-                    print(f"アービトラージ実行: GMO買い@{gmo_ask_price}, Bitbank売り@{bitbank_bid_price}, 差額:{arbitrage_1}円, 数量:{qty}")
+                    print(f"アービトラージ実行: GMO買い@{gmo_order_price}, Bitbank売り@{bitbank_order_price}, 差額:{executable_1}円, 数量:{qty}")
                     return False
                     
                 # サブ機会: Bitbank買い→GMO信用売り（低収益だが機会あり）
-                elif True and bitbank_to_gmo_profit > self.entry_threshold and gmo_to_bitbank_profit <= self.entry_threshold:  # メイン機会がない場合のみ
-                    # 板情報から数量を取得
-                    if isinstance(bitbank_sell_order[0], list):
-                        # API仕様通りの[price, amount]配列形式
-                        bitbank_available_size = float(bitbank_sell_order[0][1])  # amount
-                    else:
-                        # pybottersが変換したオブジェクト形式
-                        bitbank_available_size = float(bitbank_sell_order[0]["amount"])
-                    qty = min(bitbank_available_size, self.base_qty - bitbank_position_size)
-                    
-                    # GMOで売りポジション
-                    await self.gmo.sell_in(gmo_bid_price, qty)
+                elif True and executable_2 > self.entry_threshold and executable_1 <= self.entry_threshold:  # メイン機会がない場合のみ
+                    # 全数量が約定する価格で指値
+                    gmo_order_price = gmo_depth.price_for_qty("bids", qty)
+                    bitbank_order_price = bitbank_depth.price_for_qty("asks", qty)
                     
-                    # Bitbank信用取引でロング
-                    await self.bitbank.margin_buy_in(bitbank_ask_price, qty)
+                    # GMOで売りポジション / Bitbank信用取引でロング（同時発注）
+                    self.order_sent = True
+                    result = await send_pair(("gmo", self.gmo.sell_in(gmo_order_price, qty)),
+                                             ("bitbank", self.bitbank.margin_buy_in(bitbank_order_price, qty)))
+                    self.log_pair_result(result)
+                    if result.rejected:
+                        return False
                     
                     # ポジション建玉時刻とエントリー価格差を記録
                     self.position_entry_time = ts_now
-                    self.entry_arbitrage_2 = arbitrage_2
+                    self.entry_arbitrage_2 = executable_2
                     
-                    print(f"アービトラージ実行: GMO売り@{gmo_bid_price}, Bitbank買い@{bitbank_ask_price}, 差額:{arbitrage_2}円, 数量:{qty}")
+                    print(f"アービトラージ実行: GMO売り@{gmo_order_price}, Bitbank買い@{bitbank_order_price}, 差額:{executable_2}円, 数量:{qty}")
                     return False
             # ポジション調整（GMOとBitbankのポジション不均衡解消）
             if self.offensive_mode and bitbank_position_size == self.base_qty and total_gmo_pos < bitbank_position_size:
                 diff_size = bitbank_position_size - total_gmo_pos
                 # GMOのポジションを調整
                 if gmo_long_size > gmo_short_size:
+                    self.order_sent = True
                     await self.gmo.sell_in(gmo_bid_price, diff_size)
                 else:
+                    self.order_sent = True
                     await self.gmo.buy_in(gmo_ask_price, diff_size)
                 return False
                 
@@ -465,13 +497,16 @@ class GMOBitbankArbitrageBot(bybitbot_base.BybitBotBase):
                 if (net_profit_1 > self.exit_threshold or net_profit_1 < self.stop_loss_threshold) and gmo_long_size > 0:  # GMOロング + Bitbankショート決済
                     close_qty = min(gmo_long_size, abs(bitbank_position_size))
                     
-                    # GMOロングポジション決済（売り）
+                    # GMOロングポジション決済（売り） / Bitbankショートポジション決済（買い）
                     gmo_long_positions = [pos for pos in self.gmo.store.positions.find({'symbol': self.gmo.SYMBOL}) if pos.get("side") == "BUY"]
                     if gmo_long_positions:
-                        await self.gmo.sell_out(gmo_bid_price, close_qty, gmo_long_positions[0].get("positionId"))
-                    
-                    # Bitbankショートポジション決済（買い）
-                    await self.bitbank.margin_buy_out(bitbank_ask_price, close_qty)
+                        self.order_sent = True
+                        result = await send_pair(("gmo", self.gmo.sell_out(gmo_bid_price, close_qty, gmo_long_positions[0].get("positionId"))),
+                                                 ("bitbank", self.bitbank.margin_buy_out(bitbank_ask_price, close_qty)))
+                        self.log_pair_result(result)
+                    else:
+                        self.order_sent = True
+                        await self.bitbank.margin_buy_out(bitbank_ask_price, close_qty)
                     
                     exit_reason = "利確" if net_profit_1 > self.exit_threshold else "損切り"
                     print(f"{exit_reason}決済: GMOロング決済@{gmo_bid_price}, Bitbankショート決済@{bitbank_ask_price}, 純利益:{net_profit_1:.2f}円, 数量:{close_qty}")
@@ -480,13 +515,16 @@ class GMOBitbankArbitrageBot(bybitbot_base.BybitBotBase):
                 elif (net_profit_2 > self.exit_threshold or net_profit_2 < self.stop_loss_threshold) and gmo_short_size > 0:  # GMOショート + Bitbankロング決済
                     close_qty = min(gmo_short_size, bitbank_position_size)
                     
-                    # GMOショートポジション決済（買い）
+                    # GMOショートポジション決済（買い） / Bitbankロングポジション決済（売り）
                     gmo_short_positions = [pos for pos in self.gmo.store.positions.find({'symbol': self.gmo.SYMBOL}) if pos.get("side") == "SELL"]
                     if gmo_short_positions:
-                        await self.gmo.buy_out(gmo_ask_price, close_qty, gmo_short_positions[0].get("positionId"))
-                    
-                    # Bitbankロングポジション決済（売り）
-                    await self.bitbank.margin_sell_out(bitbank_bid_price, close_qty)
+                        self.order_sent = True
+                        result = await send_pair(("gmo", self.gmo.buy_out(gmo_ask_price, close_qty, gmo_short_positions[0].get("positionId"))),
+                                                 ("bitbank", self.bitbank.margin_sell_out(bitbank_bid_price, close_qty)))
+                        self.log_pair_result(result)
+                    else:
+                        self.order_sent = True
+                        await self.bitbank.margin_sell_out(bitbank_bid_price, close_qty)
                     
                     exit_reason = "利確" if net_profit_2 > self.exit_threshold else "損切り"
                     print(f"{exit_reason}決済: GMOショート決済@{gmo_ask_price}, Bitbankロング決済@{bitbank_bid_price}, 純利益:{net_profit_2:.2f}円, 数量:{close_qty}")
@@ -507,15 +545,10 @@ class GMOBitbankArbitrageBot(bybitbot_base.BybitBotBase):
                         "offensive_mode": self.offensive_mode,
                         "max_arbitrage": max(arbitrage_1, arbitrage_2),
                         }
-            old_data = {}
-
-            today = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d")
-            if os.path.exists(f"./data/{today}.json"):
-                with open(f"./data/{today}.json", "r") as f:
-                    old_data = json.load(f)
-                old_data[now_data["timestamp"]] = now_data
-            with open(f"./data/{today}.json", "w") as f:
-                json.dump(old_data, f, indent=2)
+            # 記録は1秒に1回（バッファして別スレッドで追記）
+            if ts_now != self.last_record_ts:
+                self.last_record_ts = ts_now
+                self.recorder.record(now_data)
 
 
 
@@ -13,6 +13,9 @@ import bybitbot_base
 from socket_bitbank_pybotters import Socket_PyBotters_BitBank
 from socket_bybit_pybotters import Socket_PyBotters_Bybit
 from get_logger import get_custom_logger
+from pair_order import send_pair
+from book_trigger import BookUpdateTrigger
+from tick_recorder import TickRecorder
 import warnings
 warnings.simplefilter('ignore')
 
@@ -20,6 +23,7 @@ warnings.simplefilter('ignore')
 class ArbitrageBot(bybitbot_base.BybitBotBase):
     # User can ues MAX_DATA_CAPACITY to control memory usage.
     open_time_old = 0
+    HOUSEKEEPING_INTERVAL = 1  # 注文・ポジション確認の間隔（秒）
 
     # ---------------------------------------- #
     # init
@@ -78,6 +82,10 @@ class ArbitrageBot(bybitbot_base.BybitBotBase):
 
 
         self.logger = get_custom_logger(log_level)
+        self.housekeeping_lock = asyncio.Lock()
+        self.order_sent = False  # main() 内で発注したか
+        self.last_record_ts = 0  # 最後に記録したタイムスタンプ
+        self.recorder = TickRecorder("./data", logger=self.logger)
         self.emergency_time = datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc)
         self.emergency_qty_time = datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc)
 
@@ -91,7 +99,15 @@ class ArbitrageBot(bybitbot_base.BybitBotBase):
             self.run()
         ]
 
-        loop.run_until_complete(asyncio.wait(tasks))
+        try:
+            loop.run_until_complete(asyncio.wait(tasks))
+        finally:
+            # REST用セッションを閉じる
+            loop.run_until_complete(self.close_sessions())
+
+    async def close_sessions(self):
+        await self.bybit.close_session()
+        await self.bitbank.close_session()
 
     async def get_usdjpy(self):
         try:
@@ -108,15 +124,12 @@ class ArbitrageBot(bybitbot_base.BybitBotBase):
     async def order_cancel_all(self):
         for order in self.orders_bitbank:
             await self.bitbank.order_cancel(order_id=order["order_id"])
-        for order in self.orders_bybit:
-            self.bybit.order_cancel(order_id=order["orderId"])
-        res = await self.bitbank.send()
-        res = await self.bybit.send()
+        res = await self.bybit.send(*[self.bybit.order_cancel(order_id=order["orderId"])
+                                      for order in self.orders_bybit])
 
     async def order_list_bybit(self):
         try:
-            self.bybit.order_list()
-            res = await self.bybit.send()
+            res = await self.bybit.order_list().send()
             if res[0]["result"]["list"] is not None:
                 self.orders_bybit = res[0]["result"]["list"]
             else:
@@ -126,8 +139,7 @@ class ArbitrageBot(bybitbot_base.BybitBotBase):
 
     async def order_list_bitbank(self):
         try:
-            self.bitbank.order_list(self.bitbank.SYMBOL)
-            res = await self.bitbank.send()
+            res = await self.bitbank.order_list(self.bitbank.SYMBOL).send()
             if res[0]["data"]["orders"] is not None:
                 self.orders_bitbank = res[0]["data"]["orders"]
             else:
@@ -136,11 +148,11 @@ class ArbitrageBot(bybitbot_base.BybitBotBase):
             print(traceback.format_exc().strip())
 
     async def position_check_bitbank(self):
-        self.bitbank.position_list()
+        batch = self.bitbank.position_list()
         dt = datetime.datetime.now(datetime.timezone.utc)
         utc_time = dt.replace(tzinfo=datetime.timezone.utc)
         ts_now = int(utc_time.timestamp())
-        res = await self.bitbank.send()
+        res = await batch.send()
         if res[0]["data"]["assets"] is not None:
             btc_amount = 0.0
             for x in res[0]["data"]["assets"]:
@@ -190,15 +202,43 @@ class ArbitrageBot(bybitbot_base.BybitBotBase):
     async def run(self):
         checkout = False
         self.bitbank_info = await self.bitbank.get_info_bitbank()
-        while True:
+        # 板更新で戦略ループを起こし、注文・ポジションの確認は別タスクで定期実行する
+        trigger = BookUpdateTrigger(self.bybit.store.orderbook, self.bitbank.store.depth)
+        trigger.start()
+        self.recorder.start()
+        await self.housekeeping()
+        housekeeping_task = asyncio.create_task(self.housekeeping_loop())
+        try:
+            while True:
+                await trigger.wait()
+                self.order_sent = False
+                await self.main()
+                if self.order_sent:
+                    # 発注後は従来通り1周期待って（未約定分のキャンセルを含め）同期してから次の判定を行う
+                    await asyncio.sleep(self.HOUSEKEEPING_INTERVAL)
+                    await self.housekeeping()
+        finally:
+            housekeeping_task.cancel()
+            trigger.stop()
+            await self.recorder.stop()
+
+    async def housekeeping(self):
+        """注文の確認・キャンセルとポジション・為替レートの同期"""
+        async with self.housekeeping_lock:
             await self.order_check()
             await self.order_cancel_all()
             await self.position_check_bitbank()
             self.position_check_bybit()
 
             await self.get_usdjpy()
-            await self.main()
-            await asyncio.sleep(1)
+
+    async def housekeeping_loop(self):
+        while True:
+            await asyncio.sleep(self.HOUSEKEEPING_INTERVAL)
+            try:
+                await self.housekeeping()
+            except Exception as e:
+                self.logger.exception(e)
 
 
     async def main(self):
@@ -209,29 +249,27 @@ class ArbitrageBot(bybitbot_base.BybitBotBase):
             #data = self.df_ohlcv.iloc[-1]
             ts_now = self.get_timestamp()
 
-            buy_order = self.bybit.store.orderbook.find({'symbol': self.bybit.SYMBOL, 'side': 'bids'})
-            sell_order = self.bybit.store.orderbook.find({'symbol': self.bybit.SYMBOL, 'side': 'asks'})
-            if len(buy_order) < 1 or len(sell_order) < 1:
-                self.logger.debug(f"**restart**. not enough order data {len(buy_order)} {len(sell_order)}")
+            # 最良気配は板更新イベントで差分更新されたキャッシュから取得する
+            bybit_book = self.bybit.book_cache(self.bybit.SYMBOL)
+            if not bybit_book.ready():
+                self.logger.debug(f"**restart**. not enough order data {len(bybit_book.bids)} {len(bybit_book.asks)}")
                 return True
-            buy = buy_order[0]
-            sell = sell_order[0]
+            buy = bybit_book.bid_level()
+            sell = bybit_book.ask_level()
             #print(buy, sell)
             #print(self.bitbank.store.ticker.find())
             # 取引記録
             # print(self.bitbank.store.transactions.find())
             # 注文記録
 
-            for order in self.orders_bitbank:
-                await self.bitbank.order_cancel(order_id=order["order_id"])
-            for order in self.orders_bybit:
-                self.bybit.order_cancel(order_id=order["orderId"])
-            res = await self.bitbank.send()
-            res = await self.bybit.send()
+            # 未約定注文のキャンセルは housekeeping（order_cancel_all）で行う
 
-            bitbank_orderbooks = self.bitbank.store.depth.find()
-            bitbank_buy_order = [x for x in bitbank_orderbooks if x["side"] == "buy"]
-            bitbank_sell_order = [x for x in bitbank_orderbooks if x["side"] == "sell"]
+            bitbank_book = self.bitbank.book_cache(self.bitbank.SYMBOL)
+            if not bitbank_book.ready():
+                self.logger.debug(f"**restart**. not enough bitbank order data {len(bitbank_book.bids)} {len(bitbank_book.asks)}")
+                return True
+            bitbank_buy_order = [bitbank_book.bid_level()]
+            bitbank_sell_order = [bitbank_book.ask_level()]
             #print(bitbank_buy_order) # 0が一番上
             #print(bitbank_sell_order) # 0が一番下
             # in
@@ -294,54 +332,29 @@ class ArbitrageBot(bybitbot_base.BybitBotBase):
                     qty = float(bitbank_sell_order[0]["size"])
                     if qty > self.base_qty - float(self.positions_bitbank["size"]):
                         qty = self.base_qty - float(self.positions_bitbank["size"])
-                    await self.bitbank.buy_in(float(bitbank_sell_order[0]["price"]), qty)
-                    get_pos_flg = False
-                    ts_now = self.get_timestamp()
-                    while True:
-                        await self.position_check_bitbank()
-                        buy_pos_size = self.positions_bitbank["size"]
-                        if buy_pos_size == 0:
-                            pass
-                        if buy_pos_size < qty:
-                            get_pos_flg = True
-                            self.positions_bitbank["price_jpy_bitbank"] = float(bitbank_sell_order[0]["price"])
-                            self.positions_bitbank["price_bitbank"] = float(bitbank_sell_order[0]["price"]) / self.usdjpy["Close"]
-                        elif buy_pos_size == qty:
-                            get_pos_flg = True
-                            self.positions_bitbank["price_jpy_bitbank"] = float(bitbank_sell_order[0]["price"])
-                            self.positions_bitbank["price_bitbank"] = float(bitbank_sell_order[0]["price"]) / self.usdjpy["Close"]
-                            break
-                        if self.get_timestamp() - ts_now > 1:
-                            break
-                        await asyncio.sleep(0.1)
-                    if not get_pos_flg:
+                    # bitbank買い / bybit売りを同時に発注（ポーリングで片側の約定を待たない）
+                    self.order_sent = True
+                    result = await send_pair(("bitbank", self.bitbank.buy_in(float(bitbank_sell_order[0]["price"]), qty)),
+                                             ("bybit", self.bybit.sell_in(float(buy["price"]), qty)))
+                    if result.legged:
+                        self.logger.warning(f"legged: {result.summary()}")
+                    else:
+                        self.logger.info(result.summary())
+                    if result.rejected:
                         return False
+                    if result.legs[0].accepted:
+                        self.positions_bitbank["price_jpy_bitbank"] = float(bitbank_sell_order[0]["price"])
+                        self.positions_bitbank["price_bitbank"] = float(bitbank_sell_order[0]["price"]) / self.usdjpy["Close"]
+                    if result.legs[1].accepted:
+                        self.positions_bybit["price_bybit"] = float(buy["price"])
                     print("in", float(buy["price"]) - float(bitbank_sell_order[0]["price"]) / self.usdjpy["Close"],
                           bitbank_sell_order[0]["size"], float(bitbank_sell_order[0]["price"]) / self.usdjpy["Close"],
                           buy["size"], buy["price"], )
-
-                    #"""
-                    pos_size = buy_pos_size
-                    await self.bybit.sell_in(float(buy["price"]), pos_size)
-                    ts_now = self.get_timestamp()
-                    while True:
-                        self.position_check_bybit()
-                        sell_pos_size = self.positions_bybit["size"]
-                        if sell_pos_size == 0:
-                            pass
-                        if sell_pos_size < pos_size:
-                            self.positions_bybit["price_bybit"] = float(buy["price"])
-                        elif sell_pos_size == pos_size:
-                            self.positions_bybit["price_bybit"] = float(buy["price"])
-                            break
-                        if self.get_timestamp() - ts_now > 1:
-                            break
-                        await asyncio.sleep(0.1)
                     return False
-                    #"""
             # 条件2 bitbankはいっぱいだがposが不安定
             if self.offensive_mode and self.positions_bitbank["size"] == self.base_qty and (self.positions_bybit["size"] < self.positions_bitbank["size"]):
                 pos_size = self.positions_bitbank["size"] - self.positions_bybit["size"]
+                self.order_sent = True
                 await self.bybit.sell_in(float(buy["price"]), pos_size)
                 ts_now = self.get_timestamp()
                 while True:
@@ -362,6 +375,7 @@ class ArbitrageBot(bybitbot_base.BybitBotBase):
             if not self.offensive_mode and (self.positions_bybit["size"] > 0 or self.positions_bitbank["size"] > 0):
                 # 売る
                 if float(bitbank_buy_order[0]["price"]) / self.usdjpy["Close"] - float(sell["price"]) > 0:
+                    self.order_sent = True
                     await self.bitbank.buy_out(float(bitbank_sell_order[0]["price"]), self.positions_bitbank["size"])
                     base_pos_size = self.positions_bitbank["size"]
                     sell_pos_flg = False
@@ -385,6 +399,7 @@ class ArbitrageBot(bybitbot_base.BybitBotBase):
                           bitbank_buy_order[0]["size"], float(bitbank_buy_order[0]["price"]) / self.usdjpy["Close"],
                           sell["size"], sell["price"], )
 
+                    self.order_sent = True
                     await self.bybit.buy_out(float(sell["price"]), self.positions_bybit["size"] - pos_size)
 
             now_data = {"timestamp": ts_now,
@@ -400,15 +415,10 @@ class ArbitrageBot(bybitbot_base.BybitBotBase):
                         "bitbank_sell_size": float(bitbank_sell_order[0]["size"]),
                         "usdypy": self.usdjpy["Close"],
                         }
-            old_data = {}
-
-            today = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d")
-            if os.path.exists(f"./data/{today}.json"):
-                with open(f"./data/{today}.json", "r") as f:
-                    old_data = json.load(f)
-                old_data[now_data["timestamp"]] = now_data
-            with open(f"./data/{today}.json", "w") as f:
-                json.dump(old_data, f, indent=2)
+            # 記録は1秒に1回（バッファして別スレッドで追記）
+            if ts_now != self.last_record_ts:
+                self.last_record_ts = ts_now
+                self.recorder.record(now_data)
 
 
 
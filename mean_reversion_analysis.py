@@ -8,21 +8,101 @@ import numpy as np
 import matplotlib.pyplot as plt
 import glob
 from scipy import stats
+from spread_store import SpreadStore
+from first_passage import FirstPassageIndex
 
-def analyze_mean_reversion():
+def sorted_arrays(combined_df, extreme_indices):
+    """
+    datetime で安定ソートした datetime(int64 ns) / arbitrage_2 の配列と、
+    極値イベントのソート後の位置を返す
+    """
+    dt_ns = combined_df['datetime'].values.astype('datetime64[ns]').astype(np.int64)
+    order = np.argsort(dt_ns, kind='stable')
+    dt_ns = dt_ns[order]
+    arb2 = combined_df['arbitrage_2'].values.astype(np.float64)[order]
+    # 元の行位置 → ソート後の位置
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    entry_pos = rank[combined_df.index.get_indexer(extreme_indices)]
+    return dt_ns, arb2, entry_pos
+
+
+def window_bounds(dt_ns, entry_pos, window_minutes):
+    """各エントリーの (entry_time, entry_time + window] に当たるソート後の区間 [lo, hi)"""
+    entry_ns = dt_ns[entry_pos]
+    lo = np.searchsorted(dt_ns, entry_ns, side='right')
+    hi = np.searchsorted(dt_ns, entry_ns + window_minutes * 60 * 10**9, side='right')
+    return lo, hi
+
+
+def reversion_table(dt_ns, arb2, entry_pos, entry_arb1, windows_minutes, exit_threshold, index=None):
+    """時間窓ごとの平均回帰の成功率・利益（index は arb2 の FirstPassageIndex）"""
+    index = FirstPassageIndex(arb2) if index is None else index
+    results = []
+    for window_minutes in windows_minutes:
+        lo, hi = window_bounds(dt_ns, entry_pos, window_minutes)
+        first = index.first_at_or_above_many(lo, exit_threshold, hi)
+        has_future = hi > lo
+        if not has_future.any():
+            continue
+        
+        # 最初に閾値を超えた時点で決済、超えない場合は窓内の最後の値で強制決済
+        exit_pos = np.where(first >= 0, first, hi - 1)[has_future]
+        exit_arb2 = arb2[exit_pos]
+        entry = entry_arb1[has_future]
+        
+        # 手数料を考慮した純利益
+        gross_profit = entry + exit_arb2
+        trading_cost = (np.abs(entry) + np.abs(exit_arb2)) * 0.001
+        profit_amounts = gross_profit - trading_cost
+        
+        total_cases = len(profit_amounts)
+        profitable_cases = int((profit_amounts > 0).sum())
+        results.append({
+            'window_minutes': window_minutes,
+            'total_cases': total_cases,
+            'profitable_cases': profitable_cases,
+            'success_rate': profitable_cases / total_cases * 100,
+            'avg_profit': np.mean(profit_amounts),
+            'median_profit': np.median(profit_amounts)
+        })
+    return results
+
+
+def recovery_minutes(dt_ns, arb2, entry_pos, window_minutes, profit_level, index=None):
+    """利確可能レベル（profit_level 超）に最初に到達するまでの時間（分）"""
+    index = FirstPassageIndex(arb2) if index is None else index
+    lo, hi = window_bounds(dt_ns, entry_pos, window_minutes)
+    first = index.first_above_many(lo, profit_level, hi)
+    reached = first >= 0
+    # Timedelta.total_seconds() と同じくマイクロ秒単位に切り捨てる
+    delta_us = (dt_ns[first[reached]] - dt_ns[entry_pos[reached]]) // 1000
+    return list(delta_us / 1e6 / 60)
+
+def analyze_mean_reversion(start=None, end=None):
     """平均回帰の分析"""
     
-    # データ読み込み
-    data_files = glob.glob('data/price_data_*.csv')
-    data_files.sort()
-    
-    all_data = []
-    for file in data_files:
-        df = pd.read_csv(file)
-        all_data.append(df)
-    
-    combined_df = pd.concat(all_data, ignore_index=True)
-    combined_df['datetime'] = pd.to_datetime(combined_df['datetime'])
+    # データ読み込み（列指向ストアがあれば期間内のセグメントだけを読む）
+    store = SpreadStore()
+    if store.exists():
+        # 最後の取り込みより後に書かれたCSVを先に取り込む
+        store.sync_csv()
+        combined_df = store.query_all(start, end)
+    else:
+        data_files = glob.glob('data/price_data_*.csv')
+        data_files.sort()
+        
+        all_data = []
+        for file in data_files:
+            df = pd.read_csv(file)
+            all_data.append(df)
+        
+        combined_df = pd.concat(all_data, ignore_index=True)
+        combined_df['datetime'] = pd.to_datetime(combined_df['datetime'])
+        if start is not None:
+            combined_df = combined_df[combined_df['datetime'] >= pd.Timestamp(start)].reset_index(drop=True)
+        if end is not None:
+            combined_df = combined_df[combined_df['datetime'] <= pd.Timestamp(end)].reset_index(drop=True)
     
     print("=== 平均回帰分析：統計的収束の検証 ===\n")
     
@@ -71,66 +151,18 @@ def analyze_mean_reversion():
         # 極値発生時のインデックス
         extreme_indices = extreme_events.index.tolist()
         
-        reversion_analysis = []
+        # 時刻順に並べた配列上で、各時間窓を searchsorted で区間として求め、
+        # 区間内の初到達位置は arbitrage_2 の初到達インデックスで引く
+        dt_ns, arb2, entry_pos = sorted_arrays(combined_df, extreme_indices)
+        arb2_index = FirstPassageIndex(arb2)
+        entry_arb1 = combined_df.loc[extreme_indices, 'arbitrage_1'].values
+        
         # 分単位で時間窓を定義
         future_windows_minutes = [1, 2, 5, 10, 20, 30, 60, 120, 240, 480, 720]
-        
-        for window_minutes in future_windows_minutes:
-            profitable_cases = 0
-            total_cases = 0
-            profit_amounts = []
-            
-            for idx in extreme_indices:
-                entry_time = combined_df.loc[idx, 'datetime']
-                entry_arb1 = combined_df.loc[idx, 'arbitrage_1']
-                
-                # 指定時間後までのデータを取得
-                future_time_limit = entry_time + pd.Timedelta(minutes=window_minutes)
-                future_mask = (combined_df['datetime'] > entry_time) & (combined_df['datetime'] <= future_time_limit)
-                future_data = combined_df[future_mask]
-                
-                if len(future_data) > 0:
-                    # 未来の時点でのarbitrage_2を確認
-                    future_arb2_values = future_data['arbitrage_2']
-                    
-                    if len(future_arb2_values) > 0:
-                        # 現実的な決済閾値を設定（例：5000円以上の機会があれば決済）
-                        exit_threshold = 5000
-                        viable_exits = future_arb2_values[future_arb2_values >= exit_threshold]
-                        
-                        if len(viable_exits) > 0:
-                            # 最初に閾値を超えた時点で決済（現実的なシナリオ）
-                            exit_arb2 = viable_exits.iloc[0]
-                        else:
-                            # 閾値を超えない場合は最後の値で強制決済
-                            exit_arb2 = future_arb2_values.iloc[-1]
-                        
-                        # 正しいアービトラージ利益計算
-                        gross_profit = entry_arb1 + exit_arb2
-                        
-                        # 手数料を考慮した純利益
-                        trading_cost = (abs(entry_arb1) + abs(exit_arb2)) * 0.001
-                        net_profit = gross_profit - trading_cost
-                        
-                        total_cases += 1
-                        profit_amounts.append(net_profit)
-                        
-                        if net_profit > 0:
-                            profitable_cases += 1
-            
-            if total_cases > 0:
-                success_rate = profitable_cases / total_cases * 100
-                avg_profit = np.mean(profit_amounts)
-                median_profit = np.median(profit_amounts)
-                
-                reversion_analysis.append({
-                    'window_minutes': window_minutes,
-                    'total_cases': total_cases,
-                    'profitable_cases': profitable_cases,
-                    'success_rate': success_rate,
-                    'avg_profit': avg_profit,
-                    'median_profit': median_profit
-                })
+        # 現実的な決済閾値を設定（例：5000円以上の機会があれば決済）
+        exit_threshold = 5000
+        reversion_analysis = reversion_table(dt_ns, arb2, entry_pos, entry_arb1,
+                                             future_windows_minutes, exit_threshold, arb2_index)
         
         # 結果表示
         print("時間別平均回帰成功率:")
@@ -175,21 +207,7 @@ def analyze_mean_reversion():
         print(f"\n平均回帰の統計的証拠:")
         
         # 極値からの回復時間分析
-        recovery_times = []
-        for idx in extreme_indices[:100]:  # 最初の100ケースを分析
-            entry_time = combined_df.loc[idx, 'datetime']
-            
-            # 20分以内のデータを取得
-            future_time_limit = entry_time + pd.Timedelta(minutes=20)
-            future_mask = (combined_df['datetime'] > entry_time) & (combined_df['datetime'] <= future_time_limit)
-            future_data = combined_df[future_mask]
-            
-            # 利確可能レベル到達を確認
-            profitable_data = future_data[future_data['arbitrage_2'] > 5000]
-            if len(profitable_data) > 0:
-                first_profitable_time = profitable_data['datetime'].iloc[0]
-                recovery_time = (first_profitable_time - entry_time).total_seconds() / 60  # 分単位
-                recovery_times.append(recovery_time)
+        recovery_times = recovery_minutes(dt_ns, arb2, entry_pos[:100], 20, 5000, arb2_index)  # 最初の100ケースを分析
         
         if recovery_times:
             print(f"利確レベル到達時間: 平均{np.mean(recovery_times):.1f}分, 中央値{np.median(recovery_times):.1f}分")
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import utils
+
+
+class LatencyStats():
+    """直近 maxlen 回の処理時間（ミリ秒）"""
+
+    def __init__(self, maxlen=1000):
+        self.samples = deque(maxlen=maxlen)
+        self.count = 0
+
+    def add(self, ms):
+        self.samples.append(ms)
+        self.count += 1
+
+    def summary(self):
+        if not self.samples:
+            return {"count": 0}
+        samples = np.fromiter(self.samples, dtype=float)
+        p50, p99 = np.percentile(samples, [50, 99])
+        return {"count": self.count, "last": float(samples[-1]), "mean": float(samples.mean()), "p50": float(p50),
+                "p99": float(p99), "max": float(samples.max())}
+
+
+class LoadedModel():
+    """読み込み済みのモデルと、そのファイルの更新時刻"""
+
+    def __init__(self, path, booster, mtime):
+        self.path = path
+        self.booster = booster
+        self.mtime = mtime
+        self.features = booster.feature_name()
+        self.loaded_at = time.time()
+        self.row_index = None  # 直前に使った特徴量の行（pd.Series）の列
+        self.positions = None  # その列でのモデルの特徴量の位置
+
+
+class ModelServer():
+    """
+    LightGBM モデルの推論
+    モデルは utils.model_load で1度だけ読み込んで保持し、ファイルが更新されたらスレッドで読み直して差し替える
+    予測は専用のスレッドで行い（イベントループを止めない）、特徴量の準備・予測・全体の処理時間を記録する
+
+    - predict(name, X): モデルの特徴量の順に並んだ行（utils.feature_matrix の末尾など）
+    - predict_row(name, row): StreamingFeatures.update や calc_features(df).iloc[-1] の行（列名で選ぶ）
+    - predict_frame(name, df, n): 足の DataFrame から直近 n 行の特徴量を作って予測する（df はコピーして使う）
+    """
+
+    def __init__(self, paths, window_size=12, reload_interval=5.0, logger=None):
+        self.paths = dict(paths)  # モデル名 -> ファイルパス
+        self.window_size = window_size
+        self.reload_interval = reload_interval
+        self.logger = logger or logging.getLogger(__name__)
+        # 予測は1本のスレッドに並べる（モデルの読み直しは別スレッドなので予測を待たせない）
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model_server")
+        self.models = {name: self.load(path) for name, path in self.paths.items()}
+        self.failed = {}  # 読み直しに失敗したファイルの更新時刻（同じファイルは再び読まない）
+        self.latency = {"features": LatencyStats(), "predict": LatencyStats(), "total": LatencyStats()}
+        self.task = None
+
+    # ---------------------------------------- #
+    # モデルの読み込み
+    # ---------------------------------------- #
+    def load(self, path):
+        """モデルを読み込み、1度予測してから返す（初回の予測の遅れをここで済ませる）"""
+        mtime = os.stat(path).st_mtime_ns
+        booster = utils.model_load(path)
+        booster.predict(np.zeros((1, booster.num_feature())), num_threads=1)
+        return LoadedModel(path, booster, mtime)
+
+    def booster(self, name):
+        return self.models[name].booster
+
+    async def reload(self):
+        """ファイルが更新されたモデルを読み直す（書き込み途中などで失敗したら今のモデルのまま、次の更新を待つ）"""
+        for name, path in self.paths.items():
+            mtime = None
+            try:
+                mtime = os.stat(path).st_mtime_ns
+                if mtime == self.models[name].mtime or mtime == self.failed.get(name):
+                    continue
+                model = await asyncio.to_thread(self.load, path)
+            except Exception as e:
+                self.failed[name] = mtime
+                self.logger.warning(f"model reload failed {name} {path}: {e}")
+                continue
+            self.models[name] = model
+            self.logger.info(f"model reloaded {name} {path} ({len(model.features)} features)")
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            await self.reload()
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        self.executor.shutdown(wait=False)
+
+    # ---------------------------------------- #
+    # 予測
+    # ---------------------------------------- #
+    async def predict(self, name, X):
+        """X（行 x モデルの特徴量）の予測"""
+        return await self._submit(name, lambda model: np.ascontiguousarray(X, dtype=np.float32).reshape(
+            -1, len(model.features)))
+
+    async def predict_row(self, name, row):
+        """特徴量の行（列名のインデックスを持つ pd.Series）から、モデルの特徴量を選んで予測する"""
+        return await self._submit(name, lambda model: self._select(model, row))
+
+    async def predict_frame(self, name, df, n=1):
+        """足の DataFrame から直近 n 行の特徴量を作って予測する（指標は df 全体から計算する）"""
+        # OHLCVRing の配列はイベントループ上で書き換えられるため、ループ上でコピーしてから予測スレッドに渡す
+        df = df.copy()
+        return await self._submit(name, lambda model: utils.feature_matrix(df, model.booster, self.window_size)[-n:])
+
+    def _select(self, model, row):
+        # 同じ列の並び（StreamingFeatures は毎回同じインデックスを使う）なら位置を使い回す
+        if model.row_index is not row.index:
+            positions = row.index.get_indexer(model.features)
+            if (positions < 0).any():
+                missing = [feature for feature, i in zip(model.features, positions) if i < 0]
+                raise ValueError(f"features not in row: {missing[:5]}")
+            model.row_index, model.positions = row.index, positions
+        return row.to_numpy(dtype=np.float32)[model.positions].reshape(1, -1)
+
+    async def _submit(self, name, features):
+        model = self.models[name]
+        start = time.perf_counter()
+        prediction, features_ms, predict_ms = await asyncio.get_running_loop().run_in_executor(
+            self.executor, self._predict, model, features)
+        self.latency["features"].add(features_ms)
+        self.latency["predict"].add(predict_ms)
+        self.latency["total"].add((time.perf_counter() - start) * 1000)
+        return prediction
+
+    @staticmethod
+    def _predict(model, features):
+        start = time.perf_counter()
+        X = features(model)
+        built = time.perf_counter()
+        # 数行の予測ではスレッドを増やしても速くならないので1本で行う
+        prediction = model.booster.predict(X, num_threads=1)
+        return prediction, (built - start) * 1000, (time.perf_counter() - built) * 1000
+
+    def stats(self):
+        """処理時間（ミリ秒）の集計"""
+        return {key: stats.summary() for key, stats in self.latency.items()}
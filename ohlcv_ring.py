@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+固定長の OHLCV リングバッファ
+列ごとに容量の2倍の NumPy 配列を持ち、各行を i と i + capacity の2か所に書く（ミラーリング）ことで、
+直近 n 本が常に連続した領域になり、DataFrame の列をコピー無しで作れる
+
+- 最新足の更新（同じ開始時刻）は書き換え、新しい足は追加で、どちらも O(1)
+- 容量を超えた分は古い足から上書きされる
+"""
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+
+class OHLCVRing():
+    """開始時刻（epoch秒）順に並んだ OHLCV 足のリングバッファ"""
+
+    def __init__(self, capacity, columns=COLUMNS):
+        self.capacity = capacity
+        self.columns = list(columns)
+        self.data = {column: np.full(2 * capacity, np.nan) for column in self.columns}
+        self.timestamp = np.zeros(2 * capacity, dtype=np.int64)  # 足の開始時刻（秒）
+        self.exec_date = np.zeros(2 * capacity, dtype=np.int64)  # 同じ時刻の ns（インデックス用）
+        self.start = 0  # 最古の足の位置
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    # ------------------------------------------------ #
+    # 更新
+    # ------------------------------------------------ #
+    def update(self, timestamp, *values, **named):
+        """
+        足を1本反映する（値は columns の順の位置引数か、列名のキーワード引数）
+        最新足と同じ開始時刻なら書き換え、新しければ追加し、古い足は無視して False を返す
+        """
+        timestamp = int(timestamp)
+        if self.size > 0:
+            last = self.timestamp[self.start + self.size - 1]
+            if timestamp < last:
+                return False
+            if timestamp == last:
+                self._write((self.start + self.size - 1) % self.capacity, timestamp, values, named)
+                return True
+
+        if self.size < self.capacity:
+            i = (self.start + self.size) % self.capacity
+            self.size += 1
+        else:
+            i = self.start
+            self.start = (self.start + 1) % self.capacity
+        self._write(i, timestamp, values, named)
+        return True
+
+    def _write(self, i, timestamp, values, named):
+        for j in (i, i + self.capacity):
+            self.timestamp[j] = timestamp
+            self.exec_date[j] = timestamp * 10**9
+            for column, value in zip(self.columns, values):
+                self.data[column][j] = value
+            for column, value in named.items():
+                self.data[column][j] = value
+
+    def load(self, df):
+        """
+        DataFrame（exec_date インデックスと timestamp 列を持つ）の足を既存の足とまとめ、開始時刻順に入れ直す
+        過去データの補完など、まとめて入れる場合に使う（同じ時刻は既存の足を優先）
+        """
+        current = self.to_frame()
+        incoming = df.reindex(columns=current.columns)
+        merged = pd.concat([incoming, current])
+        merged = merged[~merged["timestamp"].duplicated(keep="last")].sort_values("timestamp", kind="stable")
+        merged = merged.iloc[-self.capacity:]
+
+        n = len(merged)
+        self.start, self.size = 0, n
+        timestamps = merged["timestamp"].values.astype(np.int64)
+        for offset in (0, self.capacity):
+            self.timestamp[offset:offset + n] = timestamps
+            self.exec_date[offset:offset + n] = timestamps * 10**9
+            for column in self.columns:
+                self.data[column][offset:offset + n] = merged[column].values
+
+    # ------------------------------------------------ #
+    # 参照（バッファを直接指すビューなので書き換えないこと）
+    # ------------------------------------------------ #
+    def values(self, column, n=None):
+        """列の直近 n 本（省略時は全体）の読み取り専用ビュー"""
+        if column == "timestamp":
+            array = self.timestamp
+        else:
+            array = self.data[column]
+        return self._view(array, n)
+
+    def _view(self, array, n=None):
+        n = self.size if n is None else min(n, self.size)
+        end = self.start + self.size
+        view = array[end - n:end]
+        view.flags.writeable = False
+        return view
+
+    def last(self):
+        """最新足（無ければ None）"""
+        if self.size == 0:
+            return None
+        i = self.start + self.size - 1
+        bar = {column: float(self.data[column][i]) for column in self.columns}
+        bar["timestamp"] = int(self.timestamp[i])
+        return bar
+
+    def to_frame(self, n=None):
+        """
+        直近 n 本の DataFrame（exec_date インデックス）
+        列はバッファをコピーせずに参照する。インデックスは pandas が不変として扱う（DataFrame.copy() でも共有される）ため、
+        小さい int64 配列だけコピーする
+        """
+        frame = {column: self._view(self.data[column], n) for column in self.columns}
+        frame["timestamp"] = self._view(self.timestamp, n)
+        index = pd.DatetimeIndex(self._view(self.exec_date, n).view("datetime64[ns]"), name="exec_date", copy=True)
+        return pd.DataFrame(frame, index=index, copy=False)
@@ -0,0 +1,120 @@
+import time
+
+import numpy as np
+
+
+class BookSide():
+    """
+    板の片側（ソート済み配列）
+    キーは昇順に保持し、先頭が最良気配になるよう買い板は価格の符号を反転して格納する
+    """
+
+    def __init__(self, descending, capacity=256):
+        self.sign = -1.0 if descending else 1.0
+        self.keys = np.empty(capacity, dtype=np.float64)
+        self.prices = np.empty(capacity, dtype=np.float64)
+        self.sizes = np.empty(capacity, dtype=np.float64)
+        self.n = 0
+
+    def _grow(self):
+        capacity = len(self.keys) * 2
+        for name in ("keys", "prices", "sizes"):
+            arr = np.empty(capacity, dtype=np.float64)
+            arr[:self.n] = getattr(self, name)[:self.n]
+            setattr(self, name, arr)
+
+    def update(self, price, size):
+        """価格レベルを挿入・更新する（size <= 0 なら削除）"""
+        n = self.n
+        key = self.sign * price
+        i = int(np.searchsorted(self.keys[:n], key))
+        if i < n and self.keys[i] == key:
+            if size > 0:
+                self.sizes[i] = size
+            else:
+                self.keys[i:n - 1] = self.keys[i + 1:n]
+                self.prices[i:n - 1] = self.prices[i + 1:n]
+                self.sizes[i:n - 1] = self.sizes[i + 1:n]
+                self.n = n - 1
+        elif size > 0:
+            if n == len(self.keys):
+                self._grow()
+            self.keys[i + 1:n + 1] = self.keys[i:n]
+            self.prices[i + 1:n + 1] = self.prices[i:n]
+            self.sizes[i + 1:n + 1] = self.sizes[i:n]
+            self.keys[i] = key
+            self.prices[i] = price
+            self.sizes[i] = size
+            self.n = n + 1
+
+    def clear(self):
+        self.n = 0
+
+    def vwap_for_qty(self, qty):
+        """qty を成行で約定させた場合の平均価格（板が足りなければ nan）"""
+        if qty <= 0 or self.n == 0:
+            return np.nan
+        sizes = self.sizes[:self.n]
+        prices = self.prices[:self.n]
+        cum = np.cumsum(sizes)
+        if cum[-1] < qty:
+            return np.nan
+        k = int(np.searchsorted(cum, qty))
+        filled = cum[k - 1] if k > 0 else 0.0
+        cost = np.dot(prices[:k], sizes[:k]) + (qty - filled) * prices[k]
+        return cost / qty
+
+    def price_for_qty(self, qty):
+        """qty を約定させるのに必要な最も不利な価格レベル（板が足りなければ nan）"""
+        if qty <= 0 or self.n == 0:
+            return np.nan
+        cum = np.cumsum(self.sizes[:self.n])
+        if cum[-1] < qty:
+            return np.nan
+        return self.prices[int(np.searchsorted(cum, qty))]
+
+    def qty_for_price_limit(self, limit_price):
+        """指値 limit_price 以内（その価格を含む）で約定可能な数量"""
+        count = int(np.searchsorted(self.keys[:self.n], self.sign * limit_price, side="right"))
+        return float(self.sizes[:count].sum())
+
+
+class OrderBook():
+    """
+    NumPy配列で保持する板
+    DataStore の変更イベントから差分更新し、数量を考慮した約定価格を高速に求める
+    side は "bids"（売り注文が当たる側）/ "asks"（買い注文が当たる側）
+    """
+
+    def __init__(self, symbol=None, capacity=256):
+        self.symbol = symbol
+        self.sides = {"bids": BookSide(descending=True, capacity=capacity),
+                      "asks": BookSide(descending=False, capacity=capacity)}
+        self.timestamp = 0.0  # 最終更新時刻
+
+    def apply(self, operation, side, price, size):
+        """板の変更を1件反映する（operation: insert / update / delete）"""
+        self.sides[side].update(price, 0.0 if operation == "delete" else size)
+        self.timestamp = time.time()
+
+    def clear(self):
+        for book_side in self.sides.values():
+            book_side.clear()
+        self.timestamp = time.time()
+
+    def depth(self, side):
+        """価格レベル数"""
+        return self.sides[side].n
+
+    def best(self, side):
+        book_side = self.sides[side]
+        return book_side.prices[0] if book_side.n > 0 else np.nan
+
+    def vwap_for_qty(self, side, qty):
+        return self.sides[side].vwap_for_qty(qty)
+
+    def price_for_qty(self, side, qty):
+        return self.sides[side].price_for_qty(qty)
+
+    def qty_for_price_limit(self, side, limit_price):
+        return self.sides[side].qty_for_price_limit(limit_price)
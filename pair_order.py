@@ -0,0 +1,109 @@
+"""
+2レッグ同時発注
+アービトラージの両建て注文を asyncio.gather で同時に送信し、
+レッグごとの送信・応答時刻と約定状況をまとめて返す
+"""
+
+import asyncio
+import time
+import traceback
+from dataclasses import dataclass, field
+from typing import Any, List, Optional
+
+
+@dataclass
+class LegResult:
+    """1レッグ分の発注結果"""
+    name: str
+    sent_at: float
+    acked_at: float
+    response: Any = None
+    error: Optional[str] = None
+
+    @property
+    def body(self):
+        """取引所のレスポンス本体（send() の戻り値の先頭要素）"""
+        if isinstance(self.response, list) and len(self.response) > 0:
+            return self.response[0]
+        return self.response
+
+    @property
+    def latency(self):
+        """送信から応答までの時間（秒）"""
+        return self.acked_at - self.sent_at
+
+    @property
+    def accepted(self):
+        """取引所が注文を受け付けたか"""
+        body = self.body
+        if self.error is not None or not isinstance(body, dict):
+            return False
+        # GMO: status == 0 / bitbank: success == 1 / bybit: retCode == 0
+        if "status" in body:
+            return body["status"] == 0
+        if "success" in body:
+            return body["success"] == 1
+        if "retCode" in body:
+            return body["retCode"] == 0
+        return False
+
+    @property
+    def fill_status(self):
+        """約定状況（bitbankのみ応答に含まれる。それ以外は受付状態を返す）"""
+        if not self.accepted:
+            return "REJECTED"
+        data = self.body.get("data")
+        if isinstance(data, dict) and "status" in data:
+            return data["status"]
+        return "ACCEPTED"
+
+
+@dataclass
+class PairOrderResult:
+    """2レッグ同時発注の結果"""
+    legs: List[LegResult] = field(default_factory=list)
+
+    @property
+    def all_accepted(self):
+        return all(leg.accepted for leg in self.legs)
+
+    @property
+    def rejected(self):
+        """全レッグが受け付けられなかった状態"""
+        return not any(leg.accepted for leg in self.legs)
+
+    @property
+    def legged(self):
+        """片側のみ受け付けられた状態（片張り）"""
+        accepted = [leg.accepted for leg in self.legs]
+        return any(accepted) and not all(accepted)
+
+    @property
+    def legging_gap(self):
+        """最初の送信から最後の応答までの時間（秒）"""
+        return max(leg.acked_at for leg in self.legs) - min(leg.sent_at for leg in self.legs)
+
+    def summary(self):
+        legs = ", ".join(f"{leg.name}:{leg.fill_status}({leg.latency * 1000:.0f}ms)" for leg in self.legs)
+        return f"pair order [{legs}] gap={self.legging_gap * 1000:.0f}ms"
+
+
+async def send_leg(name, order):
+    """1レッグを送信し、送信・応答時刻を記録する"""
+    sent_at = time.time()
+    try:
+        response = await order
+        return LegResult(name=name, sent_at=sent_at, acked_at=time.time(), response=response)
+    except Exception:
+        return LegResult(name=name, sent_at=sent_at, acked_at=time.time(),
+                         error=traceback.format_exc().strip())
+
+
+async def send_pair(first, second):
+    """
+    2レッグを同時に発注する
+    first / second は (レッグ名, 発注コルーチン) のタプル
+    例: await send_pair(("gmo", gmo.buy_in(price, qty)), ("bitbank", bitbank.margin_sell_in(price, qty)))
+    """
+    legs = await asyncio.gather(send_leg(*first), send_leg(*second))
+    return PairOrderResult(legs=list(legs))
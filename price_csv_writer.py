@@ -0,0 +1,166 @@
+import csv
+import os
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+
+class PriceCsvWriter():
+    """
+    価格チェック結果の CSV 書き込み
+    日付ごとのファイルを開いたままにして行をため、一定件数か一定時間ごとにまとめて書き出す
+    日付（行の timestamp のローカル日付）が変わったら、残りを書き出してから新しい日付のファイルに切り替える
+
+    columnar=True なら、同じ行を列ごとのバイナリファイル（{prefix}_{日付}_columns/{列名}.bin）にも追記する
+    数値の列は float64、文字列の列は固定長のバイト列で、read_columns で読み戻せる
+
+    store（spread_store.SpreadStore）を渡すと、書き出した行を store_interval 秒ごとにストアにも追記し、
+    CSV を取り込み済みとして記録する（分析側の sync_csv で同じ行を取り込み直さない）
+    既に行のある CSV を開くときは、先にその CSV をストアに取り込む
+    """
+
+    def __init__(self, fieldnames, directory="data", prefix="price_data_all_symbols", flush_rows=100,
+                 flush_interval=5.0, columnar=False, text_columns=("datetime", "symbol"), text_width=24,
+                 store=None, store_interval=60.0):
+        self.fieldnames = list(fieldnames)
+        self.directory = directory
+        self.prefix = prefix
+        self.flush_rows = flush_rows          # この件数たまったら書き出す
+        self.flush_interval = flush_interval  # 前回の書き出しからこの秒数が過ぎたら書き出す
+        self.columnar = columnar
+        self.text_columns = [column for column in self.fieldnames if column in text_columns]
+        self.text_width = text_width
+        self.buffer = []
+        self.day = None
+        self.day_range = (0.0, 0.0)  # 開いている日付の [開始, 終了) の epoch秒
+        self.file = None
+        self.writer = None
+        self.column_files = {}
+        self.last_flush = time.monotonic()
+        self.store = store
+        self.store_interval = store_interval
+        self.store_buffer = []  # CSV に書き出し済みでストアに未追記の行
+        self.csv_size = 0       # このライターが書き出した後の CSV のサイズ
+        self.foreign_rows = False  # 他のプロセスが同じ CSV に書いた（取り込み済みにせず sync_csv に任せる）
+        self.last_store_flush = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def path_for(self, day):
+        return os.path.join(self.directory, f"{self.prefix}_{day}.csv")
+
+    def columns_dir_for(self, day):
+        return os.path.join(self.directory, f"{self.prefix}_{day}_columns")
+
+    # ---------------------------------------- #
+    # 書き込み
+    # ---------------------------------------- #
+    def write(self, row):
+        """行（列名 -> 値）を1件追加する"""
+        timestamp = row.get("timestamp")
+        if timestamp is None:
+            timestamp = time.time()
+        if not self.day_range[0] <= timestamp < self.day_range[1]:
+            self.flush()
+            self.flush_store()
+            self.open(datetime.fromtimestamp(timestamp).strftime("%Y%m%d"))
+        self.buffer.append(row)
+        if len(self.buffer) >= self.flush_rows or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not self.buffer:
+            return
+        rows, self.buffer = self.buffer, []
+        if self.store is not None and os.fstat(self.file.fileno()).st_size != self.csv_size:
+            self.foreign_rows = True
+        self.writer.writerows(rows)
+        self.file.flush()
+        self.csv_size = os.fstat(self.file.fileno()).st_size
+        if self.columnar:
+            self.write_columns(rows)
+        if self.store is not None:
+            self.store_buffer.extend(rows)
+            if time.monotonic() - self.last_store_flush >= self.store_interval:
+                self.flush_store()
+
+    def flush_store(self):
+        """ストアに未追記の行を追記し、今の CSV を取り込み済みにする"""
+        self.last_store_flush = time.monotonic()
+        if self.store is None or not self.store_buffer:
+            return
+        rows, self.store_buffer = self.store_buffer, []
+        self.store.append_records(rows)
+        if not self.foreign_rows:
+            self.store.mark_imported(self.path_for(self.day))
+
+    def write_columns(self, rows):
+        for column, f in self.column_files.items():
+            if column in self.text_columns:
+                values = np.array([str(row.get(column, "")).encode("utf-8") for row in rows],
+                                  dtype=f"S{self.text_width}")
+            else:
+                values = np.array([row.get(column, np.nan) for row in rows], dtype=np.float64)
+            values.tofile(f)
+            f.flush()
+
+    def open(self, day):
+        """day（YYYYMMDD）のファイルを開く（新しいファイルならヘッダーを書く）"""
+        self.close_files()
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path_for(day)
+        new_file = not os.path.isfile(path) or os.path.getsize(path) == 0
+        if self.store is not None and not new_file:
+            # 既存の行（以前の実行や save_to_csv の行）を先に取り込む（flush_store で CSV 全体を取り込み済みにするため）
+            self.store.sync_csv([path])
+        self.file = open(path, "a", newline="", encoding="utf-8")
+        self.writer = csv.DictWriter(self.file, fieldnames=self.fieldnames)
+        if new_file:
+            self.writer.writeheader()
+        self.file.flush()
+        self.csv_size = os.fstat(self.file.fileno()).st_size
+        self.foreign_rows = False
+        if self.columnar:
+            columns_dir = self.columns_dir_for(day)
+            os.makedirs(columns_dir, exist_ok=True)
+            self.column_files = {column: open(os.path.join(columns_dir, f"{column}.bin"), "ab")
+                                 for column in self.fieldnames}
+        self.day = day
+        start = datetime.strptime(day, "%Y%m%d")
+        self.day_range = (start.timestamp(), (start + timedelta(days=1)).timestamp())
+
+    def close_files(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            self.writer = None
+        for f in self.column_files.values():
+            f.close()
+        self.column_files = {}
+
+    def close(self):
+        """残りを書き出してファイルを閉じる"""
+        if self.file is not None:
+            self.flush()
+            self.flush_store()
+        self.close_files()
+        self.day = None
+        self.day_range = (0.0, 0.0)
+
+
+def read_columns(columns_dir, fieldnames, text_columns=("datetime", "symbol"), text_width=24):
+    """PriceCsvWriter の列ファイルを {列名: 配列} で読み込む（文字列の列は str の配列）"""
+    columns = {}
+    for column in fieldnames:
+        path = os.path.join(columns_dir, f"{column}.bin")
+        if column in text_columns:
+            columns[column] = np.fromfile(path, dtype=f"S{text_width}").astype(str)
+        else:
+            columns[column] = np.fromfile(path, dtype=np.float64)
+    return columns
@@ -11,6 +11,8 @@ from datetime import datetime, timedelta
 import glob
 from dataclasses import dataclass
 from typing import List, Optional
+from spread_store import SpreadStore
+from first_passage import FirstPassageIndex
 
 @dataclass
 class Trade:
@@ -24,6 +26,122 @@ class Trade:
     duration_minutes: Optional[float]
     exit_reason: Optional[str]  # 'profit_target', 'stop_loss', 'timeout'
 
+# 決済理由（simulate_arrays の戻り値のコード）
+EXIT_REASONS = ['timeout', 'stop_loss', 'profit_target', 'forced_exit']
+DIRECTIONS = ['gmo_to_bitbank', 'bitbank_to_gmo']
+
+
+def _timeout_index(dt_ns, e, max_hold_minutes, is_sorted):
+    """エントリー行 e の後で保有時間が max_hold_minutes 以上になる最初の行（無ければ len(dt_ns)）"""
+    n = len(dt_ns)
+
+    def duration(j):
+        # Timedelta.total_seconds() と同じくマイクロ秒で切り捨て
+        return ((dt_ns[j] - dt_ns[e]) // 1000) / 1e6 / 60
+
+    if not is_sorted:
+        hit = np.flatnonzero(((dt_ns[e + 1:] - dt_ns[e]) // 1000) / 1e6 / 60 >= max_hold_minutes)
+        return e + 1 + int(hit[0]) if len(hit) else n
+    j = max(e + 1, int(np.searchsorted(dt_ns, dt_ns[e] + int(max_hold_minutes * 60e9), side='left')))
+    while j < n and duration(j) < max_hold_minutes:
+        j += 1
+    while j - 1 > e and duration(j - 1) >= max_hold_minutes:
+        j -= 1
+    return j
+
+
+def _first_net_cross(index, start, stop, entry_spread, target, trading_fee, upper):
+    """
+    [start, stop) で純損益が target 以上（upper=False なら以下）になる最初の行（無ければ -1）
+    純損益は決済側スプレッドに対して単調なので、境界のスプレッド水準を逆算して初到達インデックスで探し、
+    浮動小数点の丸めに備えて候補行は元の式で確認する
+    """
+    xs = index.values
+    y = target - (entry_spread - abs(entry_spread) * trading_fee)
+    level = y / (1 - trading_fee) if y >= 0 else y / (1 + trading_fee)
+    tol = 1e-9 * (abs(target) + abs(entry_spread) + abs(level)) + 1e-6
+    while start < stop:
+        if upper:
+            j = index.first_at_or_above(start, level - tol, stop)
+        else:
+            j = index.first_at_or_below(start, level + tol, stop)
+        if j < 0:
+            return -1
+        net = (entry_spread + xs[j]) - (abs(entry_spread) + abs(xs[j])) * trading_fee
+        if (net >= target) if upper else (net <= target):
+            return j
+        start = j + 1
+    return -1
+
+
+def simulate_arrays(dt_ns, arb1, arb2, entry_threshold, exit_threshold, stop_loss,
+                    max_hold_minutes, trading_fee, indexes=None):
+    """
+    NumPy配列上の取引シミュレーション（ArbitrageSimulator の iterrows 版と同じ判定順序）
+    - エントリー候補は閾値超えの行を事前に抽出し、searchsorted で次の候補へジャンプ
+    - エグジット行は時間切れ行を searchsorted、損切り・利確行を初到達インデックスで求め、
+      最も早い行を採用（同じ行なら時間切れ→損切り→利確の優先順）
+    - 決済した行で再エントリー可能、最終行で強制決済
+    indexes に (arb1, arb2) の FirstPassageIndex を渡すと、複数シナリオで前処理を共有できる
+
+    Returns:
+        dict: entry_idx / exit_idx / direction / reason / entry_spread / exit_spread / pnl / duration_minutes の配列
+    """
+    n = len(dt_ns)
+    arb1 = np.asarray(arb1, dtype=np.float64)
+    arb2 = np.asarray(arb2, dtype=np.float64)
+    dt_ns = np.asarray(dt_ns, dtype=np.int64)
+    if indexes is None:
+        indexes = (FirstPassageIndex(arb1), FirstPassageIndex(arb2))
+    is_sorted = bool(np.all(dt_ns[1:] >= dt_ns[:-1]))
+    candidates = np.flatnonzero((arb1 > entry_threshold) | (arb2 > entry_threshold))
+
+    result = {key: [] for key in ['entry_idx', 'exit_idx', 'direction', 'reason',
+                                  'entry_spread', 'exit_spread', 'pnl', 'duration_minutes']}
+    k = 0
+    while True:
+        # 次のエントリー行
+        c = int(np.searchsorted(candidates, k))
+        if c >= len(candidates):
+            break
+        e = int(candidates[c])
+        if arb1[e] > entry_threshold:
+            direction, entry_spread, exit_series, exit_index = 0, arb1[e], arb2, indexes[1]
+        else:
+            direction, entry_spread, exit_series, exit_index = 1, arb2[e], arb1, indexes[0]
+
+        # エグジット行の探索（エントリー行の次の行から、時間切れ行より前を損切り・利確で探す）
+        timeout_idx = _timeout_index(dt_ns, e, max_hold_minutes, is_sorted)
+        stop_idx = _first_net_cross(exit_index, e + 1, timeout_idx, entry_spread, stop_loss, trading_fee, upper=False)
+        profit_idx = _first_net_cross(exit_index, e + 1, timeout_idx, entry_spread, exit_threshold, trading_fee, upper=True)
+        if stop_idx >= 0 and (profit_idx < 0 or stop_idx <= profit_idx):
+            exit_idx, reason = stop_idx, 1
+        elif profit_idx >= 0:
+            exit_idx, reason = profit_idx, 2
+        elif timeout_idx < n:
+            exit_idx, reason = timeout_idx, 0
+        else:
+            exit_idx, reason = n - 1, 3
+
+        exit_spread = exit_series[exit_idx]
+        gross_pnl = entry_spread + exit_spread
+        trading_cost = (abs(entry_spread) + abs(exit_spread)) * trading_fee
+        result['entry_idx'].append(e)
+        result['exit_idx'].append(exit_idx)
+        result['direction'].append(direction)
+        result['reason'].append(reason)
+        result['entry_spread'].append(entry_spread)
+        result['exit_spread'].append(exit_spread)
+        result['pnl'].append(gross_pnl - trading_cost)
+        result['duration_minutes'].append(((dt_ns[exit_idx] - dt_ns[e]) // 1000) / 1e6 / 60)
+
+        if reason == 3:
+            break
+        k = exit_idx
+
+    return {key: np.array(values) for key, values in result.items()}
+
+
 class ArbitrageSimulator:
     """アービトラージ取引シミュレーター"""
     
@@ -43,18 +161,28 @@ class ArbitrageSimulator:
         self.trades: List[Trade] = []
         self.current_position: Optional[Trade] = None
         
-    def load_data(self):
-        """価格データの読み込み"""
-        data_files = glob.glob('data/price_data_*.csv')
-        data_files.sort()
-        
-        all_data = []
-        for file in data_files:
-            df = pd.read_csv(file)
-            all_data.append(df)
-        
-        combined_df = pd.concat(all_data, ignore_index=True)
-        combined_df['datetime'] = pd.to_datetime(combined_df['datetime'])
+    def load_data(self, start=None, end=None):
+        """価格データの読み込み（列指向ストアがあれば、更新されたCSVを取り込んでから期間内のセグメントだけを読む）"""
+        store = SpreadStore()
+        if store.exists():
+            # 最後の取り込みより後に書かれたCSVを先に取り込む
+            store.sync_csv()
+            combined_df = store.query_all(start, end)
+        else:
+            data_files = glob.glob('data/price_data_*.csv')
+            data_files.sort()
+            
+            all_data = []
+            for file in data_files:
+                df = pd.read_csv(file)
+                all_data.append(df)
+            
+            combined_df = pd.concat(all_data, ignore_index=True)
+            combined_df['datetime'] = pd.to_datetime(combined_df['datetime'])
+            if start is not None:
+                combined_df = combined_df[combined_df['datetime'] >= pd.Timestamp(start)]
+            if end is not None:
+                combined_df = combined_df[combined_df['datetime'] <= pd.Timestamp(end)]
         combined_df = combined_df.sort_values('datetime').reset_index(drop=True)
         
         return combined_df
@@ -155,11 +283,41 @@ class ArbitrageSimulator:
         self.trades.append(self.current_position)
         self.current_position = None
     
-    def simulate(self):
-        """シミュレーション実行"""
+    def simulate(self, df=None, engine='numpy'):
+        """
+        シミュレーション実行
+        engine='numpy' は配列版、'iterrows' は行ごとに判定する従来版（結果は同一）
+        """
         print("取引シミュレーションを開始...")
-        df = self.load_data()
+        if df is None:
+            df = self.load_data()
+        self.trades = []
+        self.current_position = None
         
+        if engine == 'iterrows':
+            return self._simulate_iterrows(df)
+        
+        result = simulate_arrays(df['datetime'].values.astype('datetime64[ns]').astype(np.int64),
+                                 df['arbitrage_1'].values, df['arbitrage_2'].values,
+                                 self.entry_threshold, self.exit_threshold, self.stop_loss,
+                                 self.max_hold_minutes, self.trading_fee)
+        datetimes = df['datetime']
+        for i in range(len(result['entry_idx'])):
+            self.trades.append(Trade(
+                entry_time=datetimes.iloc[result['entry_idx'][i]],
+                exit_time=datetimes.iloc[result['exit_idx'][i]],
+                entry_spread=float(result['entry_spread'][i]),
+                exit_spread=float(result['exit_spread'][i]),
+                direction=DIRECTIONS[result['direction'][i]],
+                pnl=float(result['pnl'][i]),
+                duration_minutes=float(result['duration_minutes'][i]),
+                exit_reason=EXIT_REASONS[result['reason'][i]]
+            ))
+        
+        return self.trades
+    
+    def _simulate_iterrows(self, df):
+        """行ごとに判定する従来版（配列版の検証用）"""
         for idx, row in df.iterrows():
             # エグジット条件チェック（優先）
             if self.current_position is not None:
@@ -313,6 +471,8 @@ def main():
     ]
     
     all_results = {}
+    # データは1回だけ読み込んで全シナリオで共有する
+    df = ArbitrageSimulator().load_data()
     
     for scenario in scenarios:
         print(f"\n{'='*50}")
@@ -330,7 +490,7 @@ def main():
             max_hold_minutes=scenario['max_hold']
         )
         
-        trades = simulator.simulate()
+        trades = simulator.simulate(df)
         trades_df = simulator.analyze_results()
         
         if trades_df is not None:
@@ -346,7 +506,8 @@ def main():
     print("シナリオ比較サマリー")
     print(f"{'='*60}")
     
-    for name, result in all_results.items():
+    # 総P&Lの降順に表示（グリッドでの並列スイープは backtest_sweep.py）
+    for name, result in sorted(all_results.items(), key=lambda x: x[1]['total_pnl'], reverse=True):
         print(f"{name:10} | 取引数: {result['total_trades']:3d} | "
               f"総P&L: {result['total_pnl']:8.0f}円 | "
               f"勝率: {result['win_rate']:5.1f}%")
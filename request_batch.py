@@ -0,0 +1,27 @@
+import asyncio
+
+
+class RequestBatch():
+    """
+    RESTリクエストのまとまり
+    order_create() などが返すビルダーで、バッチごとに独立して送信できる
+    （インスタンス間・コルーチン間でリクエストを共有しない）
+    """
+
+    def __init__(self, fetch, requests=None):
+        self.fetch = fetch
+        self.requests = list(requests) if requests is not None else []
+
+    def __len__(self):
+        return len(self.requests)
+
+    def add(self, *batches):
+        """他のバッチのリクエストを取り込む（同時送信用）"""
+        for batch in batches:
+            self.requests.extend(batch.requests)
+        return self
+
+    async def send(self):
+        """バッチ内のリクエストを並列に送信し、結果をリクエスト順で返す"""
+        promises = [self.fetch(req) for req in self.requests]
+        return await asyncio.gather(*promises)
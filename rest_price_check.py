@@ -11,8 +11,14 @@ import json
 import time
 import csv
 import os
+import sys
+import asyncio
+import aiohttp
 from datetime import datetime
 
+from price_csv_writer import PriceCsvWriter
+from spread_store import SpreadStore
+
 # GMOコインとBitbankで共通対応している通貨ペア（名前をマッピング）
 SUPPORTED_SYMBOLS = {
     'BTC_JPY': 'btc_jpy',
@@ -28,22 +34,77 @@ SUPPORTED_SYMBOLS = {
     'BCH_JPY': 'bcc_jpy'  # BitbankではBCHがbcc_jpyとして表記
 }
 
+GMO_TICKER_URL = "https://api.coin.z.com/public/v1/ticker"  # symbol を省略すると全通貨
+BITBANK_TICKER_URL = "https://public.bitbank.cc/{symbol}/ticker"
+BITBANK_ALL_TICKERS_URL = "https://public.bitbank.cc/tickers"  # 全通貨ペア
+
+# CSVの列
+CSV_FIELDNAMES = [
+    'timestamp', 'datetime', 'symbol',
+    'gmo_bid', 'gmo_ask', 'gmo_spread',
+    'bitbank_bid', 'bitbank_ask', 'bitbank_spread',
+    'arbitrage_1', 'arbitrage_2', 'max_arbitrage'
+]
+
+# 非同期取得での取引所ごとの上限（1秒あたりのリクエスト数）
+RATE_LIMITS = {
+    'gmo': 20,
+    'bitbank': 10
+}
+
+def gmo_ticker(ticker, symbol):
+    return {
+        "bid": float(ticker["bid"]),  # 買値
+        "ask": float(ticker["ask"]),  # 売値
+        "timestamp": ticker["timestamp"],
+        "symbol": symbol
+    }
+
+def bitbank_ticker(ticker, symbol):
+    return {
+        "bid": float(ticker["buy"]),   # 買値
+        "ask": float(ticker["sell"]),  # 売値
+        "timestamp": ticker["timestamp"],
+        "symbol": symbol
+    }
+
+def parse_gmo_ticker(data, symbol):
+    """GMOCoinのティッカーのレスポンスを共通の形にする（失敗時は None）"""
+    if data["status"] == 0:
+        return gmo_ticker(data["data"][0], symbol)
+    return None
+
+def parse_bitbank_ticker(data, symbol):
+    """Bitbankのティッカーのレスポンスを共通の形にする（失敗時は None）"""
+    if data["success"] == 1:
+        return bitbank_ticker(data["data"], symbol)
+    return None
+
+def parse_gmo_all_tickers(data):
+    """GMOCoinの全通貨のティッカー（symbol 省略時）から対応通貨だけを取り出す"""
+    tickers = {}
+    if data["status"] == 0:
+        for ticker in data["data"]:
+            if ticker["symbol"] in SUPPORTED_SYMBOLS:
+                tickers[ticker["symbol"]] = gmo_ticker(ticker, ticker["symbol"])
+    return tickers
+
+def parse_bitbank_all_tickers(data):
+    """Bitbankの全通貨ペアのティッカーから対応通貨だけを取り出す（キーはGMOのシンボル名）"""
+    gmo_symbols = {bitbank_symbol: gmo_symbol for gmo_symbol, bitbank_symbol in SUPPORTED_SYMBOLS.items()}
+    tickers = {}
+    if data["success"] == 1:
+        for ticker in data["data"]:
+            if ticker["pair"] in gmo_symbols:
+                tickers[gmo_symbols[ticker["pair"]]] = bitbank_ticker(ticker, ticker["pair"])
+    return tickers
+
 def get_gmo_ticker(symbol="BTC_JPY"):
     """GMOCoinのティッカー情報を取得"""
     try:
-        url = "https://api.coin.z.com/public/v1/ticker"
         params = {"symbol": symbol}
-        response = requests.get(url, params=params, timeout=10)
-        data = response.json()
-        
-        if data["status"] == 0:
-            ticker = data["data"][0]
-            return {
-                "bid": float(ticker["bid"]),  # 買値
-                "ask": float(ticker["ask"]),  # 売値
-                "timestamp": ticker["timestamp"],
-                "symbol": symbol
-            }
+        response = requests.get(GMO_TICKER_URL, params=params, timeout=10)
+        return parse_gmo_ticker(response.json(), symbol)
     except Exception as e:
         print(f"GMO価格取得エラー ({symbol}): {e}")
     return None
@@ -61,18 +122,8 @@ def get_gmo_all_tickers():
 def get_bitbank_ticker(symbol="btc_jpy"):
     """Bitbankのティッカー情報を取得"""
     try:
-        url = f"https://public.bitbank.cc/{symbol}/ticker"
-        response = requests.get(url, timeout=10)
-        data = response.json()
-        
-        if data["success"] == 1:
-            ticker = data["data"]
-            return {
-                "bid": float(ticker["buy"]),   # 買値
-                "ask": float(ticker["sell"]),  # 売値
-                "timestamp": ticker["timestamp"],
-                "symbol": symbol
-            }
+        response = requests.get(BITBANK_TICKER_URL.format(symbol=symbol), timeout=10)
+        return parse_bitbank_ticker(response.json(), symbol)
     except Exception as e:
         print(f"Bitbank価格取得エラー ({symbol}): {e}")
     return None
@@ -87,6 +138,123 @@ def get_bitbank_all_tickers():
         time.sleep(0.1)  # レート制限対策
     return tickers
 
+def get_gmo_all_tickers_bulk():
+    """GMOCoinの全対応通貨のティッカー情報を1回のリクエストで取得"""
+    try:
+        response = requests.get(GMO_TICKER_URL, timeout=10)
+        return parse_gmo_all_tickers(response.json())
+    except Exception as e:
+        print(f"GMO価格取得エラー (全通貨): {e}")
+    return {}
+
+def get_bitbank_all_tickers_bulk():
+    """Bitbankの全対応通貨のティッカー情報を1回のリクエストで取得"""
+    try:
+        response = requests.get(BITBANK_ALL_TICKERS_URL, timeout=10)
+        return parse_bitbank_all_tickers(response.json())
+    except Exception as e:
+        print(f"Bitbank価格取得エラー (全通貨): {e}")
+    return {}
+
+# ------ 非同期での一括取得 ------ #
+class RateLimiter():
+    """1秒あたり rate 回までに抑える（トークンバケット。rate 回までは待たずにまとめて送れる）"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class AsyncTickerClient():
+    """
+    両取引所の全通貨のティッカーを同時に取得する
+    セッション（接続）を使い回し、取引所ごとに RATE_LIMITS の上限を守る
+
+        async with AsyncTickerClient() as client:
+            gmo_tickers, bitbank_tickers = await client.get_all_tickers()
+    """
+
+    def __init__(self, rate_limits=RATE_LIMITS, timeout=10):
+        self.limiters = {exchange: RateLimiter(rate) for exchange, rate in rate_limits.items()}
+        self.timeout = timeout
+        self.session = None
+
+    async def __aenter__(self):
+        self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    async def get_json(self, exchange, url, params=None):
+        await self.limiters[exchange].acquire()
+        async with self.session.get(url, params=params) as response:
+            return await response.json(content_type=None)
+
+    async def get_gmo_ticker(self, symbol):
+        try:
+            return parse_gmo_ticker(await self.get_json('gmo', GMO_TICKER_URL, {"symbol": symbol}), symbol)
+        except Exception as e:
+            print(f"GMO価格取得エラー ({symbol}): {e}")
+        return None
+
+    async def get_bitbank_ticker(self, symbol):
+        try:
+            return parse_bitbank_ticker(await self.get_json('bitbank', BITBANK_TICKER_URL.format(symbol=symbol)), symbol)
+        except Exception as e:
+            print(f"Bitbank価格取得エラー ({symbol}): {e}")
+        return None
+
+    async def get_gmo_all_tickers_bulk(self):
+        try:
+            return parse_gmo_all_tickers(await self.get_json('gmo', GMO_TICKER_URL))
+        except Exception as e:
+            print(f"GMO価格取得エラー (全通貨): {e}")
+        return {}
+
+    async def get_bitbank_all_tickers_bulk(self):
+        try:
+            return parse_bitbank_all_tickers(await self.get_json('bitbank', BITBANK_ALL_TICKERS_URL))
+        except Exception as e:
+            print(f"Bitbank価格取得エラー (全通貨): {e}")
+        return {}
+
+    async def get_all_tickers(self, bulk=False):
+        """
+        (GMOのティッカー, Bitbankのティッカー) をどちらもGMOのシンボル名で返す
+        bulk=True なら取引所ごとに全通貨のティッカーを1回のリクエストで取得する
+        """
+        if bulk:
+            return tuple(await asyncio.gather(self.get_gmo_all_tickers_bulk(), self.get_bitbank_all_tickers_bulk()))
+        gmo_symbols = list(SUPPORTED_SYMBOLS.keys())
+        results = await asyncio.gather(
+            *[self.get_gmo_ticker(symbol) for symbol in gmo_symbols],
+            *[self.get_bitbank_ticker(SUPPORTED_SYMBOLS[symbol]) for symbol in gmo_symbols])
+        gmo_results, bitbank_results = results[:len(gmo_symbols)], results[len(gmo_symbols):]
+        gmo_tickers = {symbol: ticker for symbol, ticker in zip(gmo_symbols, gmo_results) if ticker}
+        bitbank_tickers = {symbol: ticker for symbol, ticker in zip(gmo_symbols, bitbank_results) if ticker}
+        return gmo_tickers, bitbank_tickers
+
+def open_csv_writer(columnar=False):
+    """
+    継続監視用の CSV 書き込み（ファイルを開いたまま行をまとめて書き出す。get_csv_filename と同じファイル）
+    書き出した行は価格差履歴ストアにも追記する
+    """
+    return PriceCsvWriter(CSV_FIELDNAMES, directory='data', prefix='price_data_all_symbols', columnar=columnar,
+                          store=SpreadStore())
+
 def get_csv_filename():
     """日別CSVファイル名を生成"""
     today = datetime.now().strftime('%Y%m%d')
@@ -101,13 +269,7 @@ def save_to_csv(data):
     file_exists = os.path.isfile(filename)
     
     with open(filename, 'a', newline='', encoding='utf-8') as csvfile:
-        fieldnames = [
-            'timestamp', 'datetime', 'symbol',
-            'gmo_bid', 'gmo_ask', 'gmo_spread',
-            'bitbank_bid', 'bitbank_ask', 'bitbank_spread',
-            'arbitrage_1', 'arbitrage_2', 'max_arbitrage'
-        ]
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer = csv.DictWriter(csvfile, fieldnames=CSV_FIELDNAMES)
         
         # ヘッダーを書き込み（新規ファイルの場合）
         if not file_exists:
@@ -169,16 +331,34 @@ def analyze_single_symbol(symbol, gmo_data, bitbank_data):
         'max_arbitrage': max_arbitrage
     }
 
-def analyze_arbitrage_opportunity():
-    """全通貨ペアのアービトラージ機会を分析"""
+def analyze_arbitrage_opportunity(bulk=False, writer=None):
+    """全通貨ペアのアービトラージ機会を分析（bulk=True なら取引所ごとに1回のリクエストで取得）"""
     print("=== GMO×Bitbank 全通貨価格差チェック ===")
     print(f"実行時刻: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     
     # 全通貨の価格データ取得
     print("\n[価格データ取得中...]")
-    gmo_tickers = get_gmo_all_tickers()
-    bitbank_tickers = get_bitbank_all_tickers()
-    
+    if bulk:
+        gmo_tickers = get_gmo_all_tickers_bulk()
+        bitbank_tickers = get_bitbank_all_tickers_bulk()
+    else:
+        gmo_tickers = get_gmo_all_tickers()
+        bitbank_tickers = get_bitbank_all_tickers()
+    return analyze_tickers(gmo_tickers, bitbank_tickers, writer)
+
+async def analyze_arbitrage_opportunity_async(client, bulk=False, writer=None):
+    """全通貨ペアのアービトラージ機会を分析（AsyncTickerClient で全通貨を同時に取得）"""
+    print("=== GMO×Bitbank 全通貨価格差チェック ===")
+    print(f"実行時刻: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+    print("\n[価格データ取得中...]")
+    start = time.perf_counter()
+    gmo_tickers, bitbank_tickers = await client.get_all_tickers(bulk)
+    print(f"取得時間: {(time.perf_counter() - start) * 1000:.0f}ms")
+    return analyze_tickers(gmo_tickers, bitbank_tickers, writer)
+
+def analyze_tickers(gmo_tickers, bitbank_tickers, writer=None):
+    """取得したティッカーから各通貨ペアを分析し、CSVに保存して結果を表示（writer を渡すとそこに書く）"""
     if not gmo_tickers or not bitbank_tickers:
         print("[エラー] 価格データの取得に失敗しました")
         return
@@ -201,7 +381,10 @@ def analyze_arbitrage_opportunity():
             }
             
             # CSVに保存
-            save_to_csv(csv_data)
+            if writer is not None:
+                writer.write(csv_data)
+            else:
+                save_to_csv(csv_data)
             results.append(result)
         else:
             print(f"\n=== {symbol} ===")
@@ -229,18 +412,22 @@ def analyze_arbitrage_opportunity():
     
     return results
 
-def continuous_monitoring(duration=None, interval=5):
-    """継続的な監視"""
-    if duration:
-        print(f"\n[監視開始] {duration}秒間、{interval}秒間隔で監視を開始...")
-    else:
-        print(f"\n[監視開始] 無制限に{interval}秒間隔で監視を開始...")
-        print("停止するには Ctrl+C を押してください")
+def continuous_monitoring(duration=None, interval=5, concurrent=False, bulk=False, columnar=False):
+    """
+    継続的な監視（concurrent=True なら全通貨を非同期で同時に取得、bulk=True なら取引所ごとに1回のリクエストで取得）
+    CSV は開いたままにしてまとめて書き出し、columnar=True なら列ごとのファイルにも書く
+    """
+    if concurrent:
+        asyncio.run(continuous_monitoring_async(duration, interval, bulk, columnar))
+        return
+
+    print_monitoring_start(duration, interval)
     
     start_time = time.time()
     check_count = 0
     best_opportunity = 0
     best_symbol = ""
+    writer = open_csv_writer(columnar)
     
     try:
         while True:
@@ -250,7 +437,7 @@ def continuous_monitoring(duration=None, interval=5):
             check_count += 1
             print(f"\n--- チェック {check_count} ---")
             
-            results = analyze_arbitrage_opportunity()
+            results = analyze_arbitrage_opportunity(bulk, writer)
             if results:
                 # 最大価格差を更新
                 current_best = max(results, key=lambda x: x['max_arbitrage'])
@@ -262,7 +449,53 @@ def continuous_monitoring(duration=None, interval=5):
             
     except KeyboardInterrupt:
         print("\n\n[停止] 監視を停止しました")
+    finally:
+        writer.close()
     
+    print_monitoring_summary(start_time, check_count, best_opportunity, best_symbol)
+
+async def continuous_monitoring_async(duration=None, interval=5, bulk=False, columnar=False):
+    """継続的な監視（接続を使い回し、毎回全通貨を同時に取得）"""
+    print_monitoring_start(duration, interval)
+
+    start_time = time.time()
+    check_count = 0
+    best_opportunity = 0
+    best_symbol = ""
+
+    try:
+        with open_csv_writer(columnar) as writer:
+            async with AsyncTickerClient() as client:
+                while True:
+                    if duration and time.time() - start_time >= duration:
+                        break
+
+                    check_count += 1
+                    print(f"\n--- チェック {check_count} ---")
+
+                    results = await analyze_arbitrage_opportunity_async(client, bulk, writer)
+                    if results:
+                        # 最大価格差を更新
+                        current_best = max(results, key=lambda x: x['max_arbitrage'])
+                        if current_best['max_arbitrage'] > best_opportunity:
+                            best_opportunity = current_best['max_arbitrage']
+                            best_symbol = current_best['symbol']
+
+                    await asyncio.sleep(interval)
+
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        print("\n\n[停止] 監視を停止しました")
+
+    print_monitoring_summary(start_time, check_count, best_opportunity, best_symbol)
+
+def print_monitoring_start(duration, interval):
+    if duration:
+        print(f"\n[監視開始] {duration}秒間、{interval}秒間隔で監視を開始...")
+    else:
+        print(f"\n[監視開始] 無制限に{interval}秒間隔で監視を開始...")
+        print("停止するには Ctrl+C を押してください")
+
+def print_monitoring_summary(start_time, check_count, best_opportunity, best_symbol):
     elapsed_time = time.time() - start_time
     print(f"\n[監視結果サマリー]")
     print(f"実行時間: {elapsed_time/60:.1f}分")
@@ -270,9 +503,24 @@ def continuous_monitoring(duration=None, interval=5):
     print(f"最大価格差: {best_opportunity:.1f}円 ({best_symbol})")
     print(f"データファイル: {get_csv_filename()}")
 
+async def analyze_once_async(bulk=False):
+    async with AsyncTickerClient() as client:
+        return await analyze_arbitrage_opportunity_async(client, bulk)
+
 if __name__ == '__main__':
+    # --async: 全通貨を非同期で同時に取得する
+    # --bulk: 取引所ごとに全通貨のティッカーを1回のリクエストで取得する（監視間隔は1秒）
+    # --columnar: 継続監視で CSV と同じ内容を列ごとのファイルにも書く
+    concurrent = '--async' in sys.argv[1:]
+    bulk = '--bulk' in sys.argv[1:]
+    columnar = '--columnar' in sys.argv[1:]
+    interval = 1 if bulk else 5
+
     # まず1回チェック
-    result = analyze_arbitrage_opportunity()
+    if concurrent:
+        result = asyncio.run(analyze_once_async(bulk))
+    else:
+        result = analyze_arbitrage_opportunity(bulk)
     
     # 継続監視するか確認
     print(f"\n[継続監視] 継続監視を行いますか？")
@@ -285,13 +533,13 @@ if __name__ == '__main__':
     try:
         choice = input("選択 (1-5): ").strip()
         if choice == "1":
-            continuous_monitoring(300, 5)  # 5分間
+            continuous_monitoring(300, interval, concurrent, bulk, columnar)  # 5分間
         elif choice == "2":
-            continuous_monitoring(600, 5)  # 10分間
+            continuous_monitoring(600, interval, concurrent, bulk, columnar)  # 10分間
         elif choice == "3":
-            continuous_monitoring(3600, 5)  # 1時間
+            continuous_monitoring(3600, interval, concurrent, bulk, columnar)  # 1時間
         elif choice == "4":
-            continuous_monitoring(None, 5)  # 無制限
+            continuous_monitoring(None, interval, concurrent, bulk, columnar)  # 無制限
         else:
             print("チェック完了")
     except KeyboardInterrupt:
@@ -12,7 +12,11 @@ import hmac
 import hashlib
 from requests import Request
 import pybotters
-import pandas as pd
+from request_batch import RequestBatch
+from best_bid_ask import BestBidAsk, normalize_level
+from order_book import OrderBook
+from candle_builder import CandleBuilder, normalize_trade
+from ohlcv_ring import OHLCVRing
 
 class Socket_PyBotters_BitBank():
 
@@ -20,6 +24,7 @@ class Socket_PyBotters_BitBank():
     TIMEOUT = 3600               # タイムアウト
     EXTEND_TOKEN_TIME = 3000     # アクセストークン延長までの時間
     SYMBOL = 'btc_jpy'           # シンボル[BTCUSDT]
+    SYMBOLS = None               # 板を購読する銘柄（None なら SYMBOL のみ）
     URLS = {'REST_PRIVATE': 'https://api.bitbank.cc/v1',
             'REST_PUBRIC': 'https://public.bitbank.cc',
             #'REST': 'https://api.bybit.com',
@@ -48,69 +53,81 @@ class Socket_PyBotters_BitBank():
     }
     store = pybotters.bitbankDataStore()
     MAX_OHLCV_CAPACITY = 60 * 60 * 48
-    df_ohlcv = pd.DataFrame(
-        columns=["exec_date", "Open", "High", "Low", "Close", "Volume", "timestamp"]).set_index("exec_date")
 
     # 変数
     api_key = ''
     api_secret = ''
 
     session = None          # セッション保持
-    requests = []           # リクエストパラメータ
     heartbeat = 0
 
+    # 接続プール設定
+    CONNECTION_LIMIT = 100       # 同時接続数の上限
+    KEEPALIVE_TIMEOUT = 30       # keep-alive保持時間（秒）
+    DNS_CACHE_TTL = 300          # DNSキャッシュ保持時間（秒）
+    CANDLE_FLUSH_DELAY = 1       # 約定の無い秒を確定させるまでの猶予（秒）
+
     # ------------------------------------------------ #
     # init
     # ------------------------------------------------ #
     def __init__(self, keys):
         # APIキー・SECRETをセット
         self.KEYS = keys
+        self.session = None
+        self.book_caches = {}  # 銘柄 -> BestBidAsk
+        self.order_books = {}  # 銘柄 -> OrderBook
+        self.book_task = None
+        self.candle_builders = {}  # 銘柄 -> CandleBuilder
+        self.trade_task = None
+        self.ohlcv = OHLCVRing(self.MAX_OHLCV_CAPACITY)  # realtime_klines の足
 
     # ------------------------------------------------ #
     # async request for rest api
     # ------------------------------------------------ #
     async def get_info_bitbank(self):
-        self.info()
-        response = await self.send()
+        batch = self.info()
+        response = await batch.send()
         pairs = response[0]["data"]["pairs"]
         return next(item for item in pairs if item["name"] == self.SYMBOL)
 
     async def buy_in(self, sell_price, qty=None):
-        self.order_create(side="buy",
-                          pair=self.SYMBOL,
-                          order_type="limit",
-                          qty=qty,
-                          price=sell_price,
-                          )
-        response = await self.send()
+        batch = self.order_create(side="buy",
+                                  pair=self.SYMBOL,
+                                  order_type="limit",
+                                  qty=qty,
+                                  price=sell_price,
+                                  )
+        response = await batch.send()
         print(response)
+        return response
 
     async def buy_out(self, buy_price, exec_qty):
         """
         買いの決済
         """
-        self.order_create(side="sell",
-                          pair=self.SYMBOL,
-                          order_type="limit",
-                          qty=exec_qty,
-                          price=buy_price,
-                          )
-        response = await self.send()
+        batch = self.order_create(side="sell",
+                                  pair=self.SYMBOL,
+                                  order_type="limit",
+                                  qty=exec_qty,
+                                  price=buy_price,
+                                  )
+        response = await batch.send()
         print(response)
+        return response
 
     # 信用取引用メソッド
     async def margin_buy_in(self, price, qty):
         """
         信用取引での買い建て（ロング）
         """
-        self.order_create(side="buy",
-                          pair=self.SYMBOL,
-                          order_type="limit",
-                          qty=qty,
-                          price=price,
-                          position_side="long"
-                          )
-        response = await self.send()
+        batch = self.order_create(side="buy",
+                                  pair=self.SYMBOL,
+                                  order_type="limit",
+                                  qty=qty,
+                                  price=price,
+                                  position_side="long"
+                                  )
+        response = await batch.send()
         print(response)
         return response
 
@@ -118,14 +135,14 @@ class Socket_PyBotters_BitBank():
         """
         信用取引での売り建て（ショート）
         """
-        self.order_create(side="sell",
-                          pair=self.SYMBOL,
-                          order_type="limit",
-                          qty=qty,
-                          price=price,
-                          position_side="short"
-                          )
-        response = await self.send()
+        batch = self.order_create(side="sell",
+                                  pair=self.SYMBOL,
+                                  order_type="limit",
+                                  qty=qty,
+                                  price=price,
+                                  position_side="short"
+                                  )
+        response = await batch.send()
         print(response)
         return response
 
@@ -133,14 +150,14 @@ class Socket_PyBotters_BitBank():
         """
         信用取引での買い決済（ショートポジションの決済）
         """
-        self.order_create(side="buy",
-                          pair=self.SYMBOL,
-                          order_type="limit",
-                          qty=qty,
-                          price=price,
-                          position_side="short"
-                          )
-        response = await self.send()
+        batch = self.order_create(side="buy",
+                                  pair=self.SYMBOL,
+                                  order_type="limit",
+                                  qty=qty,
+                                  price=price,
+                                  position_side="short"
+                                  )
+        response = await batch.send()
         print(response)
         return response
 
@@ -148,26 +165,26 @@ class Socket_PyBotters_BitBank():
         """
         信用取引での売り決済（ロングポジションの決済）
         """
-        self.order_create(side="sell",
-                          pair=self.SYMBOL,
-                          order_type="limit",
-                          qty=qty,
-                          price=price,
-                          position_side="long"
-                          )
-        response = await self.send()
+        batch = self.order_create(side="sell",
+                                  pair=self.SYMBOL,
+                                  order_type="limit",
+                                  qty=qty,
+                                  price=price,
+                                  position_side="long"
+                                  )
+        response = await batch.send()
         print(response)
         return response
 
     async def order_cancel(self, order_id):
-        self._order_cancel(order_id=order_id, pair=self.SYMBOL)
-        response = await self.send()
+        batch = self._order_cancel(order_id=order_id, pair=self.SYMBOL)
+        response = await batch.send()
         print(response)
 
     async def margin_order_cancel(self, order_id):
         """信用取引用の注文キャンセル"""
-        self._margin_order_cancel(order_id=order_id, pair=self.SYMBOL)
-        response = await self.send()
+        batch = self._margin_order_cancel(order_id=order_id, pair=self.SYMBOL)
+        response = await batch.send()
         print(response)
 
     def set_request(self, method, access_modifiers, target_path, params, base_url=None):
@@ -178,60 +195,80 @@ class Socket_PyBotters_BitBank():
                 base_url = self.URLS['REST_PUBLIC']
             
         url = ''.join([base_url, target_path])
+        requests = []
         if method == 'GET':
             headers = ''
-            self.requests.append({'method': method,
-                                  'access_modifiers': access_modifiers,
-                                  'target_path': target_path, 'url': url,
-                                  'params': params, 'headers':{}})
+            requests.append({'method': method,
+                             'access_modifiers': access_modifiers,
+                             'target_path': target_path, 'url': url,
+                             'params': params, 'headers':{}})
 
         if method == 'POST':
             headers = ''
-            self.requests.append({'method': method,
-                                  'access_modifiers': access_modifiers,
-                                  'target_path': target_path, 'url': url,
-                                  'params': params, 'headers':headers})
+            requests.append({'method': method,
+                             'access_modifiers': access_modifiers,
+                             'target_path': target_path, 'url': url,
+                             'params': params, 'headers':headers})
 
 
         if method == 'PUT':
             post_data = json.dumps(params)
-            self.requests.append({'url': url,
-                                  'method': method,
-                                  'params': post_data,
-                                  })
+            requests.append({'url': url,
+                             'method': method,
+                             'params': post_data,
+                             })
 
         if method == 'DELETE':
-            self.requests.append({'url': url,
-                                  'method': method,
-                                  'params': params,
-                                  })
-
+            requests.append({'url': url,
+                             'method': method,
+                             'params': params,
+                             })
+
+        return RequestBatch(self.fetch, requests)
+
+
+    def get_session(self):
+        """REST用の接続プール付きセッションを取得（未作成なら作成）"""
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.CONNECTION_LIMIT,
+                                             keepalive_timeout=self.KEEPALIVE_TIMEOUT,
+                                             ttl_dns_cache=self.DNS_CACHE_TTL)
+            self.session = pybotters.Client(apis=self.KEYS, connector=connector)
+        return self.session
+
+    async def close_session(self):
+        """REST用セッションを閉じる"""
+        if self.session is not None:
+            session = self.session
+            self.session = None
+            await session.close()
 
     async def fetch(self, req):
         status = 0
         content = []
-        async with pybotters.Client(apis=self.KEYS) as client:
-            if req["method"] == 'GET':
-                r = await client.get(req['url'], params=req['params'], headers=req['headers'])
-            else:
-                r = await client.request(req["method"], req['url'], data=req['params'], headers=req['headers'])
-            if r.status == 200:
-                content = await r.read()
-
-            if len(content) == 0:
-                result = []
-            else:
-                try:
-                    result = json.loads(content.decode('utf-8'))
-                except Exception as e:
-                    traceback.print_exc()
-
-                return result
-
-    async def send(self):
-        promises = [self.fetch(req) for req in self.requests]
-        self.requests.clear()
-        return await asyncio.gather(*promises)
+        client = self.get_session()
+        if req["method"] == 'GET':
+            r = await client.get(req['url'], params=req['params'], headers=req['headers'])
+        else:
+            r = await client.request(req["method"], req['url'], data=req['params'], headers=req['headers'])
+        if r.status == 200:
+            content = await r.read()
+        else:
+            r.release()
+
+        if len(content) == 0:
+            result = []
+        else:
+            try:
+                result = json.loads(content.decode('utf-8'))
+            except Exception as e:
+                traceback.print_exc()
+
+            return result
+
+    async def send(self, *batches):
+        """複数のバッチをまとめて並列に送信する"""
+        return await RequestBatch(self.fetch).add(*batches).send()
 
     # ------------------------------------------------ #
     # REST API(Market Data Endpoints)
@@ -243,29 +280,29 @@ class Socket_PyBotters_BitBank():
         if yyyymmdd:
             target_path += '/' + yyyymmdd
         params = {}
-        self.set_request(method='GET', access_modifiers='public',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='public',
+                                target_path=target_path, params=params)
 
     # Query Kline
     # 確認済
     def kline(self, pair, interval, yyyymmdd):
         target_path = '/' + pair + '/candlestick/' + interval + '/' + yyyymmdd
         params = {}
-        self.set_request(method='GET', access_modifiers='public',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='public',
+                                target_path=target_path, params=params)
                          
     
     # Latest Information for Symbol
     # 確認済
     def ticker(self, pair):
         target_path = '/' + pair + '/ticker'
-        self.set_request(method='GET', access_modifiers='public',
-                         target_path=target_path)
+        return self.set_request(method='GET', access_modifiers='public',
+                                target_path=target_path)
 
     def depth(self):
         target_path = '/' + self.SYMBOL + '/depth'
-        self.set_request(method='GET', access_modifiers='public',
-                         target_path=target_path)
+        return self.set_request(method='GET', access_modifiers='public',
+                                target_path=target_path)
 
     
     # ------------------------------------------------ #
@@ -293,9 +330,10 @@ class Socket_PyBotters_BitBank():
         if position_side in ['long', 'short']:
             params['position_side'] = position_side
 
-        self.set_request(method='POST', access_modifiers='private',
-                         target_path=target_path, params=params)
-        print(self.requests)
+        batch = self.set_request(method='POST', access_modifiers='private',
+                                 target_path=target_path, params=params)
+        print(batch.requests)
+        return batch
     
     # Get Active Order（現物取引）
     def order_list(self, pair, count=None, from_id=None, end_id=None, since=None, end=None):
@@ -316,8 +354,8 @@ class Socket_PyBotters_BitBank():
         if end is not None:
             params['end'] = int(end)
 
-        self.set_request(method='GET', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='private',
+                                target_path=target_path, params=params)
     
     # Get Active Order（信用取引用）
     def margin_order_list(self, pair, count=None, from_id=None, end_id=None, since=None, end=None):
@@ -339,8 +377,8 @@ class Socket_PyBotters_BitBank():
         if end is not None:
             params['end'] = int(end)
 
-        self.set_request(method='GET', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='private',
+                                target_path=target_path, params=params)
 
 
 
@@ -360,8 +398,8 @@ class Socket_PyBotters_BitBank():
                     'order_id': order_id,
         }
 
-        self.set_request(method='POST', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='POST', access_modifiers='private',
+                                target_path=target_path, params=params)
 
     # Cancel Active Order（信用取引）
     def _margin_order_cancel(self, pair, order_id=''):
@@ -373,8 +411,8 @@ class Socket_PyBotters_BitBank():
                     'order_id': order_id,
         }
 
-        self.set_request(method='POST', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='POST', access_modifiers='private',
+                                target_path=target_path, params=params)
 
 
     def orders_cancel(self, pair, order_ids):
@@ -385,8 +423,8 @@ class Socket_PyBotters_BitBank():
                     'order_ids': order_ids
         }
 
-        self.set_request(method='POST', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='POST', access_modifiers='private',
+                                target_path=target_path, params=params)
 
     def order_info(self, pair, order_id):
         target_path = '/user/spot/order'
@@ -396,8 +434,8 @@ class Socket_PyBotters_BitBank():
             'order_id': order_id
         }
 
-        self.set_request(method='POST', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='POST', access_modifiers='private',
+                                target_path=target_path, params=params)
 
 
     # My Position（現物取引用）
@@ -410,16 +448,16 @@ class Socket_PyBotters_BitBank():
     def position_list(self):
         target_path = '/user/assets'
 
-        self.set_request(method='GET', access_modifiers='private',
-                         target_path=target_path, params={})
+        return self.set_request(method='GET', access_modifiers='private',
+                                target_path=target_path, params={})
 
     # My Position（信用取引用）
     def margin_position_list(self):
         # 信用取引専用のポジション確認エンドポイント
         target_path = '/user/margin/positions'
 
-        self.set_request(method='GET', access_modifiers='private',
-                         target_path=target_path, params={})
+        return self.set_request(method='GET', access_modifiers='private',
+                                target_path=target_path, params={})
 
 
 
@@ -453,13 +491,13 @@ class Socket_PyBotters_BitBank():
         if len(str(order)) > 0:
             params['order'] = str(order)
 
-        self.set_request(method='GET', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='private',
+                                target_path=target_path, params=params)
 
     def info(self):
         target_path = '/spot/pairs'
-        self.set_request(method='GET', access_modifiers='private',
-                         target_path=target_path, params={})
+        return self.set_request(method='GET', access_modifiers='private',
+                                target_path=target_path, params={})
 
 
     # ------------------------------------------------ #
@@ -469,17 +507,19 @@ class Socket_PyBotters_BitBank():
     async def ws_run(self):
         try:
             print(f"Bitbank WebSocket starting with keys: {list(self.KEYS.keys())}")
+            # REST用セッションを起動時に確立し、以降の注文で使い回す
+            self.get_session()
+            # 最良気配キャッシュの更新を開始
+            self.book_task = asyncio.create_task(self.watch_book())
+            # 約定からの1秒足の生成を開始
+            self.trade_task = asyncio.create_task(self.watch_trades())
             async with pybotters.Client(apis=self.KEYS) as client:
                 print("Connecting to Bitbank WebSocket...")
                 
                 # WebSocket接続の開始
                 await client.ws_connect(
                     self.URLS['WebSocket_Public'],
-                    send_str=[
-                        f'42["join-room","ticker_{self.SYMBOL}"]',
-                        f'42["join-room","transactions_{self.SYMBOL}"]',
-                        f'42["join-room","depth_whole_{self.SYMBOL}"]',
-                    ],
+                    send_str=self.public_rooms(),
                     hdlr_str=self.store.onmessage,
                 )
                 print("Bitbank WebSocket connected")
@@ -492,34 +532,102 @@ class Socket_PyBotters_BitBank():
             print(f"Bitbank WebSocket error: {e}")
             import traceback
             traceback.print_exc()
+        finally:
+            await self.close_session()
+
+    def ws_symbols(self):
+        """板を購読する銘柄（SYMBOL が先頭）"""
+        return [self.SYMBOL] + [symbol for symbol in self.SYMBOLS or () if symbol != self.SYMBOL]
+
+    def public_rooms(self):
+        """Public WebSocket で参加するルーム（ティッカー・約定は SYMBOL のみ、板は ws_symbols の全銘柄）"""
+        rooms = [
+            f'42["join-room","ticker_{self.SYMBOL}"]',
+            f'42["join-room","transactions_{self.SYMBOL}"]',
+        ]
+        for symbol in self.ws_symbols():
+            rooms.append(f'42["join-room","depth_whole_{symbol}"]')
+        return rooms
+
+    # ------------------------------------------------ #
+    # best bid / ask cache
+    # ------------------------------------------------ #
+    def book_cache(self, symbol=None):
+        """銘柄ごとの最良気配キャッシュを取得（未作成なら作成）"""
+        if symbol is None:
+            symbol = self.SYMBOL
+        if symbol not in self.book_caches:
+            self.book_caches[symbol] = BestBidAsk(symbol)
+        return self.book_caches[symbol]
+
+    def order_book(self, symbol=None):
+        """銘柄ごとの板（全レベル）を取得（未作成なら作成）"""
+        if symbol is None:
+            symbol = self.SYMBOL
+        if symbol not in self.order_books:
+            self.order_books[symbol] = OrderBook(symbol)
+        return self.order_books[symbol]
+
+    async def watch_book(self):
+        """板の変更イベントを最良気配キャッシュと板に反映する"""
+        datastore = self.store.depth
+        with datastore.watch() as stream:
+            for item in datastore.find():
+                level = normalize_level(item)
+                if level is not None:
+                    self.book_cache(level[0]).apply("insert", *level[1:])
+                    self.order_book(level[0]).apply("insert", *level[1:])
+            async for change in stream:
+                level = normalize_level(change.data)
+                if level is not None:
+                    self.book_cache(level[0]).apply(change.operation, *level[1:])
+                    self.order_book(level[0]).apply(change.operation, *level[1:])
+
+    # ------------------------------------------------ #
+    # 1 second candles
+    # ------------------------------------------------ #
+    def candle_builder(self, symbol=None):
+        """銘柄ごとの1秒足ビルダーを取得（未作成なら作成）"""
+        if symbol is None:
+            symbol = self.SYMBOL
+        if symbol not in self.candle_builders:
+            self.candle_builders[symbol] = CandleBuilder(symbol)
+        return self.candle_builders[symbol]
+
+    async def watch_trades(self):
+        """約定イベントを1秒足ビルダーに反映する"""
+        flush_task = asyncio.create_task(self.flush_candles())
+        try:
+            with self.store.transactions.watch() as stream:
+                async for change in stream:
+                    if change.operation != "insert":
+                        continue
+                    trade = normalize_trade(change.data)
+                    if trade is not None:
+                        self.candle_builder(trade[0]).apply(*trade[1:])
+        finally:
+            flush_task.cancel()
+
+    async def flush_candles(self):
+        """約定の無い時間帯も足を確定させる（取引所との時刻ずれを見込んで CANDLE_FLUSH_DELAY 秒遅らせる）"""
+        while True:
+            await asyncio.sleep(1)
+            now_ms = int((time.time() - self.CANDLE_FLUSH_DELAY) * 1000)
+            for builder in self.candle_builders.values():
+                builder.flush(now_ms)
 
     async def realtime_klines(self):
         with self.store.kline.watch() as klines:
             async for msg in klines:
                 data = msg.data
-                data_d = {"exec_date": int(data["start"]),
-                          "timestamp": int(data["start"]),
-                          "Open": float(data["open"]),
-                          "High": float(data["high"]),
-                          "Low": float(data["low"]),
-                          "Close": float(data["close"]),
-                          "Volume": float(data["volume"]),
-                         }
-                data_d = pd.DataFrame(data_d, index=[0])
-                data_d["exec_date"] = pd.to_datetime(data_d['exec_date'], unit="s")
-                data_d = data_d.set_index("exec_date")
-                data_d["timestamp"] = data_d["timestamp"].astype(int)
-                if len(self.df_ohlcv) == 0:
-                    self.df_ohlcv = pd.concat([self.df_ohlcv, data_d])
-                else:
-                    last_timestamp = self.df_ohlcv.index[-1]
-                    if last_timestamp == data_d.index[0]:
-                        self.df_ohlcv.update(data_d)
-                    else:
-                        self.df_ohlcv = pd.concat([self.df_ohlcv, data_d])
-
-                await asyncio.sleep(1)
-            if len(self.df_ohlcv) > self.MAX_OHLCV_CAPACITY:
-                self.df_ohlcv = self.df_ohlcv[1:]
-
-
+                self.ohlcv.update(int(data["start"]),
+                                  float(data["open"]),
+                                  float(data["high"]),
+                                  float(data["low"]),
+                                  float(data["close"]),
+                                  float(data["volume"]))
+
+    @property
+    def df_ohlcv(self):
+        """realtime_klines の足（exec_date インデックスの DataFrame。列はリングバッファを参照するので書き換えないこと）"""
+        return self.ohlcv.to_frame()
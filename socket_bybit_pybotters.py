@@ -12,7 +12,11 @@ import hmac
 import hashlib
 from requests import Request
 import pybotters
-import pandas as pd
+from request_batch import RequestBatch
+from best_bid_ask import BestBidAsk, normalize_level
+from order_book import OrderBook
+from candle_builder import CandleBuilder, normalize_trade
+from ohlcv_ring import OHLCVRing
 
 
 class Socket_PyBotters_Bybit():
@@ -32,6 +36,8 @@ class Socket_PyBotters_Bybit():
            }  
     '''
     PUBLIC_CHANNELS = [SYMBOL + '@kline_1m',
+                       'orderbook.50.' + SYMBOL,
+                       'publicTrade.' + SYMBOL,
                        # 'candle.1.' + SYMBOL,
                        ]
     # PUBLIC_CHANNELS = []
@@ -49,23 +55,34 @@ class Socket_PyBotters_Bybit():
     }
     store = pybotters.BybitDataStore()
     MAX_OHLCV_CAPACITY = 60 * 60 * 1
-    df_ohlcv = pd.DataFrame(
-        columns=["exec_date", "Open", "High", "Low", "Close", "Volume", "timestamp"]).set_index("exec_date")
 
     # 変数
     api_key = ''
     api_secret = ''
 
     session = None  # セッション保持
-    requests = []  # リクエストパラメータ
     heartbeat = 0
 
+    # 接続プール設定
+    CONNECTION_LIMIT = 100  # 同時接続数の上限
+    KEEPALIVE_TIMEOUT = 30  # keep-alive保持時間（秒）
+    DNS_CACHE_TTL = 300  # DNSキャッシュ保持時間（秒）
+    CANDLE_FLUSH_DELAY = 1  # 約定の無い秒を確定させるまでの猶予（秒）
+    REQUEST_TIMEOUT = 10  # リクエストタイムアウト（秒）
+
     # ------------------------------------------------ #
     # init
     # ------------------------------------------------ #
     def __init__(self, keys, prod=False):
         # APIキー・SECRETをセット
         self.KEYS = keys
+        self.session = None
+        self.book_caches = {}  # 銘柄 -> BestBidAsk
+        self.order_books = {}  # 銘柄 -> OrderBook
+        self.book_task = None
+        self.candle_builders = {}  # 銘柄 -> CandleBuilder
+        self.trade_task = None
+        self.ohlcv = OHLCVRing(self.MAX_OHLCV_CAPACITY)  # realtime_klines の足
         if prod:
             self.URLS = {'REST': 'https://api.bybit.com/',
                          'WebSocket_Public': "wss://stream.bybit.com/v5/public/linear",
@@ -73,15 +90,15 @@ class Socket_PyBotters_Bybit():
                          }
 
     async def sell_in(self, buy_price, qty):
-        self.order_create(side="Sell",
-                          order_type="Limit",
-                          qty=qty,
-                          price=str(buy_price),
-                          time_in_force="GTC",
-                          close_on_trigger=False,
-                          reduce_only=False,
-                          )
-        response = await self.send()
+        batch = self.order_create(side="Sell",
+                                  order_type="Limit",
+                                  qty=qty,
+                                  price=str(buy_price),
+                                  time_in_force="GTC",
+                                  close_on_trigger=False,
+                                  reduce_only=False,
+                                  )
+        response = await batch.send()
         print(response)
         return response
 
@@ -89,44 +106,44 @@ class Socket_PyBotters_Bybit():
         """
         売りの決済
         """
-        self.order_create(side="Buy",
-                          order_type="Limit",
-                          qty=exec_qty,
-                          price=str(sell_price),
-                          time_in_force="GTC",
-                          close_on_trigger=False,
-                          order_link_id=str(timestamp) + "_sellout",
-                          reduce_only=True,
-                          )
-        response = await self.send()
+        batch = self.order_create(side="Buy",
+                                  order_type="Limit",
+                                  qty=exec_qty,
+                                  price=str(sell_price),
+                                  time_in_force="GTC",
+                                  close_on_trigger=False,
+                                  order_link_id=str(timestamp) + "_sellout",
+                                  reduce_only=True,
+                                  )
+        response = await batch.send()
         print(response)
 
     async def buy_in(self, sell_price, qty):
-        self.order_create(side="Buy",
-                          order_type="Limit",
-                          qty=qty,
-                          price=str(sell_price),
-                          time_in_force="GTC",
-                          close_on_trigger=False,
-                          reduce_only=False
-                          )
-        response = await self.send()
+        batch = self.order_create(side="Buy",
+                                  order_type="Limit",
+                                  qty=qty,
+                                  price=str(sell_price),
+                                  time_in_force="GTC",
+                                  close_on_trigger=False,
+                                  reduce_only=False
+                                  )
+        response = await batch.send()
         print(response)
 
     async def buy_out(self, buy_price, exec_qty, timestamp=None):
         """
         買いの決済
         """
-        self.order_create(side="Sell",
-                          order_type="Limit",
-                          qty=exec_qty,
-                          price=str(buy_price),
-                          time_in_force="GTC",
-                          close_on_trigger=False,
-                          order_link_id=str(timestamp) + "_buyout",
-                          reduce_only=True,
-                          )
-        response = await self.send()
+        batch = self.order_create(side="Sell",
+                                  order_type="Limit",
+                                  qty=exec_qty,
+                                  price=str(buy_price),
+                                  time_in_force="GTC",
+                                  close_on_trigger=False,
+                                  order_link_id=str(timestamp) + "_buyout",
+                                  reduce_only=True,
+                                  )
+        response = await batch.send()
         print(response)
 
         # ------------------------------------------------ #
@@ -139,49 +156,68 @@ class Socket_PyBotters_Bybit():
             base_url = self.URLS['REST']
 
         url = ''.join([base_url, target_path])
+        requests = []
         if method == 'GET':
             headers = ''
-            self.requests.append({'method': method,
-                                  'access_modifiers': access_modifiers,
-                                  'target_path': target_path, 'url': url,
-                                  'params': params, 'headers': {}})
+            requests.append({'method': method,
+                             'access_modifiers': access_modifiers,
+                             'target_path': target_path, 'url': url,
+                             'params': params, 'headers': {}})
 
         if method == 'POST':
             headers = ''
-            self.requests.append({'method': method,
-                                  'access_modifiers': access_modifiers,
-                                  'target_path': target_path, 'url': url,
-                                  'params': params, 'headers': headers})
+            requests.append({'method': method,
+                             'access_modifiers': access_modifiers,
+                             'target_path': target_path, 'url': url,
+                             'params': params, 'headers': headers})
 
         if method == 'PUT':
             post_data = json.dumps(params)
-            self.requests.append({'url': url,
-                                  'method': method,
-                                  'params': post_data,
-                                  })
+            requests.append({'url': url,
+                             'method': method,
+                             'params': post_data,
+                             })
 
         if method == 'DELETE':
-            self.requests.append({'url': url,
-                                  'method': method,
-                                  'params': params,
-                                  })
+            requests.append({'url': url,
+                             'method': method,
+                             'params': params,
+                             })
+
+        return RequestBatch(self.fetch, requests)
+
+    def get_session(self):
+        """REST用の接続プール付きセッションを取得（未作成なら作成）"""
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.CONNECTION_LIMIT,
+                                             keepalive_timeout=self.KEEPALIVE_TIMEOUT,
+                                             ttl_dns_cache=self.DNS_CACHE_TTL)
+            self.session = pybotters.Client(apis=self.KEYS, connector=connector,
+                                            timeout=aiohttp.ClientTimeout(total=self.REQUEST_TIMEOUT))
+        return self.session
+
+    async def close_session(self):
+        """REST用セッションを閉じる"""
+        if self.session is not None:
+            session = self.session
+            self.session = None
+            await session.close()
 
     async def fetch(self, req, retry_count=3, retry_delay=10):
         try:
-            kwargs = {
-                'timeout': aiohttp.ClientTimeout(total=10)}
-            async with pybotters.Client(apis=self.KEYS, **kwargs) as client:
-                if req["method"] == 'GET':
-                    response = await client.get(req['url'], params=req['params'], headers=req['headers'])
-                else:
-                    response = await client.request(req["method"], req['url'], data=req['params'],
-                                                    headers=req['headers'])
-
-                if response.status == 200:
-                    content = await response.read()
-                    return json.loads(content.decode('utf-8'))
-                else:
-                    raise Exception(response)
+            client = self.get_session()
+            if req["method"] == 'GET':
+                response = await client.get(req['url'], params=req['params'], headers=req['headers'])
+            else:
+                response = await client.request(req["method"], req['url'], data=req['params'],
+                                                headers=req['headers'])
+
+            if response.status == 200:
+                content = await response.read()
+                return json.loads(content.decode('utf-8'))
+            else:
+                response.release()
+                raise Exception(response)
 
         except Exception as e:
             traceback.print_exc()
@@ -193,10 +229,9 @@ class Socket_PyBotters_Bybit():
             else:
                 raise e
 
-    async def send(self):
-        promises = [self.fetch(req) for req in self.requests]
-        self.requests.clear()
-        return await asyncio.gather(*promises)
+    async def send(self, *batches):
+        """複数のバッチをまとめて並列に送信する"""
+        return await RequestBatch(self.fetch).add(*batches).send()
 
     # Long-Short Ratio
     # 確認済
@@ -212,8 +247,8 @@ class Socket_PyBotters_Bybit():
         if len(str(limit)) > 0:
             target_path = ''.join([target_path, '&limit=', str(limit)])
         params = {}
-        self.set_request(method='GET', access_modifiers='public',
-                         target_path=target_path, params=params, base_url='https://api.bybit.com')
+        return self.set_request(method='GET', access_modifiers='public',
+                                target_path=target_path, params=params, base_url='https://api.bybit.com')
 
     # ------------------------------------------------ #
     # REST API(Market Data Endpoints)
@@ -223,8 +258,8 @@ class Socket_PyBotters_Bybit():
     def orderbook(self):
         target_path = ''.join(['/v2/public/orderBook/L2/?symbol=', self.SYMBOL])
         params = {}
-        self.set_request(method='GET', access_modifiers='public',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='public',
+                                target_path=target_path, params=params)
 
     # Query Kline
     # 確認済
@@ -236,8 +271,8 @@ class Socket_PyBotters_Bybit():
         if len(str(limit)) > 0:
             target_path = ''.join([target_path, '&limit=', str(limit)])
         params = {}
-        self.set_request(method='GET', access_modifiers='public',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='public',
+                                target_path=target_path, params=params)
 
     # Latest Information for Symbol
 
@@ -249,16 +284,16 @@ class Socket_PyBotters_Bybit():
             target_path = ''.join([target_path, '&limit=', str(limit)])
 
         params = {}
-        self.set_request(method='GET', access_modifiers='public',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='public',
+                                target_path=target_path, params=params)
 
     # Query Symbol
     # 確認済
     def symbols(self):
         target_path = '/v2/public/symbols'
         params = {}
-        self.set_request(method='GET', access_modifiers='public',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='public',
+                                target_path=target_path, params=params)
 
     # Liquidated Orders
     # 確認済
@@ -275,8 +310,8 @@ class Socket_PyBotters_Bybit():
             target_path = ''.join([target_path, '&end_time=', str(end_time)])
 
         params = {}
-        self.set_request(method='GET', access_modifiers='public',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='public',
+                                target_path=target_path, params=params)
 
     # Get the Last Funding Rate
     # 確認済
@@ -293,8 +328,8 @@ class Socket_PyBotters_Bybit():
             'symbol': self.SYMBOL
         }
 
-        self.set_request(method='GET', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='private',
+                                target_path=target_path, params=params)
 
     # Query Mark Price Kline
     # 確認済
@@ -315,8 +350,8 @@ class Socket_PyBotters_Bybit():
             target_path = ''.join([target_path, '&limit=', str(limit)])
 
         params = {}
-        self.set_request(method='GET', access_modifiers='public',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='public',
+                                target_path=target_path, params=params)
 
     # Query index price kline
     # 確認済
@@ -337,8 +372,8 @@ class Socket_PyBotters_Bybit():
             target_path = ''.join([target_path, '&limit=', str(limit)])
 
         params = {}
-        self.set_request(method='GET', access_modifiers='public',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='public',
+                                target_path=target_path, params=params)
 
     # Query premium index kline
     # 確認済
@@ -359,8 +394,8 @@ class Socket_PyBotters_Bybit():
             target_path = ''.join([target_path, '&limit=', str(limit)])
 
         params = {}
-        self.set_request(method='GET', access_modifiers='public',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='public',
+                                target_path=target_path, params=params)
 
     # Open Interest
     # 確認済
@@ -378,8 +413,8 @@ class Socket_PyBotters_Bybit():
             target_path = ''.join([target_path, '&limit=', str(limit)])
 
         params = {}
-        self.set_request(method='GET', access_modifiers='public',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='public',
+                                target_path=target_path, params=params)
 
     # Latest Big Deal
     # 確認済
@@ -396,8 +431,8 @@ class Socket_PyBotters_Bybit():
             target_path = ''.join([target_path, '&limit=', str(limit)])
 
         params = {}
-        self.set_request(method='GET', access_modifiers='public',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='public',
+                                target_path=target_path, params=params)
 
     # Long-Short Ratio
     # 確認済
@@ -418,8 +453,8 @@ class Socket_PyBotters_Bybit():
             target_path = ''.join([target_path, '&limit=', str(limit)])
 
         params = {}
-        self.set_request(method='GET', access_modifiers='public',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='public',
+                                target_path=target_path, params=params)
 
         if test_flg:
             self.URLS['REST'] = 'https://api-testnet.bybit.com'
@@ -447,8 +482,8 @@ class Socket_PyBotters_Bybit():
             target_path = ''.join([target_path, '&order_status=', order_status])
             params['orderStatus'] = order_status
 
-        self.set_request(method='GET', access_modifiers='private',
-                         target_path=target_path, params={})
+        return self.set_request(method='GET', access_modifiers='private',
+                                target_path=target_path, params={})
 
     # Place Active Order
     # 未確認
@@ -501,9 +536,10 @@ class Socket_PyBotters_Bybit():
         if len(str(reduce_only)) > 0:
             params['reduceOnly'] = reduce_only
 
-        self.set_request(method='POST', access_modifiers='private',
-                         target_path=target_path, params=params)
-        print(self.requests)
+        batch = self.set_request(method='POST', access_modifiers='private',
+                                 target_path=target_path, params=params)
+        print(batch.requests)
+        return batch
 
     # Get Active Order
     # 未確認
@@ -541,8 +577,8 @@ class Socket_PyBotters_Bybit():
             target_path = ''.join([target_path, '&limit=', limit])
             params['limit'] = limit
 
-        self.set_request(method='GET', access_modifiers='private',
-                         target_path=target_path, params={})
+        return self.set_request(method='GET', access_modifiers='private',
+                                target_path=target_path, params={})
 
     # Cancel Active Order
     # 未確認
@@ -566,8 +602,8 @@ class Socket_PyBotters_Bybit():
         if len(str(order_link_id)) > 0:
             params['orderLinkId'] = order_link_id
 
-        self.set_request(method='POST', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='POST', access_modifiers='private',
+                                target_path=target_path, params=params)
 
     # Cancel All Active Orders
     # 確認済
@@ -584,8 +620,8 @@ class Socket_PyBotters_Bybit():
             'category': 'linear',
         }
 
-        self.set_request(method='POST', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='POST', access_modifiers='private',
+                                target_path=target_path, params=params)
 
     # Replace Active Order
     # 未確認
@@ -634,8 +670,8 @@ class Socket_PyBotters_Bybit():
         if len(str(sl_trigger_by)) > 0:
             params['sl_trigger_by'] = sl_trigger_by
 
-        self.set_request(method='POST', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='POST', access_modifiers='private',
+                                target_path=target_path, params=params)
 
     '''
     # Query Active Order (real-time)
@@ -662,8 +698,8 @@ class Socket_PyBotters_Bybit():
             target_path = ''.join([target_path, '&order_link_id=', order_link_id])
             params['order_link_id'] = order_link_id
 
-        self.set_request(method='GET', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='private',
+                                target_path=target_path, params=params)
     '''
 
     # Place Conditional Order
@@ -742,8 +778,8 @@ class Socket_PyBotters_Bybit():
         if len(str(sl_trigger_by)) > 0:
             params['sl_trigger_by'] = sl_trigger_by
 
-        self.set_request(method='POST', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='POST', access_modifiers='private',
+                                target_path=target_path, params=params)
 
     # Get Conditional Order
     # 未確認
@@ -783,8 +819,8 @@ class Socket_PyBotters_Bybit():
         if len(str(limit)) > 0:
             params['limit'] = limit
 
-        self.set_request(method='GET', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='private',
+                                target_path=target_path, params=params)
 
     # Cancel Conditional Order
     # 未確認
@@ -808,8 +844,8 @@ class Socket_PyBotters_Bybit():
         if len(str(order_link_id)) > 0:
             params['order_link_id'] = order_link_id
 
-        self.set_request(method='POST', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='POST', access_modifiers='private',
+                                target_path=target_path, params=params)
 
     # Cancel All Conditional Orders
     # 未確認
@@ -825,8 +861,8 @@ class Socket_PyBotters_Bybit():
             'symbol': self.SYMBOL
         }
 
-        self.set_request(method='POST', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='POST', access_modifiers='private',
+                                target_path=target_path, params=params)
 
     # Replace Conditional Order
     # 未確認
@@ -879,8 +915,8 @@ class Socket_PyBotters_Bybit():
         if len(str(sl_trigger_by)) > 0:
             params['sl_trigger_by'] = sl_trigger_by
 
-        self.set_request(method='POST', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='POST', access_modifiers='private',
+                                target_path=target_path, params=params)
 
     '''
     # Query Conditional Order (real-time)　未実装
@@ -907,8 +943,8 @@ class Socket_PyBotters_Bybit():
             target_path = ''.join([target_path, '&order_link_id=', order_link_id])
             params['order_link_id'] = order_link_id
 
-        self.set_request(method='GET', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='private',
+                                target_path=target_path, params=params)
     '''
 
     # My Position
@@ -925,8 +961,8 @@ class Socket_PyBotters_Bybit():
             'symbol': self.SYMBOL
         }
 
-        self.set_request(method='GET', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='private',
+                                target_path=target_path, params=params)
 
     # Set Auto Add Margin
     # 未確認
@@ -950,8 +986,8 @@ class Socket_PyBotters_Bybit():
         if len(str(auto_add_margin)) > 0:
             params['auto_add_margin'] = auto_add_margin
 
-        self.set_request(method='POST', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='POST', access_modifiers='private',
+                                target_path=target_path, params=params)
 
     # Cross/Isolated Margin Switch
     # 未実装
@@ -1005,8 +1041,8 @@ class Socket_PyBotters_Bybit():
         if len(str(sell_leverage)) > 0:
             params['sell_leverage'] = sell_leverage
 
-        self.set_request(method='POST', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='POST', access_modifiers='private',
+                                target_path=target_path, params=params)
 
         # Set Trading-Stop
 
@@ -1047,8 +1083,8 @@ class Socket_PyBotters_Bybit():
         if len(str(tp_size)) > 0:
             params['tp_size'] = tp_size
 
-        self.set_request(method='POST', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='POST', access_modifiers='private',
+                                target_path=target_path, params=params)
 
     # User Trade Records
     # 未確認
@@ -1089,8 +1125,8 @@ class Socket_PyBotters_Bybit():
             target_path = ''.join([target_path, '&limit=', limit])
             params['limit'] = limit
 
-        self.set_request(method='GET', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='private',
+                                target_path=target_path, params=params)
 
     # Closed Profit and Loss
     # 未確認
@@ -1131,8 +1167,8 @@ class Socket_PyBotters_Bybit():
             target_path = ''.join([target_path, '&limit=', limit])
             params['limit'] = limit
 
-        self.set_request(method='GET', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='private',
+                                target_path=target_path, params=params)
 
     # Get Risk Limit
     # 未確認
@@ -1148,8 +1184,8 @@ class Socket_PyBotters_Bybit():
             'symbol': self.SYMBOL
         }
 
-        self.set_request(method='GET', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='private',
+                                target_path=target_path, params=params)
 
     # Set Risk Limit
     # 未確認
@@ -1173,8 +1209,8 @@ class Socket_PyBotters_Bybit():
         if len(str(risk_id)) > 0:
             params['risk_id'] = risk_id
 
-        self.set_request(method='POST', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='POST', access_modifiers='private',
+                                target_path=target_path, params=params)
 
     # Predicted Funding Rate and My Funding Fee
     # 未確認
@@ -1190,8 +1226,8 @@ class Socket_PyBotters_Bybit():
             'symbol': self.SYMBOL
         }
 
-        self.set_request(method='GET', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='private',
+                                target_path=target_path, params=params)
 
     # My Last Funding Fee
     # 未確認
@@ -1207,8 +1243,8 @@ class Socket_PyBotters_Bybit():
             'symbol': self.SYMBOL
         }
 
-        self.set_request(method='GET', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='private',
+                                target_path=target_path, params=params)
 
     # API Key Info
     # 確認済
@@ -1222,8 +1258,8 @@ class Socket_PyBotters_Bybit():
 
         params = {}
 
-        self.set_request(method='GET', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='private',
+                                target_path=target_path, params=params)
 
     # LCP Info
     # 確認済
@@ -1240,8 +1276,8 @@ class Socket_PyBotters_Bybit():
             'symbol': self.SYMBOL
         }
 
-        self.set_request(method='GET', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='private',
+                                target_path=target_path, params=params)
 
     # ------------------------------------------------ #
     # REST API(Wallet Data Endpoints)
@@ -1264,8 +1300,8 @@ class Socket_PyBotters_Bybit():
             target_path = ''.join([target_path, '&coin=', coin])
             params['coin'] = coin
 
-        self.set_request(method='GET', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='private',
+                                target_path=target_path, params=params)
 
     # Wallet Fund Records
     # 確認済
@@ -1309,8 +1345,8 @@ class Socket_PyBotters_Bybit():
             target_path = ''.join([target_path, 'limit=', limit])
             params['limit'] = limit
 
-        self.set_request(method='GET', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='private',
+                                target_path=target_path, params=params)
 
     # Withdraw Records
     # 確認済
@@ -1349,8 +1385,8 @@ class Socket_PyBotters_Bybit():
             target_path = ''.join([target_path, 'limit=', limit])
             params['limit'] = limit
 
-        self.set_request(method='GET', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='private',
+                                target_path=target_path, params=params)
 
     # Asset Exchange Records
     # 確認済
@@ -1377,8 +1413,8 @@ class Socket_PyBotters_Bybit():
             target_path = ''.join([target_path, 'direction=', direction])
             params['direction'] = direction
 
-        self.set_request(method='GET', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='private',
+                                target_path=target_path, params=params)
 
     def instruments_info(self, category='linear', symbol='', baseCoin='', limit='', cursor=''):
         target_path = 'v5/market/instruments-info?'
@@ -1394,8 +1430,8 @@ class Socket_PyBotters_Bybit():
         if len(str(cursor)) > 0:
             target_path = ''.join([target_path, '&cursor=', cursor])
 
-        self.set_request(method='GET', access_modifiers='private',
-                         target_path=target_path, params={})
+        return self.set_request(method='GET', access_modifiers='private',
+                                target_path=target_path, params={})
 
     # ------------------------------------------------ #
     # WebSocket
@@ -1403,6 +1439,12 @@ class Socket_PyBotters_Bybit():
 
     async def ws_run(self):
         try:
+            # REST用セッションを起動時に確立し、以降の注文で使い回す
+            self.get_session()
+            # 最良気配キャッシュの更新を開始
+            self.book_task = asyncio.create_task(self.watch_book())
+            # 約定からの1秒足の生成を開始
+            self.trade_task = asyncio.create_task(self.watch_trades())
             async with pybotters.Client(apis=self.KEYS, base_url=self.URLS["REST"]) as client:
                 await self.store.initialize(
                     client.get("v5/position/list", params={'symbol': self.SYMBOL, 'category': 'linear'}),
@@ -1459,36 +1501,91 @@ class Socket_PyBotters_Bybit():
 
         except Exception as e:
             print(traceback.format_exc().strip())
+        finally:
+            await self.close_session()
+
+    # ------------------------------------------------ #
+    # best bid / ask cache
+    # ------------------------------------------------ #
+    def book_cache(self, symbol=None):
+        """銘柄ごとの最良気配キャッシュを取得（未作成なら作成）"""
+        if symbol is None:
+            symbol = self.SYMBOL
+        if symbol not in self.book_caches:
+            self.book_caches[symbol] = BestBidAsk(symbol)
+        return self.book_caches[symbol]
+
+    def order_book(self, symbol=None):
+        """銘柄ごとの板（全レベル）を取得（未作成なら作成）"""
+        if symbol is None:
+            symbol = self.SYMBOL
+        if symbol not in self.order_books:
+            self.order_books[symbol] = OrderBook(symbol)
+        return self.order_books[symbol]
+
+    async def watch_book(self):
+        """板の変更イベントを最良気配キャッシュと板に反映する"""
+        datastore = self.store.orderbook
+        with datastore.watch() as stream:
+            for item in datastore.find():
+                level = normalize_level(item)
+                if level is not None:
+                    self.book_cache(level[0]).apply("insert", *level[1:])
+                    self.order_book(level[0]).apply("insert", *level[1:])
+            async for change in stream:
+                level = normalize_level(change.data)
+                if level is not None:
+                    self.book_cache(level[0]).apply(change.operation, *level[1:])
+                    self.order_book(level[0]).apply(change.operation, *level[1:])
+
+    # ------------------------------------------------ #
+    # 1 second candles
+    # ------------------------------------------------ #
+    def candle_builder(self, symbol=None):
+        """銘柄ごとの1秒足ビルダーを取得（未作成なら作成）"""
+        if symbol is None:
+            symbol = self.SYMBOL
+        if symbol not in self.candle_builders:
+            self.candle_builders[symbol] = CandleBuilder(symbol)
+        return self.candle_builders[symbol]
+
+    async def watch_trades(self):
+        """約定イベントを1秒足ビルダーに反映する"""
+        flush_task = asyncio.create_task(self.flush_candles())
+        try:
+            with self.store.trade.watch() as stream:
+                async for change in stream:
+                    if change.operation != "insert":
+                        continue
+                    trade = normalize_trade(change.data)
+                    if trade is not None:
+                        self.candle_builder(trade[0]).apply(*trade[1:])
+        finally:
+            flush_task.cancel()
+
+    async def flush_candles(self):
+        """約定の無い時間帯も足を確定させる（取引所との時刻ずれを見込んで CANDLE_FLUSH_DELAY 秒遅らせる）"""
+        while True:
+            await asyncio.sleep(1)
+            now_ms = int((time.time() - self.CANDLE_FLUSH_DELAY) * 1000)
+            for builder in self.candle_builders.values():
+                builder.flush(now_ms)
 
     async def realtime_klines(self, ctx: pybotters.store.StoreStream):
         with ctx as klines:
             async for msg in klines:
                 data = msg.data
-                data_d = {"exec_date": int(str(data["start"])[:-3]),
-                          "timestamp": int(str(data["start"])[:-3]),
-                          "Open": float(data["open"]),
-                          "High": float(data["high"]),
-                          "Low": float(data["low"]),
-                          "Close": float(data["close"]),
-                          "Volume": float(data["volume"]),
-                          }
-                data_d = pd.DataFrame(data_d, index=[0])
-                data_d["exec_date"] = pd.to_datetime(data_d['exec_date'], unit="s")
-                data_d = data_d.set_index("exec_date")
-                data_d["timestamp"] = data_d["timestamp"].astype(int)
-                if len(self.df_ohlcv) == 0:
-                    self.df_ohlcv = pd.concat([self.df_ohlcv, data_d])
-                else:
-                    last_timestamp = self.df_ohlcv.index[-1]
-                    if last_timestamp == data_d.index[0]:
-                        self.df_ohlcv.update(data_d)
-                        # print(self.df_ohlcv)
-                    else:
-                        self.df_ohlcv = pd.concat([self.df_ohlcv, data_d])
-
-                await asyncio.sleep(1)
-            if len(self.df_ohlcv) > self.MAX_OHLCV_CAPACITY:
-                self.df_ohlcv = self.df_ohlcv[1:]
+                self.ohlcv.update(int(str(data["start"])[:-3]),
+                                  float(data["open"]),
+                                  float(data["high"]),
+                                  float(data["low"]),
+                                  float(data["close"]),
+                                  float(data["volume"]))
+
+    @property
+    def df_ohlcv(self):
+        """realtime_klines の足（exec_date インデックスの DataFrame。列はリングバッファを参照するので書き換えないこと）"""
+        return self.ohlcv.to_frame()
 
     async def realtime_trades(self, ctx: pybotters.store.StoreStream):
         with ctx as trades:
@@ -4,8 +4,13 @@ import aiohttp
 import asyncio
 from enum import Enum
 import json
+import time
 import traceback
 import pybotters
+from request_batch import RequestBatch
+from best_bid_ask import BestBidAsk, normalize_level
+from order_book import OrderBook
+from candle_builder import CandleBuilder, normalize_trade
 import pandas as pd
 
 class Socket_PyBotters_GMOCoin():
@@ -14,6 +19,7 @@ class Socket_PyBotters_GMOCoin():
     TIMEOUT = 3600               # タイムアウト
     EXTEND_TOKEN_TIME = 3000     # アクセストークン延長までの時間
     SYMBOL = 'BTC_JPY'           # シンボル[BTCUSDT]
+    SYMBOLS = None               # 板を購読する銘柄（None なら SYMBOL のみ）
     URLS = {'REST_PRIVATE': 'https://api.coin.z.com/private',
             'REST_PUBRIC': 'https://api.coin.z.com/public',
             'WebSocket_Public': 'wss://api.coin.z.com/ws/public/v1',
@@ -51,76 +57,91 @@ class Socket_PyBotters_GMOCoin():
     api_secret = ''
 
     session = None          # セッション保持
-    requests = []           # リクエストパラメータ
     heartbeat = 0
 
+    # 接続プール設定
+    CONNECTION_LIMIT = 100       # 同時接続数の上限
+    KEEPALIVE_TIMEOUT = 30       # keep-alive保持時間（秒）
+    DNS_CACHE_TTL = 300          # DNSキャッシュ保持時間（秒）
+    CANDLE_FLUSH_DELAY = 1       # 約定の無い秒を確定させるまでの猶予（秒）
+
     # ------------------------------------------------ #
     # init
     # ------------------------------------------------ #
     def __init__(self, keys):
         # APIキー・SECRETをセット
         self.KEYS = keys
+        self.session = None
+        self.book_caches = {}  # 銘柄 -> BestBidAsk
+        self.order_books = {}  # 銘柄 -> OrderBook
+        self.book_task = None
+        self.candle_builders = {}  # 銘柄 -> CandleBuilder
+        self.trade_task = None
 
     # ------------------------------------------------ #
     # async request for rest api
     # ------------------------------------------------ #
     async def get_info_gmocoin(self):
-        self.info()
-        response = await self.send()
+        batch = self.info()
+        response = await batch.send()
         pairs = response[0]["data"]["pairs"]
         return next(item for item in pairs if item["name"] == self.SYMBOL)
 
     async def buy_in(self, sell_price, qty=None):
-        self.order_create(side="BUY",
-                          symbol=self.SYMBOL,
-                          executionType="LIMIT",
-                          qty=qty,
-                          price=sell_price,
-                          )
-        response = await self.send()
+        batch = self.order_create(side="BUY",
+                                  symbol=self.SYMBOL,
+                                  executionType="LIMIT",
+                                  qty=qty,
+                                  price=sell_price,
+                                  )
+        response = await batch.send()
         print(response)
+        return response
 
     async def buy_out(self, buy_price, exec_qty, pos_id):
         """
         買いの決済
         """
-        self.order_close(side="SELL",
-                         symbol=self.SYMBOL,
-                         executionType="LIMIT",
-                         qty=exec_qty,
-                         price=buy_price,
-                         positionId=pos_id,
-                         )
-        response = await self.send()
+        batch = self.order_close(side="SELL",
+                                 symbol=self.SYMBOL,
+                                 executionType="LIMIT",
+                                 qty=exec_qty,
+                                 price=buy_price,
+                                 positionId=pos_id,
+                                 )
+        response = await batch.send()
         print(response)
+        return response
 
     async def sell_in(self, buy_price, qty=None):
-        self.order_create(side="SELL",
-                          symbol=self.SYMBOL,
-                          executionType="LIMIT",
-                          qty=qty,
-                          price=buy_price,
-                          )
-        response = await self.send()
+        batch = self.order_create(side="SELL",
+                                  symbol=self.SYMBOL,
+                                  executionType="LIMIT",
+                                  qty=qty,
+                                  price=buy_price,
+                                  )
+        response = await batch.send()
         print(response)
+        return response
 
     async def sell_out(self, sell_price, exec_qty, pos_id):
         """
         買いの決済
         """
-        self.order_close(side="BUY",
-                         symbol=self.SYMBOL,
-                         executionType="LIMIT",
-                         qty=exec_qty,
-                         price=sell_price,
-                         positionId=pos_id,
-                         )
-        response = await self.send()
+        batch = self.order_close(side="BUY",
+                                 symbol=self.SYMBOL,
+                                 executionType="LIMIT",
+                                 qty=exec_qty,
+                                 price=sell_price,
+                                 positionId=pos_id,
+                                 )
+        response = await batch.send()
         print(response)
+        return response
 
     async def order_cancel(self, order_id):
-        self._order_cancel(order_id=order_id)
-        response = await self.send()
+        batch = self._order_cancel(order_id=order_id)
+        response = await batch.send()
         print(response)
 
     def set_request(self, method, access_modifiers, target_path, params, base_url=None):
@@ -131,60 +152,80 @@ class Socket_PyBotters_GMOCoin():
                 base_url = self.URLS['REST_PUBLIC']
             
         url = ''.join([base_url, target_path])
+        requests = []
         if method == 'GET':
             headers = ''
-            self.requests.append({'method': method,
-                                  'access_modifiers': access_modifiers,
-                                  'target_path': target_path, 'url': url,
-                                  'params': params, 'headers':{}})
+            requests.append({'method': method,
+                             'access_modifiers': access_modifiers,
+                             'target_path': target_path, 'url': url,
+                             'params': params, 'headers':{}})
 
         if method == 'POST':
             headers = ''
-            self.requests.append({'method': method,
-                                  'access_modifiers': access_modifiers,
-                                  'target_path': target_path, 'url': url,
-                                  'params': params, 'headers':headers})
+            requests.append({'method': method,
+                             'access_modifiers': access_modifiers,
+                             'target_path': target_path, 'url': url,
+                             'params': params, 'headers':headers})
 
 
         if method == 'PUT':
             post_data = json.dumps(params)
-            self.requests.append({'url': url,
-                                  'method': method,
-                                  'params': post_data,
-                                  })
+            requests.append({'url': url,
+                             'method': method,
+                             'params': post_data,
+                             })
 
         if method == 'DELETE':
-            self.requests.append({'url': url,
-                                  'method': method,
-                                  'params': params,
-                                  })
-
+            requests.append({'url': url,
+                             'method': method,
+                             'params': params,
+                             })
+
+        return RequestBatch(self.fetch, requests)
+
+
+    def get_session(self):
+        """REST用の接続プール付きセッションを取得（未作成なら作成）"""
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.CONNECTION_LIMIT,
+                                             keepalive_timeout=self.KEEPALIVE_TIMEOUT,
+                                             ttl_dns_cache=self.DNS_CACHE_TTL)
+            self.session = pybotters.Client(apis=self.KEYS, connector=connector)
+        return self.session
+
+    async def close_session(self):
+        """REST用セッションを閉じる"""
+        if self.session is not None:
+            session = self.session
+            self.session = None
+            await session.close()
 
     async def fetch(self, req):
         status = 0
         content = []
-        async with pybotters.Client(apis=self.KEYS) as client:
-            if req["method"] == 'GET':
-                r = await client.get(req['url'], params=req['params'], headers=req['headers'])
-            else:
-                r = await client.request(req["method"], req['url'], data=req['params'], headers=req['headers'])
-            if r.status == 200:
-                content = await r.read()
-
-            if len(content) == 0:
-                result = []
-            else:
-                try:
-                    result = json.loads(content.decode('utf-8'))
-                except Exception as e:
-                    traceback.print_exc()
-
-                return result
-
-    async def send(self):
-        promises = [self.fetch(req) for req in self.requests]
-        self.requests.clear()
-        return await asyncio.gather(*promises)
+        client = self.get_session()
+        if req["method"] == 'GET':
+            r = await client.get(req['url'], params=req['params'], headers=req['headers'])
+        else:
+            r = await client.request(req["method"], req['url'], data=req['params'], headers=req['headers'])
+        if r.status == 200:
+            content = await r.read()
+        else:
+            r.release()
+
+        if len(content) == 0:
+            result = []
+        else:
+            try:
+                result = json.loads(content.decode('utf-8'))
+            except Exception as e:
+                traceback.print_exc()
+
+            return result
+
+    async def send(self, *batches):
+        """複数のバッチをまとめて並列に送信する"""
+        return await RequestBatch(self.fetch).add(*batches).send()
 
     # ------------------------------------------------ #
     # REST API(Market Data Endpoints)
@@ -201,22 +242,22 @@ class Socket_PyBotters_GMOCoin():
                     'symbol': symbol,
                     'date': date,
         }
-        self.set_request(method='GET', access_modifiers='public',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='public',
+                                target_path=target_path, params=params)
                          
     
     # Latest Information for Symbol
     # 確認済
     def ticker(self, pair):
         target_path = '/v1/ticker'
-        self.set_request(method='GET', access_modifiers='public',
-                         target_path=target_path)
+        return self.set_request(method='GET', access_modifiers='public',
+                                target_path=target_path)
 
     def info(self):
         target_path = '/v1/symbols'
 
-        self.set_request(method='GET', access_modifiers='public',
-                         target_path=target_path, params={})
+        return self.set_request(method='GET', access_modifiers='public',
+                                target_path=target_path, params={})
 
     
     # ------------------------------------------------ #
@@ -240,9 +281,10 @@ class Socket_PyBotters_GMOCoin():
             params['losscutPrice'] = losscutPrice
 
 
-        self.set_request(method='POST', access_modifiers='private',
-                         target_path=target_path, params=params)
-        print(self.requests)
+        batch = self.set_request(method='POST', access_modifiers='private',
+                                 target_path=target_path, params=params)
+        print(batch.requests)
+        return batch
 
     def order_close(self, side, symbol, executionType, qty, positionId, price='', timeInForce='', losscutPrice=''):
         target_path = '/v1/closeOrder'
@@ -261,9 +303,10 @@ class Socket_PyBotters_GMOCoin():
             params['losscutPrice'] = losscutPrice
 
 
-        self.set_request(method='POST', access_modifiers='private',
-                         target_path=target_path, params=params)
-        print(self.requests)
+        batch = self.set_request(method='POST', access_modifiers='private',
+                                 target_path=target_path, params=params)
+        print(batch.requests)
+        return batch
     
     # Get Active Order
     def order_list(self, symbol, count=None, page=None):
@@ -278,8 +321,8 @@ class Socket_PyBotters_GMOCoin():
         if page is not None:
             params['page'] = int(page)
 
-        self.set_request(method='GET', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='private',
+                                target_path=target_path, params=params)
 
 
 
@@ -298,8 +341,8 @@ class Socket_PyBotters_GMOCoin():
                     'orderId': order_id,
         }
 
-        self.set_request(method='POST', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='POST', access_modifiers='private',
+                                target_path=target_path, params=params)
 
 
     def orders_cancel(self, order_ids):
@@ -309,8 +352,8 @@ class Socket_PyBotters_GMOCoin():
                     'orderIds': order_ids
         }
 
-        self.set_request(method='POST', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='POST', access_modifiers='private',
+                                target_path=target_path, params=params)
 
     def order_bulk_cancel(self, symbols, side='', settle_type='', desc=''):
         target_path = '/v1/cancelBulkOrder'
@@ -326,8 +369,8 @@ class Socket_PyBotters_GMOCoin():
         if len(str(desc)) > 0:
             params['desc'] = desc
 
-        self.set_request(method='POST', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='POST', access_modifiers='private',
+                                target_path=target_path, params=params)
 
     def order_info(self, order_id):
         target_path = '/v1/orders'
@@ -336,8 +379,8 @@ class Socket_PyBotters_GMOCoin():
             'order_id': order_id
         }
 
-        self.set_request(method='POST', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='POST', access_modifiers='private',
+                                target_path=target_path, params=params)
 
 
     # My Position
@@ -354,8 +397,8 @@ class Socket_PyBotters_GMOCoin():
             'symbol': symbol
         }
 
-        self.set_request(method='GET', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='private',
+                                target_path=target_path, params=params)
 
 
 
@@ -379,8 +422,8 @@ class Socket_PyBotters_GMOCoin():
         }
 
 
-        self.set_request(method='GET', access_modifiers='private',
-                         target_path=target_path, params=params)
+        return self.set_request(method='GET', access_modifiers='private',
+                                target_path=target_path, params=params)
 
 
     # ------------------------------------------------ #
@@ -390,6 +433,12 @@ class Socket_PyBotters_GMOCoin():
     async def ws_run(self):
         try:
             print(f"GMO WebSocket starting with keys: {list(self.KEYS.keys())}")
+            # REST用セッションを起動時に確立し、以降の注文で使い回す
+            self.get_session()
+            # 最良気配キャッシュの更新を開始
+            self.book_task = asyncio.create_task(self.watch_book())
+            # 約定からの1秒足の生成を開始
+            self.trade_task = asyncio.create_task(self.watch_trades())
             async with pybotters.Client(apis=self.KEYS, base_url=self.URLS["REST_PRIVATE"]) as client:
                 print("GMO Client created, initializing store...")
                 await self.store.initialize(
@@ -403,17 +452,7 @@ class Socket_PyBotters_GMOCoin():
                 print("Connecting to GMO public WebSocket...")
                 await client.ws_connect(
                     self.URLS['WebSocket_Public'],
-                    send_json=[{
-                            "command": "subscribe",
-                            "channel": "trades",
-                            "symbol": self.SYMBOL,
-                        },
-                        {
-                            "command": "subscribe",
-                            "channel": "orderbooks",
-                            "symbol": self.SYMBOL,
-                        },
-                    ],
+                    send_json=self.public_subscriptions(),
                     hdlr_json=self.store.onmessage
                 )
                 print("GMO public WebSocket connected")
@@ -454,6 +493,87 @@ class Socket_PyBotters_GMOCoin():
             print(f"GMO WebSocket error: {e}")
             import traceback
             traceback.print_exc()
+        finally:
+            await self.close_session()
+
+    def ws_symbols(self):
+        """板を購読する銘柄（SYMBOL が先頭）"""
+        return [self.SYMBOL] + [symbol for symbol in self.SYMBOLS or () if symbol != self.SYMBOL]
 
+    def public_subscriptions(self):
+        """
+        Public WebSocket の購読コマンド
+        約定は SYMBOL のみ、板は ws_symbols の全銘柄を1本の接続で購読する
+        （GMO の購読は1秒に1回までで pybotters が順に送るため、SYMBOL の分を先に送る）
+        """
+        subscriptions = [{"command": "subscribe", "channel": "trades", "symbol": self.SYMBOL}]
+        for symbol in self.ws_symbols():
+            subscriptions.append({"command": "subscribe", "channel": "orderbooks", "symbol": symbol})
+        return subscriptions
 
+    # ------------------------------------------------ #
+    # best bid / ask cache
+    # ------------------------------------------------ #
+    def book_cache(self, symbol=None):
+        """銘柄ごとの最良気配キャッシュを取得（未作成なら作成）"""
+        if symbol is None:
+            symbol = self.SYMBOL
+        if symbol not in self.book_caches:
+            self.book_caches[symbol] = BestBidAsk(symbol)
+        return self.book_caches[symbol]
+
+    def order_book(self, symbol=None):
+        """銘柄ごとの板（全レベル）を取得（未作成なら作成）"""
+        if symbol is None:
+            symbol = self.SYMBOL
+        if symbol not in self.order_books:
+            self.order_books[symbol] = OrderBook(symbol)
+        return self.order_books[symbol]
+
+    async def watch_book(self):
+        """板の変更イベントを最良気配キャッシュと板に反映する"""
+        datastore = self.store.orderbooks
+        with datastore.watch() as stream:
+            for item in datastore.find():
+                level = normalize_level(item)
+                if level is not None:
+                    self.book_cache(level[0]).apply("insert", *level[1:])
+                    self.order_book(level[0]).apply("insert", *level[1:])
+            async for change in stream:
+                level = normalize_level(change.data)
+                if level is not None:
+                    self.book_cache(level[0]).apply(change.operation, *level[1:])
+                    self.order_book(level[0]).apply(change.operation, *level[1:])
 
+    # ------------------------------------------------ #
+    # 1 second candles
+    # ------------------------------------------------ #
+    def candle_builder(self, symbol=None):
+        """銘柄ごとの1秒足ビルダーを取得（未作成なら作成）"""
+        if symbol is None:
+            symbol = self.SYMBOL
+        if symbol not in self.candle_builders:
+            self.candle_builders[symbol] = CandleBuilder(symbol)
+        return self.candle_builders[symbol]
+
+    async def watch_trades(self):
+        """約定イベントを1秒足ビルダーに反映する"""
+        flush_task = asyncio.create_task(self.flush_candles())
+        try:
+            with self.store.trades.watch() as stream:
+                async for change in stream:
+                    if change.operation != "insert":
+                        continue
+                    trade = normalize_trade(change.data)
+                    if trade is not None:
+                        self.candle_builder(trade[0]).apply(*trade[1:])
+        finally:
+            flush_task.cancel()
+
+    async def flush_candles(self):
+        """約定の無い時間帯も足を確定させる（取引所との時刻ずれを見込んで CANDLE_FLUSH_DELAY 秒遅らせる）"""
+        while True:
+            await asyncio.sleep(1)
+            now_ms = int((time.time() - self.CANDLE_FLUSH_DELAY) * 1000)
+            for builder in self.candle_builders.values():
+                builder.flush(now_ms)
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+価格差履歴の列指向ストア
+data/spread_store/{symbol}/{YYYY-MM-DD}/{開始}_{終了}_{書込時刻}/{列名}.npy の形で保存し、
+期間を指定した読み込みでは該当する日付・セグメントのファイルだけをメモリマップで開く
+
+CSVの取り込み:
+    python spread_store.py import data/price_data_*.csv
+
+取り込んだCSVは imported.json に更新時刻・サイズを記録し、sync_csv でその後に更新されたCSVだけを取り込み直す
+（PriceCsvWriter に store を渡すと、書き出した行をストアにも追記する）
+"""
+
+import glob
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+STORE_DIR = os.path.join("data", "spread_store")
+CSV_PATTERN = os.path.join("data", "price_data_*.csv")
+MANIFEST = "imported.json"  # 取り込み済みCSV -> [更新時刻(ns), サイズ]
+DEFAULT_SYMBOL = "BTC_JPY"  # symbol列が無い旧形式CSVの銘柄
+
+# 保存する列（datetime は naive な datetime64[ns] の int64 として保存）
+COLUMNS = ["timestamp", "datetime",
+           "gmo_bid", "gmo_ask", "gmo_spread",
+           "bitbank_bid", "bitbank_ask", "bitbank_spread",
+           "arbitrage_1", "arbitrage_2", "max_arbitrage"]
+
+
+class SpreadStore():
+    """価格差履歴ストア（銘柄・日付で分割したメモリマップNumPyセグメント）"""
+
+    def __init__(self, root=STORE_DIR, max_segments=32):
+        self.root = root
+        self.max_segments = max_segments  # append(merge=False) で日付内のセグメントがこれを超えたらまとめる
+
+    def exists(self):
+        return len(self.symbols()) > 0
+
+    def symbols(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root)
+                      if os.path.isdir(os.path.join(self.root, name)))
+
+    # ------------------------------------------------ #
+    # write
+    # ------------------------------------------------ #
+    def append(self, symbol, df, merge=True):
+        """
+        レコードを追加する
+        merge=True なら日付ごとに既存セグメントとまとめて1セグメントに書き直す（同じ datetime は後のレコードを採用）
+        merge=False なら新しいセグメントとして書き足し、日付内のセグメントが max_segments を超えたときだけまとめる
+        """
+        df = self.normalize(df)
+        days = df["datetime"].dt.strftime("%Y-%m-%d")
+        for day, day_df in df.groupby(days):
+            day_dir = os.path.join(self.root, symbol, day)
+            old_segments = self.day_segments(day_dir)
+            if not merge and len(old_segments) < self.max_segments:
+                self.write_segment(day_dir, day_df.sort_values("datetime", kind="stable"))
+                continue
+            if old_segments:
+                day_df = pd.concat([self.read_segments(old_segments), day_df], ignore_index=True)
+            day_df = (day_df.drop_duplicates(subset="datetime", keep="last")
+                      .sort_values("datetime", kind="stable")
+                      .reset_index(drop=True))
+            self.write_segment(day_dir, day_df)
+            for path in old_segments:
+                shutil.rmtree(path)
+
+    def append_records(self, rows):
+        """CSVと同じ形式の行（dict）を銘柄ごとに新しいセグメントとして追記する"""
+        df = pd.DataFrame(rows)
+        if "symbol" not in df.columns:
+            df["symbol"] = DEFAULT_SYMBOL
+        for symbol, symbol_df in df.groupby("symbol"):
+            self.append(symbol, symbol_df, merge=False)
+
+    def normalize(self, df):
+        df = df.copy()
+        df["datetime"] = pd.to_datetime(df["datetime"])
+        for column in COLUMNS:
+            if column not in df.columns:
+                df[column] = np.nan
+        return df[COLUMNS]
+
+    def write_segment(self, day_dir, df):
+        dt = df["datetime"].values.astype("datetime64[ns]").astype(np.int64)
+        # 末尾の書き込み時刻で、同じ期間を書き直しても既存セグメントと名前が重ならないようにする
+        name = f"{dt[0]}_{dt[-1]}_{time.time_ns()}"
+        tmp_dir = os.path.join(day_dir, f".tmp_{name}")
+        os.makedirs(tmp_dir, exist_ok=True)
+        for column in COLUMNS:
+            values = dt if column == "datetime" else df[column].values.astype(np.float64)
+            np.save(os.path.join(tmp_dir, f"{column}.npy"), values)
+        os.replace(tmp_dir, os.path.join(day_dir, name))
+
+    # ------------------------------------------------ #
+    # csv
+    # ------------------------------------------------ #
+    def load_manifest(self):
+        try:
+            with open(os.path.join(self.root, MANIFEST), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def mark_imported(self, *paths):
+        """CSVを現在の更新時刻・サイズで取り込み済みとして記録する"""
+        manifest = self.load_manifest()
+        for path in paths:
+            st = os.stat(path)
+            manifest[os.path.abspath(path)] = [st.st_mtime_ns, st.st_size]
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = os.path.join(self.root, f".{MANIFEST}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp_path, os.path.join(self.root, MANIFEST))
+
+    def stale_csv(self, paths=None):
+        """取り込み後に更新された（または未取り込みの）CSV"""
+        paths = glob.glob(CSV_PATTERN) if paths is None else paths
+        manifest = self.load_manifest()
+        stale = []
+        for path in sorted(paths):
+            st = os.stat(path)
+            if manifest.get(os.path.abspath(path)) != [st.st_mtime_ns, st.st_size]:
+                stale.append(path)
+        return stale
+
+    def sync_csv(self, paths=None):
+        """取り込み後に更新されたCSVを取り込み直す（取り込んだファイルを返す）"""
+        stale = self.stale_csv(paths)
+        if stale:
+            import_csv(stale, self)
+        return stale
+
+    # ------------------------------------------------ #
+    # read
+    # ------------------------------------------------ #
+    def day_segments(self, day_dir, start_ns=None, end_ns=None):
+        """日付ディレクトリ内で期間と重なるセグメントを開始時刻順に返す"""
+        if not os.path.isdir(day_dir):
+            return []
+        segments = []
+        for name in os.listdir(day_dir):
+            if name.startswith("."):
+                continue
+            seg_start, seg_end = (int(x) for x in name.split("_")[:2])
+            if start_ns is not None and seg_end < start_ns:
+                continue
+            if end_ns is not None and seg_start > end_ns:
+                continue
+            segments.append((seg_start, os.path.join(day_dir, name)))
+        return [path for _, path in sorted(segments)]
+
+    def segments(self, symbol, start=None, end=None):
+        """期間と重なるセグメントの一覧（日付ディレクトリ名で先に絞り込む）"""
+        symbol_dir = os.path.join(self.root, symbol)
+        if not os.path.isdir(symbol_dir):
+            return []
+        start = pd.Timestamp(start) if start is not None else None
+        end = pd.Timestamp(end) if end is not None else None
+        start_day = start.strftime("%Y-%m-%d") if start is not None else None
+        end_day = end.strftime("%Y-%m-%d") if end is not None else None
+        start_ns = start.value if start is not None else None
+        end_ns = end.value if end is not None else None
+
+        paths = []
+        for day in sorted(os.listdir(symbol_dir)):
+            if start_day is not None and day < start_day:
+                continue
+            if end_day is not None and day > end_day:
+                continue
+            paths.extend(self.day_segments(os.path.join(symbol_dir, day), start_ns, end_ns))
+        return paths
+
+    def read_segments(self, paths, start_ns=None, end_ns=None, columns=None):
+        columns = COLUMNS if columns is None else columns
+        parts = []
+        for path in paths:
+            dt = np.load(os.path.join(path, "datetime.npy"), mmap_mode="r")
+            lo = 0 if start_ns is None else int(np.searchsorted(dt, start_ns, side="left"))
+            hi = len(dt) if end_ns is None else int(np.searchsorted(dt, end_ns, side="right"))
+            if hi <= lo:
+                continue
+            part = {}
+            for column in columns:
+                values = dt if column == "datetime" else np.load(os.path.join(path, f"{column}.npy"), mmap_mode="r")
+                part[column] = np.array(values[lo:hi])
+            parts.append(part)
+        if not parts:
+            return pd.DataFrame({column: pd.Series(dtype="datetime64[ns]" if column == "datetime" else np.float64)
+                                 for column in columns})
+        df = pd.DataFrame({column: np.concatenate([part[column] for part in parts]) for column in columns})
+        if len(parts) > 1 and "datetime" in df.columns:
+            # merge=False で書き足したセグメントとCSVの取り込みが重なった場合は、時刻順に並べて重複を除く
+            dt = df["datetime"].values
+            if not (dt[1:] > dt[:-1]).all():
+                df = (df.sort_values("datetime", kind="stable")
+                      .drop_duplicates(subset="datetime", keep="last")
+                      .reset_index(drop=True))
+        if "datetime" in df.columns:
+            df["datetime"] = df["datetime"].values.astype("datetime64[ns]")
+        return df
+
+    def query(self, symbol, start=None, end=None, columns=None):
+        """銘柄と期間（両端を含む）を指定して読み込む"""
+        start_ns = pd.Timestamp(start).value if start is not None else None
+        end_ns = pd.Timestamp(end).value if end is not None else None
+        return self.read_segments(self.segments(symbol, start, end), start_ns, end_ns, columns)
+
+    def query_all(self, start=None, end=None, columns=None):
+        """全銘柄を symbol 列付きで読み込む"""
+        frames = []
+        for symbol in self.symbols():
+            df = self.query(symbol, start, end, columns)
+            if len(df) > 0:
+                df.insert(0, "symbol", symbol)
+                frames.append(df)
+        if not frames:
+            return pd.DataFrame(columns=["symbol"] + (COLUMNS if columns is None else columns))
+        return pd.concat(frames, ignore_index=True)
+
+
+def import_csv(paths, store=None):
+    """price_data_*.csv をストアに取り込む"""
+    store = SpreadStore() if store is None else store
+    for path in sorted(paths):
+        df = pd.read_csv(path)
+        if "symbol" not in df.columns:
+            df["symbol"] = DEFAULT_SYMBOL
+        for symbol, symbol_df in df.groupby("symbol"):
+            store.append(symbol, symbol_df)
+        store.mark_imported(path)
+        print(f"imported {path} ({len(df)} rows)")
+    return store
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "import":
+        files = sys.argv[2:] or glob.glob(CSV_PATTERN)
+        import_csv(files)
+    else:
+        print("usage: python spread_store.py import [csv files...]")
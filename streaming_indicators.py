@@ -0,0 +1,1240 @@
+#!/usr/bin/env python3
+"""
+テクニカル指標の逐次計算（足1本ごとに O(1) で更新する状態オブジェクト）
+TA-Lib の C 実装と同じ順序で演算するため、先頭の足から流せば TA-Lib（配列全体を先頭から計算）とほぼ同じ値になる
+（多くの指標はビット単位で一致し、分散・線形回帰・WMA は丸め誤差の範囲で異なる）
+
+- 各指標は update(...) で最新の値を返す（ルックバック期間中は NaN）
+- 移動平均系の初期値は TA-Lib と同じく最初の period 本の単純平均
+- StreamingFeatures は utils.calc_features と同じ特徴量の最新行を返す
+"""
+
+import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+NAN = float("nan")
+
+
+def is_zero(value):
+    return -0.00000001 < value < 0.00000001
+
+
+def is_zero_or_neg(value):
+    return value < 0.00000001
+
+
+def true_range(high, low, prev_close):
+    value = high - low
+    tmp = abs(high - prev_close)
+    if tmp > value:
+        value = tmp
+    tmp = abs(low - prev_close)
+    if tmp > value:
+        value = tmp
+    return value
+
+
+# ------------------------------------------------ #
+# 移動平均
+# ------------------------------------------------ #
+class SMA():
+    def __init__(self, period):
+        self.period = period
+        self.window = deque()
+        self.total = 0.0
+
+    def update(self, value):
+        self.total += value
+        self.window.append(value)
+        if len(self.window) < self.period:
+            return NAN
+        out = self.total / self.period
+        self.total -= self.window.popleft()
+        return out
+
+
+class EMA():
+    """初期値は最初の period 本の単純平均"""
+
+    def __init__(self, period, k=None):
+        self.period = period
+        self.k = 2.0 / (period + 1) if k is None else k
+        self.count = 0
+        self.value = 0.0
+
+    def update(self, value):
+        if self.count < self.period:
+            self.count += 1
+            self.value += value
+            if self.count < self.period:
+                return NAN
+            self.value = self.value / self.period
+            return self.value
+        self.value = ((value - self.value) * self.k) + self.value
+        return self.value
+
+
+class EMAChain():
+    """EMA を n 段重ねたもの（前段がルックバックを抜けてから次段に流す）"""
+
+    def __init__(self, period, depth):
+        self.emas = [EMA(period) for _ in range(depth)]
+
+    def update(self, value):
+        values = []
+        for ema in self.emas:
+            value = ema.update(value)
+            if value != value:
+                return None
+            values.append(value)
+        return values
+
+
+class DEMA():
+    def __init__(self, period):
+        self.chain = EMAChain(period, 2)
+
+    def update(self, value):
+        values = self.chain.update(value)
+        if values is None:
+            return NAN
+        return (2.0 * values[0]) - values[1]
+
+
+class TEMA():
+    def __init__(self, period):
+        self.chain = EMAChain(period, 3)
+
+    def update(self, value):
+        values = self.chain.update(value)
+        if values is None:
+            return NAN
+        return values[2] + ((3.0 * values[0]) - (3.0 * values[1]))
+
+
+class TRIX():
+    """3重 EMA の1本前との変化率（%）"""
+
+    def __init__(self, period):
+        self.chain = EMAChain(period, 3)
+        self.prev = None
+
+    def update(self, value):
+        values = self.chain.update(value)
+        if values is None:
+            return NAN
+        prev, self.prev = self.prev, values[2]
+        if prev is None:
+            return NAN
+        if prev != 0.0:
+            return ((values[2] / prev) - 1.0) * 100.0
+        return 0.0
+
+
+class WMA():
+    def __init__(self, period):
+        self.period = period
+        self.divider = (period * (period + 1)) >> 1
+        self.window = deque()
+        self.total = 0.0  # 加重和
+        self.sub = 0.0  # 単純和
+        self.trailing = 0.0
+
+    def update(self, value):
+        self.window.append(value)
+        if len(self.window) < self.period:
+            self.sub += value
+            self.total += value * len(self.window)
+            return NAN
+        self.sub += value
+        self.sub -= self.trailing
+        self.total += value * self.period
+        self.trailing = self.window.popleft()
+        out = self.total / self.divider
+        self.total -= self.sub
+        return out
+
+
+class KAMA():
+    def __init__(self, period):
+        self.period = period
+        self.const_max = 2.0 / (30.0 + 1.0)
+        self.const_diff = 2.0 / (2.0 + 1.0) - self.const_max
+        self.window = deque(maxlen=period + 2)
+        self.sum_roc = 0.0
+        self.trailing = 0.0
+        self.value = None
+
+    def update(self, value):
+        window = self.window
+        window.append(value)
+        n = len(window)
+        if self.value is None:
+            if n > 1:
+                self.sum_roc += abs(window[-2] - value)
+            if n <= self.period:
+                return NAN
+            # 最初の出力（period + 1 本目）
+            self.value = window[-2]
+            trailing = window[0]
+            period_roc = value - trailing
+        else:
+            trailing = window[-self.period - 1]
+            period_roc = value - trailing
+            self.sum_roc -= abs(self.trailing - trailing)
+            self.sum_roc += abs(value - window[-2])
+        self.trailing = trailing
+
+        if (self.sum_roc <= period_roc) or is_zero(self.sum_roc):
+            ratio = 1.0
+        else:
+            ratio = abs(period_roc / self.sum_roc)
+        ratio = (ratio * self.const_diff) + self.const_max
+        ratio *= ratio
+        self.value = ((value - self.value) * ratio) + self.value
+        return self.value
+
+
+class T3():
+    def __init__(self, period, vfactor=0.7):
+        self.period = period
+        self.k = 2.0 / (period + 1.0)
+        self.one_minus_k = 1.0 - self.k
+        tmp = vfactor * vfactor
+        self.c1 = -tmp * vfactor
+        self.c2 = 3.0 * (tmp - self.c1)
+        self.c3 = -6.0 * tmp - 3.0 * (vfactor - self.c1)
+        self.c4 = 1.0 + 3.0 * vfactor - self.c1 + 3.0 * tmp
+        self.e = []  # 初期化を終えた段の値
+        self.count = 0  # 初期化中の段に入れた本数
+        self.total = 0.0
+
+    def update(self, value):
+        k, omk = self.k, self.one_minus_k
+        e = self.e
+        for i in range(len(e)):
+            e[i] = (k * value) + (omk * e[i])
+            value = e[i]
+        if len(e) < 6:
+            # 次の段の初期値（前段の最初の period 本の単純平均）を集める
+            self.total += value
+            self.count += 1
+            if self.count == self.period:
+                e.append(self.total / self.period)
+                self.total = 0.0
+                self.count = 0
+                if len(e) < 6:
+                    self.total = e[-1]
+                    self.count = 1
+            if len(e) < 6:
+                return NAN
+            return self.c1 * e[5] + self.c2 * e[4] + self.c3 * e[3] + self.c4 * e[2]
+        return self.c1 * e[5] + self.c2 * e[4] + self.c3 * e[3] + self.c4 * e[2]
+
+
+class BBands():
+    def __init__(self, period, nbdev):
+        self.period = period
+        self.nbdev = nbdev
+        self.sma = SMA(period)
+        self.window = deque(maxlen=period)
+
+    def update(self, value):
+        middle = self.sma.update(value)
+        self.window.append(value)
+        if middle != middle:
+            return NAN, NAN, NAN
+        stddev = _deviation(self.window, middle, self.period)
+        stddev = math.sqrt(stddev) if not is_zero_or_neg(stddev) else 0.0
+        if self.nbdev == 1.0:
+            return middle + stddev, middle, middle - stddev
+        band = stddev * self.nbdev
+        return middle + band, middle, middle - band
+
+
+def _deviation(window, mean, period):
+    """窓内の平均からの偏差の2乗平均（二乗和から平均の2乗を引くと価格水準で桁落ちするため、毎回偏差から計算する）"""
+    total = 0.0
+    for value in window:
+        diff = value - mean
+        total += diff * diff
+    return total / period
+
+
+class Variance():
+    def __init__(self, period):
+        self.period = period
+        self.sma = SMA(period)
+        self.window = deque(maxlen=period)
+
+    def update(self, value):
+        mean = self.sma.update(value)
+        self.window.append(value)
+        if mean != mean:
+            return NAN
+        return _deviation(self.window, mean, self.period)
+
+
+class StdDev():
+    def __init__(self, period, nbdev=1.0):
+        self.variance = Variance(period)
+        self.nbdev = nbdev
+
+    def update(self, value):
+        var = self.variance.update(value)
+        if var != var:
+            return NAN
+        out = math.sqrt(var) if not is_zero_or_neg(var) else 0.0
+        return out if self.nbdev == 1.0 else out * self.nbdev
+
+
+# ------------------------------------------------ #
+# 期間内の最大・最小
+# ------------------------------------------------ #
+class RollingExtreme():
+    """直近 period 本の最大（最小）値とその位置（同値は新しい方）。単調キューで償却 O(1)"""
+
+    def __init__(self, period, highest=True):
+        self.period = period
+        self.highest = highest
+        self.queue = deque()  # (位置, 値)
+        self.index = -1
+
+    def update(self, value):
+        self.index += 1
+        queue = self.queue
+        if self.highest:
+            while queue and queue[-1][1] <= value:
+                queue.pop()
+        else:
+            while queue and queue[-1][1] >= value:
+                queue.pop()
+        queue.append((self.index, value))
+        if queue[0][0] <= self.index - self.period:
+            queue.popleft()
+        return queue[0]
+
+
+class MidPoint():
+    def __init__(self, period):
+        self.period = period
+        self.highest = RollingExtreme(period, True)
+        self.lowest = RollingExtreme(period, False)
+        self.count = 0
+
+    def update(self, value):
+        highest = self.highest.update(value)[1]
+        lowest = self.lowest.update(value)[1]
+        self.count += 1
+        if self.count < self.period:
+            return NAN
+        return (highest + lowest) / 2.0
+
+
+class StochasticFast():
+    """STOCHF（%D は単純移動平均）"""
+
+    def __init__(self, fastk_period, fastd_period):
+        self.fastk_period = fastk_period
+        self.highest = RollingExtreme(fastk_period, True)
+        self.lowest = RollingExtreme(fastk_period, False)
+        self.fastd = SMA(fastd_period)
+        self.count = 0
+
+    def fastk(self, high, low, close):
+        highest = self.highest.update(high)[1]
+        lowest = self.lowest.update(low)[1]
+        self.count += 1
+        if self.count < self.fastk_period:
+            return NAN
+        diff = highest - lowest
+        if diff != 0.0:
+            return ((close - lowest) / diff) * 100.0
+        return 0.0
+
+    def update(self, high, low, close):
+        fastk = self.fastk(high, low, close)
+        if fastk != fastk:
+            return NAN, NAN
+        fastd = self.fastd.update(fastk)
+        if fastd != fastd:
+            return NAN, NAN
+        return fastk, fastd
+
+
+class Stochastic():
+    """STOCH（%K・%D の平滑化は単純移動平均）"""
+
+    def __init__(self, fastk_period, slowk_period, slowd_period):
+        self.fast = StochasticFast(fastk_period, slowk_period)
+        self.slowd = SMA(slowd_period)
+
+    def update(self, high, low, close):
+        _, slowk = self.fast.update(high, low, close)
+        if slowk != slowk:
+            return NAN, NAN
+        slowd = self.slowd.update(slowk)
+        if slowd != slowd:
+            return NAN, NAN
+        return slowk, slowd
+
+
+class WILLR():
+    def __init__(self, period):
+        self.period = period
+        self.highest = RollingExtreme(period, True)
+        self.lowest = RollingExtreme(period, False)
+        self.count = 0
+
+    def update(self, high, low, close):
+        highest = self.highest.update(high)[1]
+        lowest = self.lowest.update(low)[1]
+        self.count += 1
+        if self.count < self.period:
+            return NAN
+        diff = highest - lowest
+        if diff != 0.0:
+            return ((highest - close) / diff) * -100.0
+        return 0.0
+
+
+class Aroon():
+    """(aroondown, aroonup, aroonosc)"""
+
+    def __init__(self, period):
+        self.period = period
+        self.highest = RollingExtreme(period + 1, True)
+        self.lowest = RollingExtreme(period + 1, False)
+        self.factor = 100.0 / period
+        self.today = -1
+
+    def update(self, high, low):
+        self.today += 1
+        highest_idx = self.highest.update(high)[0]
+        lowest_idx = self.lowest.update(low)[0]
+        if self.today < self.period:
+            return NAN, NAN, NAN
+        up = self.factor * (self.period - (self.today - highest_idx))
+        down = self.factor * (self.period - (self.today - lowest_idx))
+        return down, up, self.factor * (highest_idx - lowest_idx)
+
+
+# ------------------------------------------------ #
+# オシレーター
+# ------------------------------------------------ #
+class RSI():
+    """平均は期間で割らずに逆数を掛ける（TA-Lib と同じ丸めになる）"""
+
+    def __init__(self, period):
+        self.period = period
+        self.prev = None
+        self.count = 0
+        self.gain = 0.0
+        self.loss = 0.0
+
+    def update(self, value):
+        if self.prev is None:
+            self.prev = value
+            return NAN
+        diff = value - self.prev
+        self.prev = value
+        self.count += 1
+        if self.count <= self.period:
+            if diff < 0:
+                self.loss -= diff
+            else:
+                self.gain += diff
+            if self.count < self.period:
+                return NAN
+            self.loss *= 1.0 / self.period
+            self.gain *= 1.0 / self.period
+        else:
+            self.loss *= (self.period - 1)
+            self.gain *= (self.period - 1)
+            if diff < 0:
+                self.loss -= diff
+            else:
+                self.gain += diff
+            self.loss *= 1.0 / self.period
+            self.gain *= 1.0 / self.period
+        total = self.gain + self.loss
+        if not is_zero(total):
+            return 100.0 * (self.gain / total)
+        return 0.0
+
+
+class MACD():
+    """
+    (macd, signal, hist)
+    TA-Lib と同じく、短期 EMA も長期 EMA と同じ足で最初の値が出るよう (slow - fast) 本目から平均を取り始める
+    """
+
+    def __init__(self, fast_period, slow_period, signal_period):
+        if slow_period < fast_period:
+            fast_period, slow_period = slow_period, fast_period
+        self.skip = slow_period - fast_period
+        self.fast = EMA(fast_period)
+        self.slow = EMA(slow_period)
+        self.signal = EMA(signal_period)
+        self.count = 0
+
+    def update(self, value):
+        self.count += 1
+        slow = self.slow.update(value)
+        if self.count <= self.skip:
+            return NAN, NAN, NAN
+        fast = self.fast.update(value)
+        if slow != slow:
+            return NAN, NAN, NAN
+        macd = fast - slow
+        signal = self.signal.update(macd)
+        if signal != signal:
+            return NAN, NAN, NAN
+        return macd, signal, macd - signal
+
+
+class CCI():
+    def __init__(self, period):
+        self.period = period
+        self.buffer = [0.0] * period
+        self.idx = 0
+        self.count = 0
+
+    def update(self, high, low, close):
+        last = (high + low + close) / 3
+        self.buffer[self.idx] = last
+        self.idx = (self.idx + 1) % self.period
+        self.count += 1
+        if self.count < self.period:
+            return NAN
+        average = 0.0
+        for value in self.buffer:
+            average += value
+        average /= self.period
+        deviation = 0.0
+        for value in self.buffer:
+            deviation += abs(value - average)
+        diff = last - average
+        if (diff != 0.0) and (deviation != 0.0):
+            return diff / (0.015 * (deviation / self.period))
+        return 0.0
+
+
+class MFI():
+    def __init__(self, period):
+        self.period = period
+        self.flows = deque()  # (positive, negative)
+        self.positive = 0.0
+        self.negative = 0.0
+        self.prev = None
+
+    def update(self, high, low, close, volume):
+        typical = (high + low + close) / 3
+        if self.prev is None:
+            self.prev = typical
+            return NAN
+        if len(self.flows) == self.period:
+            positive, negative = self.flows.popleft()
+            self.positive -= positive
+            self.negative -= negative
+        diff = typical - self.prev
+        self.prev = typical
+        flow = typical * volume
+        if diff < 0:
+            self.flows.append((0.0, flow))
+            self.negative += flow
+        elif diff > 0:
+            self.flows.append((flow, 0.0))
+            self.positive += flow
+        else:
+            self.flows.append((0.0, 0.0))
+        if len(self.flows) < self.period:
+            return NAN
+        total = self.positive + self.negative
+        if total < 1.0:
+            return 0.0
+        return 100.0 * (self.positive / total)
+
+
+class DirectionalMovement():
+    """Wilder の DM/TR から (plus_di, minus_di, dx, adx, adxr) を同時に更新する"""
+
+    def __init__(self, period):
+        self.period = period
+        self.prev_high = None
+        self.count = 0
+        self.plus_dm = 0.0
+        self.minus_dm = 0.0
+        self.tr = 0.0
+        self.dx = None
+        self.sum_dx = 0.0
+        self.adx = NAN
+        self.adx_history = deque(maxlen=period)
+
+    def update(self, high, low, close):
+        if self.prev_high is None:
+            self.prev_high, self.prev_low, self.prev_close = high, low, close
+            return NAN, NAN, NAN, NAN, NAN
+        period = self.period
+        diff_p = high - self.prev_high
+        self.prev_high = high
+        diff_m = self.prev_low - low
+        self.prev_low = low
+        tr = true_range(high, low, self.prev_close)
+        self.prev_close = close
+        self.count += 1
+
+        if self.count < period:
+            if (diff_m > 0) and (diff_p < diff_m):
+                self.minus_dm += diff_m
+            elif (diff_p > 0) and (diff_p > diff_m):
+                self.plus_dm += diff_p
+            self.tr += tr
+            return NAN, NAN, NAN, NAN, NAN
+
+        self.minus_dm -= self.minus_dm / period
+        self.plus_dm -= self.plus_dm / period
+        if (diff_m > 0) and (diff_p < diff_m):
+            self.minus_dm += diff_m
+        elif (diff_p > 0) and (diff_p > diff_m):
+            self.plus_dm += diff_p
+        self.tr = self.tr - (self.tr / period) + tr
+
+        dx = None
+        if not is_zero(self.tr):
+            minus_di = 100.0 * (self.minus_dm / self.tr)
+            plus_di = 100.0 * (self.plus_dm / self.tr)
+            total = minus_di + plus_di
+            if not is_zero(total):
+                dx = 100.0 * (abs(minus_di - plus_di) / total)
+        else:
+            minus_di = plus_di = 0.0
+        if dx is not None:
+            self.dx = dx
+        elif self.dx is None:
+            self.dx = 0.0
+
+        # ADX は period 本の DX の平均から始める
+        if self.count < 2 * period:
+            if dx is not None:
+                self.sum_dx += dx
+            if self.count == 2 * period - 1:
+                self.adx = self.sum_dx / period
+        elif dx is not None:
+            self.adx = ((self.adx * (period - 1)) + dx) / period
+        adxr = NAN
+        if self.adx == self.adx:
+            # ADXR は現在と period - 1 本前の ADX の平均
+            self.adx_history.append(self.adx)
+            if len(self.adx_history) == period:
+                adxr = (self.adx + self.adx_history[0]) / 2.0
+        return plus_di, minus_di, self.dx, self.adx, adxr
+
+
+class ULTOSC():
+    def __init__(self, period1, period2, period3):
+        self.periods = sorted([period1, period2, period3])
+        self.lookback = self.periods[-1]
+        self.terms = deque(maxlen=self.lookback)  # (close - true_low, true_range)
+        self.a = [0.0, 0.0, 0.0]
+        self.b = [0.0, 0.0, 0.0]
+        self.prev_close = None
+        self.today = 0
+
+    def update(self, high, low, close):
+        if self.prev_close is None:
+            self.prev_close = close
+            return NAN
+        true_low = min(low, self.prev_close)
+        term_a = close - true_low
+        term_b = true_range(high, low, self.prev_close)
+        self.prev_close = close
+        self.today += 1
+        # 各期間の合計は TA-Lib と同じく、最初の出力に必要な足から積み始める
+        for i, period in enumerate(self.periods):
+            if self.today > self.lookback - period:
+                self.a[i] += term_a
+                self.b[i] += term_b
+        self.terms.append((term_a, term_b))
+        if self.today < self.lookback:
+            return NAN
+        output = 0.0
+        if not is_zero(self.b[0]):
+            output += 4.0 * (self.a[0] / self.b[0])
+        if not is_zero(self.b[1]):
+            output += 2.0 * (self.a[1] / self.b[1])
+        if not is_zero(self.b[2]):
+            output += self.a[2] / self.b[2]
+        for i, period in enumerate(self.periods):
+            trailing_a, trailing_b = self.terms[-period]
+            self.a[i] -= trailing_a
+            self.b[i] -= trailing_b
+        return 100.0 * (output / 7.0)
+
+
+class ADOSC():
+    """Chaikin A/D オシレーター（EMA の初期値は最初の A/D）"""
+
+    def __init__(self, fast_period, slow_period):
+        self.fast_k = 2.0 / (fast_period + 1)
+        self.slow_k = 2.0 / (slow_period + 1)
+        self.lookback = max(fast_period, slow_period) - 1
+        self.ad = 0.0
+        self.fast = None
+        self.slow = None
+        self.today = -1
+
+    def update(self, high, low, close, volume):
+        self.today += 1
+        tmp = high - low
+        if tmp > 0.0:
+            self.ad += (((close - low) - (high - close)) / tmp) * volume
+        if self.fast is None:
+            self.fast = self.slow = self.ad
+        else:
+            self.fast = (self.fast_k * self.ad) + ((1.0 - self.fast_k) * self.fast)
+            self.slow = (self.slow_k * self.ad) + ((1.0 - self.slow_k) * self.slow)
+        if self.today < self.lookback:
+            return NAN
+        return self.fast - self.slow
+
+
+class ATR():
+    def __init__(self, period):
+        self.period = period
+        self.prev_close = None
+        self.count = 0
+        self.total = 0.0
+        self.value = NAN
+
+    def update(self, high, low, close):
+        if self.prev_close is None:
+            self.prev_close = close
+            return NAN
+        tr = true_range(high, low, self.prev_close)
+        self.prev_close = close
+        self.count += 1
+        if self.count <= self.period:
+            self.total += tr
+            if self.count == self.period:
+                self.value = self.total / self.period
+            return self.value
+        self.value *= self.period - 1
+        self.value += tr
+        self.value /= self.period
+        return self.value
+
+
+class Beta():
+    """high と low の変化率の回帰係数"""
+
+    def __init__(self, period):
+        self.period = period
+        self.ratios = deque()
+        self.sxx = self.sx = self.sxy = self.sy = 0.0
+        self.last_x = None
+        self.last_y = None
+
+    def update(self, x, y):
+        if self.last_x is None:
+            self.last_x, self.last_y = x, y
+            return NAN
+        rx = (x - self.last_x) / self.last_x if not is_zero(self.last_x) else 0.0
+        ry = (y - self.last_y) / self.last_y if not is_zero(self.last_y) else 0.0
+        self.last_x, self.last_y = x, y
+        self.sxx += rx * rx
+        self.sx += rx
+        self.sxy += rx * ry
+        self.sy += ry
+        self.ratios.append((rx, ry))
+        if len(self.ratios) < self.period:
+            return NAN
+        n = float(self.period)
+        tmp = (n * self.sxx) - (self.sx * self.sx)
+        out = ((n * self.sxy) - (self.sx * self.sy)) / tmp if not is_zero(tmp) else 0.0
+        rx, ry = self.ratios.popleft()
+        self.sxx -= rx * rx
+        self.sx -= rx
+        self.sxy -= rx * ry
+        self.sy -= ry
+        return out
+
+
+class LinearReg():
+    """(linearreg, angle, intercept)。period 本の回帰を毎回計算する（period は定数なので O(1)）"""
+
+    def __init__(self, period):
+        self.period = period
+        self.window = deque(maxlen=period)
+        self.sum_x = period * (period - 1) * 0.5
+        sum_x_sqr = period * (period - 1) * (2 * period - 1) / 6
+        self.divisor = self.sum_x * self.sum_x - period * sum_x_sqr
+
+    def update(self, value):
+        self.window.append(value)
+        if len(self.window) < self.period:
+            return NAN, NAN, NAN
+        sum_xy = 0.0
+        sum_y = 0.0
+        i = self.period
+        for value in self.window:
+            i -= 1
+            sum_y += value
+            sum_xy += i * value
+        m = (self.period * sum_xy - self.sum_x * sum_y) / self.divisor
+        b = (sum_y - m * self.sum_x) / self.period
+        return b + m * (self.period - 1), math.atan(m) * (180.0 / math.pi), b
+
+
+class HilbertTransform():
+    """HT_TRENDLINE・HT_SINE・HT_TRENDMODE を同じ状態から計算する ((trendline, sine, leadsine, trendmode)、trendmode は TA-Lib と同じくルックバック中も 0)"""
+
+    A = 0.0962
+    B = 0.5769
+    SMOOTH_PRICE_SIZE = 50
+    LOOKBACK = 63
+
+    def __init__(self):
+        tmp = math.atan(1)
+        self.rad2deg = 45.0 / tmp
+        self.deg2rad = 1.0 / self.rad2deg
+        self.const_deg2rad_by360 = tmp * 8.0
+        self.prices = deque(maxlen=self.SMOOTH_PRICE_SIZE + 4)
+        self.today = -1
+        self.wma_sub = 0.0
+        self.wma_sum = 0.0
+        self.trailing_wma = 0.0
+        self.hilbert_idx = 0
+        # detrender, Q1, jI, jQ の各状態: [値, odd[3], even[3], prev_odd, prev_even, prev_input_odd, prev_input_even]
+        self.state = {name: [0.0, [0.0] * 3, [0.0] * 3, 0.0, 0.0, 0.0, 0.0] for name in ("detrender", "Q1", "jI", "jQ")}
+        self.period = 0.0
+        self.prev_i2 = self.prev_q2 = 0.0
+        self.re = self.im = 0.0
+        self.i1_odd_prev3 = self.i1_even_prev3 = 0.0
+        self.i1_odd_prev2 = self.i1_even_prev2 = 0.0
+        self.smooth_period = 0.0
+        self.smooth_price = [0.0] * self.SMOOTH_PRICE_SIZE
+        self.smooth_idx = 0
+        self.i_trend1 = self.i_trend2 = self.i_trend3 = 0.0
+        self.days_in_trend = 0
+        self.dc_phase = self.prev_dc_phase = 0.0
+        self.sine = self.lead_sine = 0.0
+
+    def _price_wma(self, price):
+        self.wma_sub += price
+        self.wma_sub -= self.trailing_wma
+        self.wma_sum += price * 4.0
+        self.trailing_wma = self.prices[-4]
+        smoothed = self.wma_sum * 0.1
+        self.wma_sum -= self.wma_sub
+        return smoothed
+
+    def _hilbert(self, name, value, odd, adjusted_prev_period):
+        s = self.state[name]
+        buffer = s[1] if odd else s[2]
+        tmp = self.A * value
+        out = -buffer[self.hilbert_idx]
+        buffer[self.hilbert_idx] = tmp
+        out += tmp
+        p = 3 if odd else 4
+        out -= s[p]
+        s[p] = self.B * s[p + 2]
+        out += s[p]
+        s[p + 2] = value
+        out *= adjusted_prev_period
+        s[0] = out
+        return out
+
+    def update(self, price):
+        self.today += 1
+        self.prices.append(price)
+        today = self.today
+        if today < 3:
+            # 価格の加重移動平均（重み 1, 2, 3）の初期化
+            self.wma_sub += price
+            self.wma_sum += price * (today + 1)
+            return NAN, NAN, NAN, 0
+        if today < 37:
+            self._price_wma(price)
+            return NAN, NAN, NAN, 0
+
+        adjusted_prev_period = (0.075 * self.period) + 0.54
+        smoothed = self._price_wma(price)
+        self.smooth_price[self.smooth_idx] = smoothed
+        if today % 2 == 0:
+            detrender = self._hilbert("detrender", smoothed, False, adjusted_prev_period)
+            q1 = self._hilbert("Q1", detrender, False, adjusted_prev_period)
+            ji = self._hilbert("jI", self.i1_even_prev3, False, adjusted_prev_period)
+            jq = self._hilbert("jQ", q1, False, adjusted_prev_period)
+            self.hilbert_idx += 1
+            if self.hilbert_idx == 3:
+                self.hilbert_idx = 0
+            q2 = (0.2 * (q1 + ji)) + (0.8 * self.prev_q2)
+            i2 = (0.2 * (self.i1_even_prev3 - jq)) + (0.8 * self.prev_i2)
+            self.i1_odd_prev3 = self.i1_odd_prev2
+            self.i1_odd_prev2 = detrender
+        else:
+            detrender = self._hilbert("detrender", smoothed, True, adjusted_prev_period)
+            q1 = self._hilbert("Q1", detrender, True, adjusted_prev_period)
+            ji = self._hilbert("jI", self.i1_odd_prev3, True, adjusted_prev_period)
+            jq = self._hilbert("jQ", q1, True, adjusted_prev_period)
+            q2 = (0.2 * (q1 + ji)) + (0.8 * self.prev_q2)
+            i2 = (0.2 * (self.i1_odd_prev3 - jq)) + (0.8 * self.prev_i2)
+            self.i1_even_prev3 = self.i1_even_prev2
+            self.i1_even_prev2 = detrender
+
+        self.re = (0.2 * ((i2 * self.prev_i2) + (q2 * self.prev_q2))) + (0.8 * self.re)
+        self.im = (0.2 * ((i2 * self.prev_q2) - (q2 * self.prev_i2))) + (0.8 * self.im)
+        self.prev_q2 = q2
+        self.prev_i2 = i2
+        prev_period = self.period
+        if (self.im != 0.0) and (self.re != 0.0):
+            self.period = 360.0 / (math.atan(self.im / self.re) * self.rad2deg)
+        tmp = 1.5 * prev_period
+        if self.period > tmp:
+            self.period = tmp
+        tmp = 0.67 * prev_period
+        if self.period < tmp:
+            self.period = tmp
+        if self.period < 6:
+            self.period = 6
+        elif self.period > 50:
+            self.period = 50
+        self.period = (0.2 * self.period) + (0.8 * prev_period)
+        self.smooth_period = (0.33 * self.period) + (0.67 * self.smooth_period)
+        smooth_period = self.smooth_period
+
+        # 支配的サイクルの位相
+        dc_period_int = int(smooth_period + 0.5)
+        real_part = 0.0
+        imag_part = 0.0
+        idx = self.smooth_idx
+        for i in range(dc_period_int):
+            tmp = (i * self.const_deg2rad_by360) / dc_period_int
+            tmp2 = self.smooth_price[idx]
+            real_part += math.sin(tmp) * tmp2
+            imag_part += math.cos(tmp) * tmp2
+            idx = self.SMOOTH_PRICE_SIZE - 1 if idx == 0 else idx - 1
+        if abs(imag_part) > 0.0:
+            self.dc_phase = math.atan(real_part / imag_part) * self.rad2deg
+        elif abs(imag_part) <= 0.01:
+            if real_part < 0.0:
+                self.dc_phase -= 90.0
+            elif real_part > 0.0:
+                self.dc_phase += 90.0
+        self.dc_phase += 90.0
+        # 加重移動平均の1本分の遅れを補正
+        self.dc_phase += 360.0 / smooth_period
+        if imag_part < 0.0:
+            self.dc_phase += 180.0
+        if self.dc_phase > 315.0:
+            self.dc_phase -= 360.0
+        dc_phase = self.dc_phase
+        prev_sine, prev_lead_sine = self.sine, self.lead_sine
+        self.sine = math.sin(dc_phase * self.deg2rad)
+        self.lead_sine = math.sin((dc_phase + 45) * self.deg2rad)
+
+        # トレンドライン（直近 DCPeriod 本の価格の平均を平滑化）
+        total = 0.0
+        for i in range(dc_period_int):
+            total += self.prices[-1 - i]
+        if dc_period_int > 0:
+            total = total / dc_period_int
+        trendline = (4.0 * total + 3.0 * self.i_trend1 + 2.0 * self.i_trend2 + self.i_trend3) / 10.0
+        self.i_trend3 = self.i_trend2
+        self.i_trend2 = self.i_trend1
+        self.i_trend1 = total
+
+        # トレンドモード（上昇を仮定し、サイクル的な動きなら 0）
+        trend = 1
+        if ((self.sine > self.lead_sine) and (prev_sine <= prev_lead_sine)) or \
+                ((self.sine < self.lead_sine) and (prev_sine >= prev_lead_sine)):
+            self.days_in_trend = 0
+            trend = 0
+        self.days_in_trend += 1
+        if self.days_in_trend < (0.5 * smooth_period):
+            trend = 0
+        tmp = dc_phase - self.prev_dc_phase
+        if (smooth_period != 0.0) and ((tmp > (0.67 * 360.0 / smooth_period)) and (tmp < (1.5 * 360.0 / smooth_period))):
+            trend = 0
+        tmp = self.smooth_price[self.smooth_idx]
+        if (trendline != 0.0) and (abs((tmp - trendline) / trendline) >= 0.015):
+            trend = 1
+        self.prev_dc_phase = dc_phase
+        self.smooth_idx += 1
+        if self.smooth_idx > self.SMOOTH_PRICE_SIZE - 1:
+            self.smooth_idx = 0
+
+        if today < self.LOOKBACK:
+            return NAN, NAN, NAN, 0
+        return trendline, self.sine, self.lead_sine, trend
+
+
+class EWMStd():
+    """pandas の ewm(span).std()（adjust=True, bias=False）と同じ逐次計算"""
+
+    def __init__(self, span):
+        self.alpha = 1.0 / (1.0 + (span - 1) / 2.0)
+        self.old_wt_factor = 1.0 - self.alpha
+        self.mean = NAN
+        self.cov = 0.0
+        self.sum_wt = 1.0
+        self.sum_wt2 = 1.0
+        self.old_wt = 1.0
+
+    def update(self, value):
+        if self.mean != self.mean:
+            self.mean = value
+            return self._output()
+        # ignore_na=False なので欠損でも重みは減衰させる
+        self.sum_wt *= self.old_wt_factor
+        self.sum_wt2 *= (self.old_wt_factor * self.old_wt_factor)
+        self.old_wt *= self.old_wt_factor
+        if value != value:
+            return self._output()
+        old_mean = self.mean
+        if self.mean != value:
+            self.mean = ((self.old_wt * old_mean) + value) / (self.old_wt + 1.0)
+        self.cov = ((self.old_wt * (self.cov + ((old_mean - self.mean) * (old_mean - self.mean))))
+                    + ((value - self.mean) * (value - self.mean))) / (self.old_wt + 1.0)
+        self.sum_wt += 1.0
+        self.sum_wt2 += 1.0
+        self.old_wt += 1.0
+        return self._output()
+
+    def _output(self):
+        if self.mean != self.mean:
+            return NAN
+        numerator = self.sum_wt * self.sum_wt
+        denominator = numerator - self.sum_wt2
+        if denominator > 0:
+            var = (numerator / denominator) * self.cov
+            return math.sqrt(var) if var > 0 else 0.0
+        return NAN
+
+
+# ------------------------------------------------ #
+# calc_features の逐次版
+# ------------------------------------------------ #
+def _div(a, b):
+    """NumPy と同じく0除算を inf / NaN にする割り算"""
+    if b == 0:
+        if a == 0 or a != a:
+            return NAN
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+    return a / b
+
+
+def _replace_change(value):
+    """pct_change_window と同じ置き換え（NaN → 0, ±inf → ±1, ±1兆超 → ±1）"""
+    if value != value:
+        return 0.0
+    if value > 1e12:
+        return 1.0
+    if value < -1e12:
+        return -1.0
+    return value
+
+
+class StreamingFeatures():
+    """
+    utils.calc_features と同じ特徴量を足1本ごとに更新する
+    update(bar) は、それまでに渡したすべての足を calc_features に通したときの最終行（calc_features(df).iloc[-1]）を返す
+    指標は先頭の足からの状態で決まるため、途中から使う場合は warm(df) で過去の足を流しておく
+    """
+
+    MA_FEATURES = ["DEMA", "EMA16", "EMA30", "EMA50", "EMA100", "HT_TRENDLINE", "KAMA", "MA17", "MA30", "MA50", "MA100",
+                   "MIDPOINT", "SMA5", "SMA17", "SMA25", "SMA50", "T3", "TEMA", "WMA5", "WMA17", "WMA25", "WMA50",
+                   "WMA100"]
+
+    def __init__(self, window_size=12):
+        self.window_size = window_size
+        self.lags = np.arange(1, window_size + 1)
+        self.lags_24 = np.arange(24, window_size * 24 + 1, 24)
+        self.depth = int(max(self.lags.max(), self.lags_24.max())) + 1
+
+        self.bbands = BBands(7, 2)
+        self.averages = {
+            "DEMA": DEMA(30), "EMA16": EMA(16), "EMA30": EMA(30), "EMA50": EMA(50), "EMA100": EMA(100),
+            "KAMA": KAMA(30), "MA17": SMA(17), "MA30": SMA(30), "MA50": SMA(50), "MA100": SMA(100),
+            "MIDPOINT": MidPoint(14), "SMA5": SMA(5), "SMA17": SMA(17), "SMA25": SMA(25), "SMA50": SMA(50),
+            "T3": T3(5, 0), "TEMA": TEMA(30), "WMA5": WMA(5), "WMA17": WMA(17), "WMA25": WMA(25), "WMA50": WMA(50),
+            "WMA100": WMA(100),
+        }
+        self.hilbert = HilbertTransform()
+        self.dm = DirectionalMovement(14)
+        self.aroon = Aroon(14)
+        self.cci = CCI(14)
+        self.macd = MACD(12, 26, 9)
+        self.mfi = MFI(14)
+        self.mom = deque(maxlen=11)
+        self.rsi = RSI(14)
+        self.stoch = Stochastic(5, 3, 3)
+        self.stochf = StochasticFast(5, 3)
+        self.stochrsi = StochasticFast(5, 3)
+        self.trix = TRIX(30)
+        self.ultosc = ULTOSC(7, 14, 28)
+        self.willr = WILLR(14)
+        self.adosc = ADOSC(3, 10)
+        self.adosc_prev = NAN
+        self.atrs = [ATR(14), ATR(7), ATR(48)]
+        self.prev_close = None
+        self.betas = [Beta(5), Beta(10), Beta(15), Beta(20)]
+        self.linearreg = LinearReg(14)
+        self.stddev = StdDev(5, 1)
+        self.return_ewms = EWMStd(100)
+
+        self.closes = deque(maxlen=window_size + 1)
+        self.returns = deque(maxlen=window_size + 1)
+        self.index = None  # 出力する列名
+        self.order = None  # 派生列を名前順に並べる位置
+        self.raw = None  # 派生列の履歴（リング）
+        self.filled = None  # 同じ履歴を前方補完したもの（pct_change 用）
+        self.pos = -1
+
+    # ------------------------------------------------ #
+    # 更新
+    # ------------------------------------------------ #
+    def update(self, bar):
+        """足（列名 -> 値、Open/High/Low/Close/Volume を含む）を1本反映し、特徴量の最新行を返す"""
+        return pd.Series(self._update(bar), index=self.index)
+
+    def warm(self, df):
+        """過去の足をまとめて流し、最後の足の特徴量を返す"""
+        values = None
+        for bar in df.to_dict("records"):
+            values = self._update(bar)
+        return None if values is None else pd.Series(values, index=self.index)
+
+    def _update(self, bar):
+        o, h, l, c, v = (float(bar["Open"]), float(bar["High"]), float(bar["Low"]), float(bar["Close"]),
+                         float(bar["Volume"]))
+        base = [float(value) for value in bar.values()]
+
+        # return と、その遅れ・終値の変化率
+        ret = _div(c, self.prev_close) - 1 if self.prev_close is not None else NAN
+        self.returns.appendleft(ret)
+        self.closes.appendleft(c)
+        base.append(ret)
+        for lag in range(1, self.window_size + 1):
+            base.append(self.returns[lag] if lag < len(self.returns) else NAN)
+        for lag in range(1, self.window_size + 1):
+            change = _div(c, self.closes[lag]) - 1 if lag < len(self.closes) else NAN
+            base.append(_replace_change(change))
+
+        derived = self._derived(o, h, l, c, v, ret)
+        if self.index is None:
+            self._setup(list(bar.keys()), list(derived.keys()))
+        derived = np.array(list(derived.values()), dtype=float)
+        row = np.concatenate([base, derived, self._expand(derived[self.order])])
+        return np.round(row, 5)
+
+    def _derived(self, o, h, l, c, v, ret):
+        """calc_features の派生列（ラグ展開前）を同じ順で返す"""
+        f = {}
+        hilo = (h + l) / 2
+        for name, value in zip(("BBANDS_upperband", "BBANDS_middleband", "BBANDS_lowerband"), self.bbands.update(c)):
+            f[name] = _div(value - hilo, value)
+        trendline, sine, lead_sine, trend_mode = self.hilbert.update(c)
+        for name in self.MA_FEATURES:
+            value = trendline if name == "HT_TRENDLINE" else self.averages[name].update(c)
+            f[name] = _div(value - hilo, value)
+
+        plus_di, minus_di, dx, adx, adxr = self.dm.update(h, l, c)
+        f["ADX"] = adx / 100
+        f["ADXR"] = adxr / 100
+        aroon_down, aroon_up, aroon_osc = self.aroon.update(h, l)
+        f["AROON_aroondown"] = aroon_down / 100
+        f["AROON_aroonup"] = aroon_up / 100
+        f["AROONOSC"] = aroon_osc / 100
+        f["BOP"] = (c - o) / (h - l) if not is_zero_or_neg(h - l) else 0.0
+        f["CCI"] = self.cci.update(h, l, c) / 100
+        f["DX"] = dx / 100
+        f["MACD_macdhist"] = self.macd.update(c)[2] / 1000
+        f["MFI"] = self.mfi.update(h, l, c, v) / 100
+        f["MINUS_DI"] = minus_di / 100
+        self.mom.append(c)
+        f["MOM"] = c - self.mom[0] if len(self.mom) == self.mom.maxlen else NAN
+        f["PLUS_DI"] = plus_di / 100
+        rsi = self.rsi.update(c)
+        f["RSI"] = rsi / 100
+        slowk, slowd = self.stoch.update(h, l, c)
+        f["STOCH_slowk"] = slowk / 100
+        f["STOCH_slowd"] = slowd / 100
+        fastk, fastd = self.stochf.update(h, l, c)
+        f["STOCHF_fastk"] = fastk / 100
+        f["STOCHF_fastd"] = fastd / 100
+        fastk, fastd = self.stochrsi.update(rsi, rsi, rsi) if rsi == rsi else (NAN, NAN)
+        f["STOCHRSI_fastk"] = fastk / 100
+        f["STOCHRSI_fastd"] = fastd / 100
+        f["TRIX"] = self.trix.update(c)
+        f["ULTOSC"] = self.ultosc.update(h, l, c) / 100
+        f["WILLR"] = self.willr.update(h, l, c) / 100
+
+        adosc = self.adosc.update(h, l, c, v)
+        change = _replace_change(_div(adosc, self.adosc_prev) - 1)
+        f["ADOSC_c"] = min(max(change, -10.0), 10.0)
+        if adosc == adosc:
+            self.adosc_prev = adosc
+
+        f["ATR"], f["ATR_R7"], f["ATR_R48"] = (atr.update(h, l, c) for atr in self.atrs)
+        tr = true_range(h, l, self.prev_close) if self.prev_close is not None else NAN
+        f["TRANGE"] = _div(tr, (h + l + c) / 3)
+        self.prev_close = c
+
+        f["HT_SINE_sine"] = sine
+        f["HT_SINE_leadsine"] = lead_sine
+        f["HT_TRENDMODE"] = trend_mode
+        f["BETA5"], f["BETA10"], f["BETA15"], f["BETA20"] = (beta.update(h, l) for beta in self.betas)
+        linearreg, angle, intercept = self.linearreg.update(c)
+        f["LINEARREG"] = linearreg - _div(c, linearreg)
+        f["LINEARREG_ANGLE"] = angle / 90
+        f["LINEARREG_INTERCEPT"] = intercept - _div(c, intercept)
+        f["STDDEV"] = self.stddev.update(c)
+        f["RETURN_EWMS"] = self.return_ewms.update(ret)
+        return f
+
+    # ------------------------------------------------ #
+    # ラグ・変化率の展開
+    # ------------------------------------------------ #
+    def _setup(self, bar_columns, derived_columns):
+        window = self.window_size
+        columns = list(bar_columns) + ["return"]
+        columns += [f"return_{lag}" for lag in range(1, window + 1)]
+        columns += [f"Close_change_{lag}" for lag in range(1, window + 1)]
+        columns += derived_columns
+        names = sorted(derived_columns)
+        for name in names:
+            columns += [f"{name}_{lag}" for lag in self.lags]
+            columns += [f"{name}_{lag}" for lag in self.lags_24]
+            columns += [f"{name}_change_{lag}" for lag in self.lags]
+            columns += [f"{name}_change_{lag}" for lag in self.lags_24]
+        self.index = pd.Index(columns)
+        self.order = np.array([derived_columns.index(name) for name in names])
+        self.raw = np.full((self.depth, len(names)), np.nan)
+        self.filled = np.full((self.depth, len(names)), np.nan)
+        self.shift_lags = np.concatenate([self.lags, self.lags_24])
+
+    def _expand(self, values):
+        """派生列ごとに shift_window・shift_window_24・pct_change_window・pct_change_window_24 と同じ列を作る"""
+        prev = self.pos
+        self.pos = (self.pos + 1) % self.depth
+        self.raw[self.pos] = values
+        filled = np.where(np.isnan(values), self.filled[prev], values) if prev >= 0 else values
+        self.filled[self.pos] = filled
+
+        rows = (self.pos - self.shift_lags) % self.depth
+        shifted = self.raw[rows]
+        short = len(self.lags)
+        # 24本刻みのラグは NaN → 0, ±inf → ±1
+        shifted[short:] = np.nan_to_num(shifted[short:], nan=0.0, posinf=1.0, neginf=-1.0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            change = filled / self.filled[rows] - 1
+        change = np.nan_to_num(change, nan=0.0, posinf=1.0, neginf=-1.0)
+        change[change > 1e12] = 1.0
+        change[change < -1e12] = -1.0
+        block = np.concatenate([shifted, change])
+        return block.T.ravel()
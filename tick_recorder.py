@@ -0,0 +1,116 @@
+import asyncio
+import datetime
+import json
+import logging
+import os
+
+
+class TickRecorder():
+    """
+    ティックデータの追記型レコーダー
+    レコードをメモリにためて、一定間隔でまとめて JSON Lines ファイルに追記する
+    書き込みはイベントループの外（スレッド）で行い、ファイルは UTC の日付ごとに分ける
+    書き込みに失敗した行はバッファに戻し、ログに出して次のフラッシュで再試行する
+    """
+
+    def __init__(self, directory="./data", flush_interval=1.0, max_buffer=1000, logger=None):
+        self.directory = directory
+        self.flush_interval = flush_interval  # フラッシュ間隔（秒）
+        self.max_buffer = max_buffer          # この件数たまったら間隔を待たずにフラッシュ
+        self.buffer = []
+        self.task = None
+        self.flush_task = None
+        self.lock = asyncio.Lock()  # 書き込みを直列化する
+        self.logger = logger or logging.getLogger(__name__)
+        self.failed = False    # 直前のフラッシュが失敗した（再試行は定期フラッシュに任せる）
+        self.partial = set()   # 書き込みが途中で失敗した日付（次は改行から書く）
+
+    def path_for(self, day):
+        return os.path.join(self.directory, f"{day}.jsonl")
+
+    def record(self, record):
+        """レコードを1件追加する（timestamp の日付のファイルに書かれる）"""
+        day = datetime.datetime.fromtimestamp(record["timestamp"], datetime.timezone.utc).strftime("%Y-%m-%d")
+        self.buffer.append((day, json.dumps(record, ensure_ascii=False)))
+        if (len(self.buffer) >= self.max_buffer and not self.failed
+                and (self.flush_task is None or self.flush_task.done())):
+            self.flush_task = asyncio.create_task(self.try_flush())
+
+    def write(self, pending):
+        """pending（日付 -> 行のリスト）を書き出す。書けた日付は pending から除く"""
+        os.makedirs(self.directory, exist_ok=True)
+        for day in list(pending):
+            # 途中で失敗した書き込みの続きに行が連結されないよう、改行してから書く（空行は read_ticks で読み飛ばす）
+            head = "\n" if day in self.partial else ""
+            self.partial.add(day)
+            with open(self.path_for(day), "a") as f:
+                f.write(head + "\n".join(pending[day]) + "\n")
+            self.partial.discard(day)
+            del pending[day]
+
+    async def flush(self):
+        async with self.lock:
+            if not self.buffer:
+                return
+            lines, self.buffer = self.buffer, []
+            pending = {}
+            for day, line in lines:
+                pending.setdefault(day, []).append(line)
+            try:
+                await asyncio.to_thread(self.write, pending)
+            except Exception:
+                # 書けなかった行を先頭に戻し、次のフラッシュで再試行する
+                self.buffer[:0] = [(day, line) for day, day_lines in pending.items() for line in day_lines]
+                raise
+
+    async def try_flush(self):
+        """フラッシュし、失敗したらログに出す（行はバッファに残る）"""
+        try:
+            await self.flush()
+            self.failed = False
+        except Exception as e:
+            self.failed = True
+            self.logger.exception(e)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.try_flush()
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """定期フラッシュを止め、残りを書き出す"""
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        if self.flush_task is not None:
+            await asyncio.gather(self.flush_task, return_exceptions=True)
+        await self.flush()
+
+
+def read_ticks(day, directory="./data"):
+    """
+    1日分のレコードを {timestamp(文字列): レコード} の形で読み込む
+    （従来の {day}.json と同じ形。同じ timestamp は後のレコードで上書き）
+    """
+    records = {}
+    legacy_path = os.path.join(directory, f"{day}.json")
+    if os.path.exists(legacy_path):
+        with open(legacy_path, "r") as f:
+            records.update(json.load(f))
+    path = os.path.join(directory, f"{day}.jsonl")
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 書き込み途中で止まった最終行は読み飛ばす
+                    continue
+                records[str(record["timestamp"])] = record
+    return records
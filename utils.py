@@ -7,27 +7,29 @@ import lightgbm as lgb
 import numpy as np
 #pd.set_option('display.max_rows', None)
 
+# resample の列ごとの集計方法（bar_aggregator も同じルールを使う）
+RESAMPLE_TEMPLATE = {
+    "Open": "first",
+    "High": "max",
+    "Low": "min",
+    "Close": "last",
+    "Volume": "sum",
+    "buy_vol": "sum",
+    "buy_num": "sum",
+    "sell_vol": "sum",
+    "sell_num": "sum",
+    "timestamp": "last"
+}
+
 def resample(df, sec, window=None):
     if window is not None:
         df = df[-window * sec * 2:]
 
-    template = {
-        "Open": "first",
-        "High": "max",
-        "Low": "min",
-        "Close": "last",
-        "Volume": "sum",
-        "buy_vol": "sum",
-        "buy_num": "sum",
-        "sell_vol": "sum",
-        "sell_num": "sum",
-        "timestamp": "last"
-    }
     resample_dict = {}
 
     for column in df.columns:
-        if column in template:
-            resample_dict[column] = template[column]
+        if column in RESAMPLE_TEMPLATE:
+            resample_dict[column] = RESAMPLE_TEMPLATE[column]
 
     df = df.resample('{}S'.format(sec)).agg(resample_dict)
 
@@ -83,19 +85,20 @@ def makeCandles(df, sec):
     date_part = df_ohlcv.index[0].date()
     # 欠損している期間を検出
     missing_periods = pd.date_range(start=f'{date_part} 00:00:00+00:00', end=f'{date_part} 23:59:59+00:00', freq='S').difference(df_ohlcv.index)
-    # 欠損している期間にデフォルト値を適用
-    default_data = {'buy_vol': 0.0, 'buy_num': 0.0, 'sell_vol': 0.0, 'sell_num': 0.0}
-    for timestamp in missing_periods:
-        df_ohlcv.loc[timestamp] = default_data
+    # 欠損している期間を1回の reindex で追加し、デフォルト値を適用
+    if len(missing_periods) > 0:
+        grid = df_ohlcv.index.append(missing_periods).sort_values()
+        grid = pd.DatetimeIndex(grid, name=df_ohlcv.index.name, freq=None)
+        df_ohlcv = df_ohlcv.reindex(grid)
+        is_missing = grid.isin(missing_periods)
+        default_data = {'buy_vol': 0.0, 'buy_num': 0.0, 'sell_vol': 0.0, 'sell_num': 0.0}
+        for column, value in default_data.items():
+            df_ohlcv[column] = df_ohlcv[column].astype(float).where(~is_missing, value)
 
-    df_ohlcv.sort_index(inplace=True)
     df_ohlcv["timestamp"] = df_ohlcv.index.view('int64') // 10**9
 
-    while True:
-        nan_count = df_ohlcv.isna().sum().sum()
-        df_ohlcv.ffill(inplace=True)
-        if nan_count == df_ohlcv.isna().sum().sum():
-            break
+    # ffill は連続する欠損をまとめて埋めるので1回でよい
+    df_ohlcv.ffill(inplace=True)
 
     # fill後の対応
     condition = (df_ohlcv.index.second == 0)
@@ -117,193 +120,339 @@ def replace_large_values(value):
     else:
         return value  # それ以外の場合は値をそのまま返す
 
+def window_block(values, lags, change=False, replace=False, out=None):
+    """
+    values（行 x 列の2次元配列）を lags ごとにずらした値を (行, 列, ラグ) の配列で返す
+    change=True なら pandas の pct_change(lag) と同じ変化率（前方補完した値どうしで割る）にして、
+    pct_change_window と同じく NaN → 0, ±inf → ±1, ±1兆超 → ±1 に置き換える（replace と replace_large_values）
+    replace=True なら NaN → 0, ±inf → ±1 だけ置き換える（shift_window_24）
+    """
+    n = len(values)
+    if out is None:
+        out = np.empty(values.shape + (len(lags),))
+    out[:] = np.nan
+    if change:
+        # 前方補完
+        idx = np.where(np.isnan(values), 0, np.arange(n)[:, None])
+        np.maximum.accumulate(idx, axis=0, out=idx)
+        values = np.take_along_axis(values, idx, axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for k, lag in enumerate(lags):
+            if lag >= n:
+                continue
+            if change:
+                np.divide(values[lag:], values[:n - lag], out=out[lag:, :, k])
+                out[lag:, :, k] -= 1
+            else:
+                out[lag:, :, k] = values[:n - lag]
+    if change or replace:
+        np.nan_to_num(out, copy=False, nan=0.0, posinf=1.0, neginf=-1.0)
+    if change:
+        out[out > 1e12] = 1
+        out[out < -1e12] = -1
+    return out
+
+def window_lags(window):
+    """shift_window / shift_window_24 のラグ"""
+    return list(range(1, window + 1)), list(range(1 * 24, window * 24 + 1, 24))
+
+def expand_windows(df, columns, window):
+    """
+    columns の各列の shift_window, shift_window_24, pct_change_window, pct_change_window_24 を
+    列ごとにこの順で並べた DataFrame を、1つの2次元配列から作る
+    """
+    lags, lags_24 = window_lags(window)
+    values = df[list(columns)].to_numpy(dtype=np.float64)
+    block = np.empty((len(df), len(columns), 2 * (len(lags) + len(lags_24))))
+    parts = [(lags, False, False), (lags_24, False, True), (lags, True, False), (lags_24, True, False)]
+    start = 0
+    for part_lags, change, replace in parts:
+        window_block(values, part_lags, change, replace, out=block[:, :, start:start + len(part_lags)])
+        start += len(part_lags)
+
+    names = []
+    for column in columns:
+        names += [f"{column}_{x}" for x in lags + lags_24]
+        names += [f"{column}_change_{x}" for x in lags + lags_24]
+    return pd.DataFrame(block.reshape(len(df), -1), index=df.index, columns=names, copy=False)
+
+def _window_frame(df, column_name, lags, change, replace):
+    values = df[column_name].to_numpy(dtype=np.float64)[:, None]
+    block = window_block(values, lags, change, replace)[:, 0, :]
+    suffix = "_change" if change else ""
+    return pd.DataFrame(block, index=df.index, columns=[f"{column_name}{suffix}_{x}" for x in lags], copy=False)
+
 def shift_window(df, column_name, window):
-    a = df[column_name].copy()
-    bs = []
-    for x in range(1, window + 1):
-        b = df[column_name].shift(x).copy()
-        b = b.rename(f"{column_name}_{x}")
-        bs.append(b)
-    return pd.concat(bs, axis=1)
+    return _window_frame(df, column_name, window_lags(window)[0], change=False, replace=False)
 
 def shift_window_24(df, column_name, window):
-    a = df[column_name].copy()
-    bs = []
-    for x in range(1 * 24, window * 24+ 1, 24):
-        b = df[column_name].shift(x).copy()
-        b = b.rename(f"{column_name}_{x}")
-        b.replace({np.nan: 0, np.inf: 1, -np.inf: -1}, inplace=True)
-        bs.append(b)
-    return pd.concat(bs, axis=1)
+    return _window_frame(df, column_name, window_lags(window)[1], change=False, replace=True)
 
 def pct_change_window(df, column_name, window):
-    a = df[column_name].copy()
-    bs = []
-    for x in range(1, window + 1):
-        b = df[column_name].pct_change(x).copy()
-        b = b.rename(f"{column_name}_change_{x}")
-        b.replace({np.nan: 0, np.inf: 1, -np.inf: -1}, inplace=True)
-        b = b.apply(replace_large_values)
-        bs.append(b)
-    return pd.concat(bs, axis=1)
+    return _window_frame(df, column_name, window_lags(window)[0], change=True, replace=False)
 
 def pct_change_window_24(df, column_name, window):
-    a = df[column_name].copy()
-    bs = []
-    for x in range(1 * 24, window * 24+ 1, 24):
-        b = df[column_name].pct_change(x).copy()
-        b = b.rename(f"{column_name}_change_{x}")
-        b.replace({np.nan: 0, np.inf: 1, -np.inf: -1}, inplace=True)
-        b = b.apply(replace_large_values)
-        bs.append(b)
-    return pd.concat(bs, axis=1)
-
-def calc_features(df, window_size=12):
-    open = df['Open']
-    high = df['High']
-    low = df['Low']
-    close = df['Close']
-    volume = df['Volume']
-
-    orig_columns = df.columns
-    df["return"] = close.pct_change()
+    return _window_frame(df, column_name, window_lags(window)[1], change=True, replace=False)
+
+# ------ calc_features の指標と特徴量 ------ #
+# 指標は1回の calc_features の中で1度だけ計算して、複数の特徴量で使い回す（MA と SMA のように同じ計算も1つにまとめる）
+INDICATORS = {
+    'hilo': lambda ind: (ind['High'] + ind['Low']) / 2,
+    'BBANDS': lambda ind: talib.BBANDS(ind['Close'], timeperiod=7, nbdevup=2, nbdevdn=2, matype=0),
+    'DEMA30': lambda ind: talib.DEMA(ind['Close'], timeperiod=30),
+    'EMA16': lambda ind: talib.EMA(ind['Close'], timeperiod=16),
+    'EMA30': lambda ind: talib.EMA(ind['Close'], timeperiod=30),
+    'EMA50': lambda ind: talib.EMA(ind['Close'], timeperiod=50),
+    'EMA100': lambda ind: talib.EMA(ind['Close'], timeperiod=100),
+    'HT_TRENDLINE': lambda ind: talib.HT_TRENDLINE(ind['Close']),
+    'KAMA30': lambda ind: talib.KAMA(ind['Close'], timeperiod=30),
+    'MIDPOINT14': lambda ind: talib.MIDPOINT(ind['Close'], timeperiod=14),
+    # talib.MA(matype=0) は SMA と同じ
+    'SMA5': lambda ind: talib.SMA(ind['Close'], timeperiod=5),
+    'SMA17': lambda ind: talib.SMA(ind['Close'], timeperiod=17),
+    'SMA25': lambda ind: talib.SMA(ind['Close'], timeperiod=25),
+    'SMA30': lambda ind: talib.SMA(ind['Close'], timeperiod=30),
+    'SMA50': lambda ind: talib.SMA(ind['Close'], timeperiod=50),
+    'SMA100': lambda ind: talib.SMA(ind['Close'], timeperiod=100),
+    'T3': lambda ind: talib.T3(ind['Close'], timeperiod=5, vfactor=0),
+    'TEMA30': lambda ind: talib.TEMA(ind['Close'], timeperiod=30),
+    'WMA5': lambda ind: talib.WMA(ind['Close'], timeperiod=5),
+    'WMA17': lambda ind: talib.WMA(ind['Close'], timeperiod=17),
+    'WMA25': lambda ind: talib.WMA(ind['Close'], timeperiod=25),
+    'WMA50': lambda ind: talib.WMA(ind['Close'], timeperiod=50),
+    'WMA100': lambda ind: talib.WMA(ind['Close'], timeperiod=100),
+    'AROON': lambda ind: talib.AROON(ind['High'], ind['Low'], timeperiod=14),
+    'MACD': lambda ind: talib.MACD(ind['Close'], fastperiod=12, slowperiod=26, signalperiod=9),
+    'STOCH': lambda ind: talib.STOCH(ind['High'], ind['Low'], ind['Close'], fastk_period=5, slowk_period=3,
+                                     slowk_matype=0, slowd_period=3, slowd_matype=0),
+    'STOCHF': lambda ind: talib.STOCHF(ind['High'], ind['Low'], ind['Close'], fastk_period=5, fastd_period=3,
+                                       fastd_matype=0),
+    'STOCHRSI': lambda ind: talib.STOCHRSI(ind['Close'], timeperiod=14, fastk_period=5, fastd_period=3,
+                                           fastd_matype=0),
+    'ADOSC': lambda ind: talib.ADOSC(ind['High'], ind['Low'], ind['Close'], ind['Volume'], fastperiod=3, slowperiod=10),
+    'HT_SINE': lambda ind: talib.HT_SINE(ind['Close']),
+    'LINEARREG': lambda ind: talib.LINEARREG(ind['Close'], timeperiod=14),
+    'LINEARREG_INTERCEPT': lambda ind: talib.LINEARREG_INTERCEPT(ind['Close'], timeperiod=14),
+}
+
+
+def _hilo_ratio(name, i=None):
+    """移動平均系の指標と (高値 + 安値) / 2 との乖離率"""
+    def feature(ind):
+        value = ind[name] if i is None else ind[name][i]
+        return (value - ind['hilo']) / value
+    return feature
+
+
+# 派生列（この順に列を追加する）
+FEATURES = {
+    'BBANDS_upperband': _hilo_ratio('BBANDS', 0),
+    'BBANDS_middleband': _hilo_ratio('BBANDS', 1),
+    'BBANDS_lowerband': _hilo_ratio('BBANDS', 2),
+    'DEMA': _hilo_ratio('DEMA30'),
+    'EMA16': _hilo_ratio('EMA16'),
+    'EMA30': _hilo_ratio('EMA30'),
+    'EMA50': _hilo_ratio('EMA50'),
+    'EMA100': _hilo_ratio('EMA100'),
+    #'EMA200': _hilo_ratio('EMA200'),
+    'HT_TRENDLINE': _hilo_ratio('HT_TRENDLINE'),
+    'KAMA': _hilo_ratio('KAMA30'),
+    'MA17': _hilo_ratio('SMA17'),
+    'MA30': _hilo_ratio('SMA30'),
+    'MA50': _hilo_ratio('SMA50'),
+    'MA100': _hilo_ratio('SMA100'),
+    'MIDPOINT': _hilo_ratio('MIDPOINT14'),
+    'SMA5': _hilo_ratio('SMA5'),
+    'SMA17': _hilo_ratio('SMA17'),
+    'SMA25': _hilo_ratio('SMA25'),
+    'SMA50': _hilo_ratio('SMA50'),
+    'T3': _hilo_ratio('T3'),
+    'TEMA': _hilo_ratio('TEMA30'),
+    #'TRIMA': _hilo_ratio('TRIMA30'),
+    'WMA5': _hilo_ratio('WMA5'),
+    'WMA17': _hilo_ratio('WMA17'),
+    'WMA25': _hilo_ratio('WMA25'),
+    'WMA50': _hilo_ratio('WMA50'),
+    'WMA100': _hilo_ratio('WMA100'),
+
+    'ADX': lambda ind: talib.ADX(ind['High'], ind['Low'], ind['Close'], timeperiod=14) / 100,
+    'ADXR': lambda ind: talib.ADXR(ind['High'], ind['Low'], ind['Close'], timeperiod=14) / 100,
+    'AROON_aroondown': lambda ind: ind['AROON'][0] / 100,
+    'AROON_aroonup': lambda ind: ind['AROON'][1] / 100,
+    'AROONOSC': lambda ind: talib.AROONOSC(ind['High'], ind['Low'], timeperiod=14) / 100,
+    'BOP': lambda ind: talib.BOP(ind['Open'], ind['High'], ind['Low'], ind['Close']),
+    'CCI': lambda ind: talib.CCI(ind['High'], ind['Low'], ind['Close'], timeperiod=14) / 100,
+    'DX': lambda ind: talib.DX(ind['High'], ind['Low'], ind['Close'], timeperiod=14) / 100,
+    # skip MACDEXT MACDFIX たぶん同じなので
+    'MACD_macdhist': lambda ind: ind['MACD'][2] / 1000,
+    'MFI': lambda ind: talib.MFI(ind['High'], ind['Low'], ind['Close'], ind['Volume'], timeperiod=14) / 100,
+    'MINUS_DI': lambda ind: talib.MINUS_DI(ind['High'], ind['Low'], ind['Close'], timeperiod=14) / 100,
+    'MOM': lambda ind: talib.MOM(ind['Close'], timeperiod=10),
+    'PLUS_DI': lambda ind: talib.PLUS_DI(ind['High'], ind['Low'], ind['Close'], timeperiod=14) / 100,
+    'RSI': lambda ind: talib.RSI(ind['Close'], timeperiod=14) / 100,
+    'STOCH_slowk': lambda ind: ind['STOCH'][0] / 100,
+    'STOCH_slowd': lambda ind: ind['STOCH'][1] / 100,
+    'STOCHF_fastk': lambda ind: ind['STOCHF'][0] / 100,
+    'STOCHF_fastd': lambda ind: ind['STOCHF'][1] / 100,
+    'STOCHRSI_fastk': lambda ind: ind['STOCHRSI'][0] / 100,
+    'STOCHRSI_fastd': lambda ind: ind['STOCHRSI'][1] / 100,
+    'TRIX': lambda ind: talib.TRIX(ind['Close'], timeperiod=30),
+    'ULTOSC': lambda ind: talib.ULTOSC(ind['High'], ind['Low'], ind['Close'], timeperiod1=7, timeperiod2=14,
+                                       timeperiod3=28) / 100,
+    'WILLR': lambda ind: talib.WILLR(ind['High'], ind['Low'], ind['Close'], timeperiod=14) / 100,
+
+    'ADOSC_c': lambda ind: pct_change_window(ind['ADOSC'].to_frame('ADOSC'), 'ADOSC', 1)['ADOSC_change_1'].clip(-10, 10),
+
+    'ATR': lambda ind: talib.ATR(ind['High'], ind['Low'], ind['Close'], timeperiod=14),
+    'ATR_R7': lambda ind: talib.ATR(ind['High'], ind['Low'], ind['Close'], timeperiod=7),
+    'ATR_R48': lambda ind: talib.ATR(ind['High'], ind['Low'], ind['Close'], timeperiod=48),
+    'TRANGE': lambda ind: talib.TRANGE(ind['High'], ind['Low'], ind['Close']) / (
+            (ind['High'] + ind['Low'] + ind['Close']) / 3),
+
+    'HT_SINE_sine': lambda ind: ind['HT_SINE'][0],
+    'HT_SINE_leadsine': lambda ind: ind['HT_SINE'][1],
+    'HT_TRENDMODE': lambda ind: talib.HT_TRENDMODE(ind['Close']),
+
+    'BETA5': lambda ind: talib.BETA(ind['High'], ind['Low'], timeperiod=5),
+    'BETA10': lambda ind: talib.BETA(ind['High'], ind['Low'], timeperiod=10),
+    'BETA15': lambda ind: talib.BETA(ind['High'], ind['Low'], timeperiod=15),
+    'BETA20': lambda ind: talib.BETA(ind['High'], ind['Low'], timeperiod=20),
+    'LINEARREG': lambda ind: ind['LINEARREG'] - ind['Close'] / ind['LINEARREG'],
+    'LINEARREG_ANGLE': lambda ind: talib.LINEARREG_ANGLE(ind['Close'], timeperiod=14) / 90,
+    'LINEARREG_INTERCEPT': lambda ind: ind['LINEARREG_INTERCEPT'] - ind['Close'] / ind['LINEARREG_INTERCEPT'],
+    'STDDEV': lambda ind: talib.STDDEV(ind['Close'], timeperiod=5, nbdev=1),
+
+    'RETURN_EWMS': lambda ind: ind['return'].ewm(span=100).std(),
+}
+
+
+class IndicatorCache():
+    """1回の calc_features の中で INDICATORS を必要になったときに1度だけ計算する（それ以外の名前は df の列）"""
+
+    def __init__(self, df):
+        self.df = df
+        self.values = {}
+
+    def __getitem__(self, name):
+        if name not in self.values:
+            if name in INDICATORS:
+                self.values[name] = INDICATORS[name](self)
+            else:
+                self.values[name] = self.df[name]
+        return self.values[name]
+
+
+def feature_names(features):
+    """列名のリストか、LightGBM の Booster（feature_name() の列）"""
+    if hasattr(features, 'feature_name'):
+        return features.feature_name()
+    return list(features)
+
+
+def parse_feature(name):
+    """
+    calc_features の列名を (元の列, ラグ, 変化率か) に分ける（ラグの無い列は (name, 0, False)）
+    例: 'RSI_change_24' → ('RSI', 24, True), 'return_3' → ('return', 3, False), 'Close_change_2' → ('Close', 2, True)
+    """
+    prefix, _, lag = name.rpartition('_')
+    if name in FEATURES or not prefix or not lag.isdigit():
+        return name, 0, False
+    if prefix.endswith('_change'):
+        return prefix[:-len('_change')], int(lag), True
+    return prefix, int(lag), False
+
+
+def required_features(features, base_columns=(), window_size=None):
+    """
+    列名のリスト（ラグ・変化率の列を含む）から、計算が必要な派生列（FEATURES のキー）を FEATURES の順で返す
+    base_columns（元の列や return など）はそのまま使えるので除く
+    window_size を渡すと、そのウィンドウに無いラグの列も ValueError にする
+    """
+    base_columns = set(base_columns)
+    window = None if window_size is None else set(sum(window_lags(window_size), []))
+    required = set()
+    for name in features:
+        if name in base_columns:
+            continue
+        source, lag, _ = parse_feature(name)
+        if source not in FEATURES:
+            raise ValueError(f"unknown feature {name}")
+        if window is not None and lag and lag not in window:
+            raise ValueError(f"feature {name} is not in window {window_size}")
+        required.add(source)
+    return [name for name in FEATURES if name in required]
+
+
+def calc_features(df, window_size=12, features=None):
+    """
+    特徴量を計算する
+    features（列名のリストか Booster）を渡すと、その列に必要な指標だけを計算し、その列だけをその順で返す
+    """
+    if features is not None:
+        features = feature_names(features)
+    df["return"] = df['Close'].pct_change()
     df = pd.concat([df, shift_window(df, "return", window_size), pct_change_window(df, "Close", window_size)], axis=1)
     base_columns = df.columns
-    hilo = (df['High'] + df['Low']) / 2
-    df['BBANDS_upperband'], df['BBANDS_middleband'], df['BBANDS_lowerband'] = talib.BBANDS(close, timeperiod=7,
-                                                                                           nbdevup=2, nbdevdn=2,
-                                                                                           matype=0)
-    df['BBANDS_upperband'] = (df['BBANDS_upperband'] - hilo) / df['BBANDS_upperband']
-    df['BBANDS_middleband'] = (df['BBANDS_middleband'] - hilo) / df['BBANDS_middleband']
-    df['BBANDS_lowerband'] = (df['BBANDS_lowerband'] - hilo) / df['BBANDS_lowerband']
-    df['DEMA'] = (talib.DEMA(close, timeperiod=30) - hilo) / talib.DEMA(close, timeperiod=30)
-    df['EMA16'] = (talib.EMA(close, timeperiod=16) - hilo) / talib.EMA(close, timeperiod=16)
-    df['EMA30'] = (talib.EMA(close, timeperiod=30) - hilo) / talib.EMA(close, timeperiod=30)
-    df['EMA50'] = (talib.EMA(close, timeperiod=50) - hilo) / talib.EMA(close, timeperiod=50)
-    df['EMA100'] = (talib.EMA(close, timeperiod=100) - hilo) / talib.EMA(close, timeperiod=100)
-    #df['EMA200'] = (talib.EMA(close, timeperiod=200) - hilo) / talib.EMA(close, timeperiod=200)
-    df['HT_TRENDLINE'] = (talib.HT_TRENDLINE(close) - hilo) / talib.HT_TRENDLINE(close)
-    df['KAMA'] = (talib.KAMA(close, timeperiod=30) - hilo) / talib.KAMA(close, timeperiod=30)
-    df['MA17'] = (talib.MA(close, timeperiod=17, matype=0) - hilo) / talib.MA(close, timeperiod=17, matype=0)
-    df['MA30'] = (talib.MA(close, timeperiod=30, matype=0) - hilo) / talib.MA(close, timeperiod=30, matype=0)
-    df['MA50'] = (talib.MA(close, timeperiod=50, matype=0) - hilo) / talib.MA(close, timeperiod=50, matype=0)
-    df['MA100'] = (talib.MA(close, timeperiod=100, matype=0) - hilo) / talib.MA(close, timeperiod=100, matype=0)
-    #df['MA200'] = (talib.MA(close, timeperiod=200, matype=0) - hilo  ) / talib.MA(close, timeperiod=200, matype=0)
-    df['MIDPOINT'] = (talib.MIDPOINT(close, timeperiod=14) - hilo) / talib.MIDPOINT(close, timeperiod=14)
-    df['SMA5'] = (talib.SMA(close, timeperiod=5) - hilo) / talib.SMA(close, timeperiod=5)
-    df['SMA17'] = (talib.SMA(close, timeperiod=17) - hilo) / talib.SMA(close, timeperiod=17)
-    df['SMA25'] = (talib.SMA(close, timeperiod=25) - hilo) / talib.SMA(close, timeperiod=25)
-    df['SMA50'] = (talib.SMA(close, timeperiod=50) - hilo) / talib.SMA(close, timeperiod=50)
-    #df['SMA100'] = (talib.SMA(close, timeperiod=100) - hilo) / talib.SMA(close, timeperiod=100)
-    #df['SMA200'] = (talib.SMA(close, timeperiod=200) - hilo) / talib.SMA(close, timeperiod=200)
-    df['T3'] = (talib.T3(close, timeperiod=5, vfactor=0) - hilo) / talib.T3(close, timeperiod=5, vfactor=0)
-    df['TEMA'] = (talib.TEMA(close, timeperiod=30) - hilo) / talib.TEMA(close, timeperiod=30)
-    #df['TRIMA'] = (talib.TRIMA(close, timeperiod=30) - hilo) / talib.TRIMA(close, timeperiod=30)
-    df['WMA5'] = (talib.WMA(close, timeperiod=5) - hilo) / talib.WMA(close, timeperiod=5)
-    df['WMA17'] = (talib.WMA(close, timeperiod=17) - hilo) / talib.WMA(close, timeperiod=17)
-    df['WMA25'] = (talib.WMA(close, timeperiod=25) - hilo) / talib.WMA(close, timeperiod=25)
-    df['WMA50'] = (talib.WMA(close, timeperiod=50) - hilo) / talib.WMA(close, timeperiod=50)
-    df['WMA100'] = (talib.WMA(close, timeperiod=100) - hilo) / talib.WMA(close, timeperiod=100)
-    #df['WMA200'] = (talib.WMA(close, timeperiod=200) - hilo) / talib.WMA(close, timeperiod=200)
-
-    df['ADX'] = talib.ADX(high, low, close, timeperiod=14) / 100
-    df['ADXR'] = talib.ADXR(high, low, close, timeperiod=14) / 100
-    #df['APO'] = talib.APO(close, fastperiod=12, slowperiod=26, matype=0)
-    df['AROON_aroondown'], df['AROON_aroonup'] = talib.AROON(high, low, timeperiod=14)
-    df['AROON_aroondown'] /= 100,
-    df['AROON_aroonup'] /= 100,
-    #df = pd.concat([df, shift_window(df, "AROON_aroondown", 12), shift_window(df, "AROON_aroonup", 12)], axis=1)
-    df['AROONOSC'] = talib.AROONOSC(high, low, timeperiod=14) / 100
-    df['BOP'] = talib.BOP(open, high, low, close)
-    df['CCI'] = talib.CCI(high, low, close, timeperiod=14) / 100
-    df['DX'] = talib.DX(high, low, close, timeperiod=14) / 100
-    #df['MACD_macd'], df['MACD_macdsignal'], df['MACD_macdhist'] = talib.MACD(close, fastperiod=12, slowperiod=26,
-    #                                                                        signalperiod=9)
-    _, _, df['MACD_macdhist'] = talib.MACD(close, fastperiod=12, slowperiod=26, signalperiod=9)
-    df['MACD_macdhist'] /= 1000
-    # skip MACDEXT MACDFIX たぶん同じなので
-    df['MFI'] = talib.MFI(high, low, close, volume, timeperiod=14) / 100
-    df['MINUS_DI'] = talib.MINUS_DI(high, low, close, timeperiod=14) / 100
-    #df['MINUS_DM'] = talib.MINUS_DM(high, low, timeperiod=14)
-    df['MOM'] = talib.MOM(close, timeperiod=10)
-    df['PLUS_DI'] = talib.PLUS_DI(high, low, close, timeperiod=14) / 100
-    #df['PLUS_DM'] = talib.PLUS_DM(high, low, timeperiod=14)
-    df['RSI'] = talib.RSI(close, timeperiod=14) / 100
-    df['STOCH_slowk'], df['STOCH_slowd'] = talib.STOCH(high, low, close, fastk_period=5, slowk_period=3, slowk_matype=0,
-                                                       slowd_period=3, slowd_matype=0)
-
-    df['STOCH_slowk'] /= 100
-    df['STOCH_slowd'] /= 100
-    df['STOCHF_fastk'], df['STOCHF_fastd'] = talib.STOCHF(high, low, close, fastk_period=5, fastd_period=3,
-                                                          fastd_matype=0)
-    df['STOCHF_fastk'] /= 100
-    df['STOCHF_fastd'] /= 100
-    df['STOCHRSI_fastk'], df['STOCHRSI_fastd'] = talib.STOCHRSI(close, timeperiod=14, fastk_period=5, fastd_period=3,
-                                                                fastd_matype=0)
-    df['STOCHRSI_fastk'] /= 100
-    df['STOCHRSI_fastd'] /= 100
-    df['TRIX'] = talib.TRIX(close, timeperiod=30)
-    df['ULTOSC'] = talib.ULTOSC(high, low, close, timeperiod1=7, timeperiod2=14, timeperiod3=28) / 100
-    df['WILLR'] = talib.WILLR(high, low, close, timeperiod=14) / 100
-
-    #df['AD'] = talib.AD(high, low, close, volume)
-    df['ADOSC'] = talib.ADOSC(high, low, close, volume, fastperiod=3, slowperiod=10)
-    df = pd.concat([df, pct_change_window(df, 'ADOSC', 1)], axis=1)
-    df["ADOSC_change_1"].clip(-10, 10, inplace=True)
-    df.rename(columns={'ADOSC_change_1': 'ADOSC_c'}, inplace=True)
-    del df['ADOSC']
-    #df['OBV'] = talib.OBV(close, volume)
-
-    df['ATR'] = talib.ATR(high, low, close, timeperiod=14)
-    df['ATR_R7'] = talib.ATR(high, low, close, timeperiod=7)
-    df['ATR_R48'] = talib.ATR(high, low, close, timeperiod=48)
-    #df['NATR'] = talib.NATR(high, low, close, timeperiod=14)
-    df['TRANGE'] = talib.TRANGE(high, low, close) / ((high + low + close) / 3)
-
-    df['HT_DCPERIOD'] = talib.HT_DCPERIOD(close)
-    #df = pd.concat([df, pct_change_window(df, 'HT_DCPERIOD', 1)], axis=1)
-    #df["HT_DCPERIOD_change_1"].clip(-10, 10)
-    del df['HT_DCPERIOD']
-    df['HT_DCPHASE'] = talib.HT_DCPHASE(close)
-    #df = pd.concat([df, pct_change_window(df, 'HT_DCPHASE', 1)], axis=1)
-    #df["HT_DCPHASE_change_1"].clip(-10, 10, inplace=True)
-    del df['HT_DCPHASE']
-    #df['HT_PHASOR_inphase'], df['HT_PHASOR_quadrature'] = talib.HT_PHASOR(close)
-
-    df['HT_SINE_sine'], df['HT_SINE_leadsine'] = talib.HT_SINE(close)
-    df['HT_TRENDMODE'] = talib.HT_TRENDMODE(close)
-
-    df['BETA5'] = talib.BETA(high, low, timeperiod=5)
-    df['BETA10'] = talib.BETA(high, low, timeperiod=10)
-    df['BETA15'] = talib.BETA(high, low, timeperiod=15)
-    df['BETA20'] = talib.BETA(high, low, timeperiod=20)
-    #df['CORREL'] = talib.CORREL(high, low, timeperiod=30)
-    df['LINEARREG'] = talib.LINEARREG(close, timeperiod=14) - close / talib.LINEARREG(close, timeperiod=14)
-    df['LINEARREG_ANGLE'] = talib.LINEARREG_ANGLE(close, timeperiod=14) / 90
-    df['LINEARREG_INTERCEPT'] = talib.LINEARREG_INTERCEPT(close, timeperiod=14) - close / talib.LINEARREG_INTERCEPT(close, timeperiod=14)
-    #df['LINEARREG_SLOPE'] = talib.LINEARREG_SLOPE(close, timeperiod=14)
-    df['STDDEV'] = talib.STDDEV(close, timeperiod=5, nbdev=1)
-
-    df["RETURN_EWMS"] = df["return"].ewm(span = 100).std()
-
-    #plt.figure()
-    #df["return"].plot()
-    #df['RETURN_EWMS'].plot()
-    datas = [df.copy()]
-    for x in sorted(set(df.columns) - set(base_columns)):
-        datas.append(shift_window(df, x, window_size)),
-        datas.append(shift_window_24(df, x, window_size)),
-        datas.append(pct_change_window(df, x, window_size))
-        datas.append(pct_change_window_24(df, x, window_size))
-    df = pd.concat(datas, axis=1)
+    names = list(FEATURES) if features is None else required_features(features, base_columns, window_size)
+
+    ind = IndicatorCache(df)
+    derived = pd.DataFrame({name: FEATURES[name](ind) for name in names}, index=df.index)
+    df = pd.concat([df, derived], axis=1)
+
+    df = pd.concat([df, expand_windows(df, sorted(names), window_size)], axis=1)
     df = df.loc[:, ~df.columns.duplicated()]
 
     #print(df.columns)
     df = df.round(5)
+    if features is not None:
+        df = df[list(features)]
 
     return df
 
 
+def feature_matrix(df, features, window_size=12, dtype=np.float32):
+    """
+    features（列名のリストか Booster）の列だけを、その順に並べた C 連続の2次元配列（既定は float32）で返す
+    値は calc_features(df, window_size)[features] と同じ（ラグ・変化率は使う列のぶんだけ作り、df は書き換えない）
+    """
+    names = feature_names(features)
+    lags, lags_24 = window_lags(window_size)
+    df = df.copy(deep=False)
+    df["return"] = df['Close'].pct_change()
+    ind = IndicatorCache(df)
+
+    # 列ごとに (元の列, 変化率か, NaN・inf の置き換え) でまとめ、元の列ごとに window_block を1回だけ呼ぶ
+    plain = []
+    windows = {}
+    for i, name in enumerate(names):
+        if name in df.columns or name in FEATURES:
+            plain.append((i, name))
+            continue
+        source, lag, change = parse_feature(name)
+        derived = source in FEATURES
+        if source not in ('return', 'Close') and not derived:
+            raise ValueError(f"unknown feature {name}")
+        if (source == 'return' and change) or (source == 'Close' and not change):
+            raise ValueError(f"unknown feature {name}")
+        if lag in lags:
+            replace = False
+        elif derived and lag in lags_24:
+            replace = not change
+        else:
+            raise ValueError(f"feature {name} is not in window {window_size}")
+        windows.setdefault((source, change, replace), []).append((i, lag))
+
+    matrix = np.empty((len(df), len(names)), dtype=dtype)
+    for i, name in plain:
+        source = FEATURES[name](ind) if name in FEATURES else df[name]
+        matrix[:, i] = np.round(np.asarray(source, dtype=np.float64), 5)
+    for (source, change, replace), columns in windows.items():
+        values = np.asarray(FEATURES[source](ind) if source in FEATURES else df[source], dtype=np.float64)
+        block = window_block(values[:, None], [lag for _, lag in columns], change, replace)[:, 0, :]
+        matrix[:, [i for i, _ in columns]] = np.round(block, 5)
+    return matrix
+
+
 def model_load(path):
     bst = None
     if os.path.exists(path):